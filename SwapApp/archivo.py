@@ -0,0 +1,110 @@
+import gzip
+import json
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+
+from .models import ArchivoMensajes, Chat, Mensaje
+
+
+# ======================================================
+# ARCHIVO DE MENSAJES ANTIGUOS
+# ======================================================
+# compactar_mensajes saca de la tabla Mensaje el historial viejo de los
+# chats y lo guarda en segmentos JSONL comprimidos con gzip (uno por cada
+# LOTE mensajes) en el storage por defecto, bajo MEDIA_ROOT/archivo_chats/.
+# Los MANTENER mensajes más nuevos de cada chat quedan en la tabla, así la
+# primera página del chat y la vista previa de la bandeja no tocan el archivo.
+# Al paginar hacia atrás, cuando se acaban las filas se sigue leyendo de los
+# segmentos (views._pagina_mensajes).
+
+LOTE = 1000
+MANTENER = 50
+
+
+def _serializar(mensajes):
+    lineas = [
+        json.dumps({
+            "id": m.id,
+            "autor_id": m.autor_id,
+            "contenido": m.contenido,
+            "fecha": m.fecha.isoformat(),
+        }, ensure_ascii=False)
+        for m in mensajes
+    ]
+    return gzip.compress(("\n".join(lineas) + "\n").encode("utf-8"))
+
+
+def leer_segmento(segmento):
+    with segmento.archivo.open("rb") as f:
+        datos = gzip.decompress(f.read()).decode("utf-8")
+    return [json.loads(linea) for linea in datos.splitlines() if linea]
+
+
+def archivar(chat_id, mantener=MANTENER, lote=LOTE):
+    """
+    Mueve al archivo todos los mensajes del chat menos los ``mantener`` más
+    nuevos. Cada segmento se escribe y después, en una transacción, se
+    registra y se borran sus filas. Devuelve cuántos mensajes se movieron.
+    """
+    ultimo = (
+        Mensaje.objects.filter(chat_id=chat_id)
+        .order_by("-id").values_list("id", flat=True)[mantener:mantener + 1]
+    ).first()
+    if ultimo is None:
+        return 0
+
+    total = 0
+    while True:
+        mensajes = list(Mensaje.objects.filter(chat_id=chat_id, id__lte=ultimo).order_by("id")[:lote])
+        if not mensajes:
+            return total
+        desde, hasta = mensajes[0].id, mensajes[-1].id
+        segmento = ArchivoMensajes(chat_id=chat_id, desde_id=desde, hasta_id=hasta, cantidad=len(mensajes))
+        segmento.archivo.save(
+            f"chat_{chat_id}/{desde}-{hasta}.jsonl.gz", ContentFile(_serializar(mensajes)), save=False
+        )
+        try:
+            with transaction.atomic():
+                segmento.save()
+                Mensaje.objects.filter(chat_id=chat_id, id__gte=desde, id__lte=hasta).delete()
+                Chat.objects.filter(id=chat_id).update(archivado_hasta=hasta)
+        except Exception:
+            segmento.archivo.delete(save=False)
+            raise
+        total += len(mensajes)
+
+
+def mensajes_archivados(chat_id, antes_de, limite):
+    """
+    Los ``limite`` mensajes archivados más nuevos con id menor a antes_de
+    (None: sin tope), del más antiguo al más nuevo, como instancias de
+    Mensaje sin guardar; y si quedan más antiguos.
+    """
+    segmentos = ArchivoMensajes.objects.filter(chat_id=chat_id).order_by("-hasta_id")
+    if antes_de:
+        segmentos = segmentos.filter(desde_id__lt=antes_de)
+
+    filas = []
+    for segmento in segmentos:
+        filas = [f for f in leer_segmento(segmento) if not antes_de or f["id"] < antes_de] + filas
+        if len(filas) > limite:
+            break
+    hay_anteriores = len(filas) > limite
+    filas = filas[-limite:]
+
+    usuarios = User.objects.in_bulk({f["autor_id"] for f in filas})
+    mensajes = [
+        Mensaje(
+            id=f["id"],
+            chat_id=chat_id,
+            autor=usuarios[f["autor_id"]],
+            contenido=f["contenido"],
+            fecha=parse_datetime(f["fecha"]),
+        )
+        for f in filas
+        if f["autor_id"] in usuarios
+    ]
+    return mensajes, hay_anteriores
@@ -0,0 +1,185 @@
+import heapq
+import threading
+import time
+from collections import OrderedDict
+
+from django.contrib.auth.models import User
+from django.db import connection
+
+from .busqueda import normalizar
+from .models import Producto
+
+
+# ======================================================
+# ÍNDICE EN MEMORIA PARA AUTOCOMPLETAR
+# ======================================================
+# Cada worker mantiene un índice de trigramas sobre nombres de productos y
+# usernames. Se construye la primera vez que se usa, recorriendo la base
+# con values_list().iterator(); después se actualiza desde signal.py con
+# las escrituras del propio worker y se reconstruye en segundo plano cada
+# REFRESCO segundos para recoger los cambios hechos por otros workers.
+#
+# La memoria está acotada: a lo más MAX_ENTRADAS por tipo; al superarlo se
+# descartan las entradas más antiguas.
+
+MAX_ENTRADAS = {"producto": 100_000, "usuario": 50_000}
+LARGO_MAXIMO = 100
+REFRESCO = 10 * 60
+# Coincidencias más recientes que se ordenan por relevancia en cada consulta
+CANDIDATOS = 200
+
+
+def trigramas(texto):
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+
+def prefijos(texto):
+    """Prefijos de 1 y 2 letras de cada palabra (para consultas cortas)."""
+    salida = set()
+    for palabra in texto.split():
+        salida.add(palabra[:1])
+        salida.add(palabra[:2])
+    return salida
+
+
+class IndiceTrigramas:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (tipo, id) -> (texto, texto normalizado), en orden de inserción
+        self._entradas = {tipo: OrderedDict() for tipo in MAX_ENTRADAS}
+        # trigrama/prefijo -> {(tipo, id): None}; el dict conserva el orden
+        # de inserción, así que recorrerlo al revés da lo más reciente primero
+        self._postings = {}
+
+    def _claves_de(self, normalizado):
+        return trigramas(normalizado) | prefijos(normalizado)
+
+    def _agregar(self, tipo, objeto_id, texto):
+        clave = (tipo, objeto_id)
+        self._quitar(tipo, objeto_id)
+        texto = (texto or "")[:LARGO_MAXIMO]
+        normalizado = normalizar(texto)
+        if not normalizado:
+            return
+        entradas = self._entradas[tipo]
+        entradas[clave] = (texto, normalizado)
+        for g in self._claves_de(normalizado):
+            self._postings.setdefault(g, {})[clave] = None
+        while len(entradas) > MAX_ENTRADAS[tipo]:
+            (viejo_tipo, viejo_id), _ = next(iter(entradas.items()))
+            self._quitar(viejo_tipo, viejo_id)
+
+    def _quitar(self, tipo, objeto_id):
+        clave = (tipo, objeto_id)
+        anterior = self._entradas[tipo].pop(clave, None)
+        if anterior is None:
+            return
+        for g in self._claves_de(anterior[1]):
+            ids = self._postings.get(g)
+            if ids is not None:
+                ids.pop(clave, None)
+                if not ids:
+                    del self._postings[g]
+
+    def agregar(self, tipo, objeto_id, texto):
+        with self._lock:
+            self._agregar(tipo, objeto_id, texto)
+
+    def quitar(self, tipo, objeto_id):
+        with self._lock:
+            self._quitar(tipo, objeto_id)
+
+    def cargar(self, tipo, filas):
+        """Carga (id, texto) en orden ascendente de id."""
+        for objeto_id, texto in filas:
+            self._agregar(tipo, objeto_id, texto)
+
+    def sugerir(self, texto, limite=8):
+        consulta = normalizar(texto)[:LARGO_MAXIMO]
+        if not consulta:
+            return []
+        claves = trigramas(consulta) if len(consulta) >= 3 else {consulta}
+
+        with self._lock:
+            listas = sorted((self._postings.get(g, {}) for g in claves), key=len)
+            if not listas or not listas[0]:
+                return []
+
+            # Se recorre la lista más corta desde lo más reciente y se corta
+            # al juntar CANDIDATOS coincidencias: el costo no crece con el índice.
+            candidatos = []
+            for clave in reversed(listas[0]):
+                if all(clave in ids for ids in listas[1:]) and consulta in self._entradas[clave[0]][clave][1]:
+                    candidatos.append(clave)
+                    if len(candidatos) == CANDIDATOS:
+                        break
+
+            def rango(clave):
+                texto, normalizado = self._entradas[clave[0]][clave]
+                if normalizado.startswith(consulta):
+                    nivel = 0
+                elif f" {consulta}" in f" {normalizado}":
+                    nivel = 1
+                else:
+                    nivel = 2
+                # Más recientes (id mayor) primero dentro del mismo nivel
+                return (nivel, -clave[1])
+
+            vistos = set()
+            sugerencias = []
+            for clave in heapq.nsmallest(limite * 4, candidatos, key=rango):
+                texto, normalizado = self._entradas[clave[0]][clave]
+                if (clave[0], normalizado) in vistos:
+                    continue
+                vistos.add((clave[0], normalizado))
+                sugerencias.append({"tipo": clave[0], "id": clave[1], "texto": texto})
+                if len(sugerencias) == limite:
+                    break
+            return sugerencias
+
+
+def _filas(queryset, campo, maximo):
+    """Las ``maximo`` filas más recientes, devueltas en orden ascendente."""
+    ultimas = queryset.order_by("-id").values_list("id", campo)[:maximo]
+    return reversed(list(ultimas.iterator(chunk_size=2000)))
+
+
+def construir():
+    indice = IndiceTrigramas()
+    indice.cargar("producto", _filas(Producto.objects.all(), "nombre", MAX_ENTRADAS["producto"]))
+    indice.cargar("usuario", _filas(User.objects.filter(is_active=True), "username", MAX_ENTRADAS["usuario"]))
+    return indice
+
+
+_indice = None
+_construido = 0.0
+_lock_construccion = threading.Lock()
+_refrescando = threading.Event()
+
+
+def _refrescar_en_segundo_plano():
+    global _indice, _construido
+    try:
+        nuevo = construir()
+        _indice, _construido = nuevo, time.monotonic()
+    finally:
+        connection.close()
+        _refrescando.clear()
+
+
+def indice():
+    global _indice, _construido
+    if _indice is None:
+        with _lock_construccion:
+            if _indice is None:
+                _indice, _construido = construir(), time.monotonic()
+    elif time.monotonic() - _construido > REFRESCO and not _refrescando.is_set():
+        _refrescando.set()
+        threading.Thread(target=_refrescar_en_segundo_plano, daemon=True).start()
+    return _indice
+
+
+def indice_cargado():
+    """El índice si ya existe; las señales no lo construyen."""
+    return _indice
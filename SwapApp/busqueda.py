@@ -0,0 +1,304 @@
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Q
+
+from .models import Producto, ProductoBusqueda
+from .paginacion import CursorInvalido, codificar_cursor, decodificar_cursor
+
+
+# ======================================================
+# MOTOR DE BÚSQUEDA DE PRODUCTOS
+# ======================================================
+# Busca sobre ProductoBusqueda (nombre, descripción, tags, categoría y
+# usuario del producto) con el índice de texto completo del motor:
+#   - MySQL:  índice FULLTEXT, MATCH ... AGAINST en modo booleano.
+#   - SQLite: tabla virtual FTS5 con ranking bm25().
+#   - Otros / sin FTS5: LIKE, ordenado por id.
+# En ambos motores de texto completo cada término (terminos()) se busca
+# como prefijo y todos deben aparecer: "cam roj" encuentra "camisa roja".
+# Los resultados se ordenan por (puntaje, id) descendente y se paginan con
+# un cursor sobre ese par, igual que el feed del home. El puntaje se
+# redondea a DECIMALES_PUNTAJE en la misma consulta, así el valor guardado
+# en el cursor se compara exacto con el de la base.
+#
+# Las páginas de ids se guardan en cache por consulta normalizada y versión
+# del catálogo; cualquier escritura de productos sube la versión.
+
+TABLA = ProductoBusqueda._meta.db_table
+FTS = f"{TABLA}_fts"
+RESULTADOS_POR_PAGINA = 100
+CAMPOS_CURSOR = ("puntaje", "id")
+DECIMALES_PUNTAJE = 6
+CLAVE_VERSION = "catalogo:version"
+DURACION_RESULTADOS = 5 * 60
+# Cuánto espera un worker el resultado que está calculando otro
+ESPERA_MAXIMA = 2.0
+
+
+def terminos(texto):
+    return re.findall(r"\w+", (texto or "").lower())
+
+
+def leer_cursor(cursor):
+    """(puntaje, id) del cursor o None; CursorInvalido si no son números."""
+    despues_de = decodificar_cursor(cursor, CAMPOS_CURSOR)
+    if despues_de and not all(isinstance(v, (int, float)) for v in despues_de):
+        raise CursorInvalido(cursor)
+    return despues_de
+
+
+def normalizar(texto):
+    """Minúsculas, sin tildes y con los espacios colapsados."""
+    texto = unicodedata.normalize("NFKD", texto or "")
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return " ".join(texto.casefold().split())
+
+
+class MotorBusqueda:
+
+    def consulta(self, texto, despues_de, limite):
+        """Devuelve [(producto_id, puntaje)] ordenado por puntaje e id."""
+        raise NotImplementedError
+
+    def buscar(self, texto, cursor=None, limite=RESULTADOS_POR_PAGINA):
+        """
+        Devuelve (ids, cursor_siguiente). Lanza CursorInvalido si el cursor
+        no se puede leer.
+        """
+        despues_de = leer_cursor(cursor)
+        if not terminos(texto):
+            filas = self.recientes(despues_de, limite + 1)
+        else:
+            filas = self.consulta(texto, despues_de, limite + 1)
+
+        siguiente = None
+        if len(filas) > limite:
+            filas = filas[:limite]
+            producto_id, puntaje = filas[-1]
+            siguiente = codificar_cursor([float(puntaje), producto_id])
+        return [producto_id for producto_id, _ in filas], siguiente
+
+    def recientes(self, despues_de, limite):
+        qs = Producto.objects.order_by("-id")
+        if despues_de:
+            qs = qs.filter(id__lt=despues_de[1])
+        return [(producto_id, 0.0) for producto_id in qs.values_list("id", flat=True)[:limite]]
+
+    def _ejecutar(self, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [(fila[0], fila[1]) for fila in cursor.fetchall()]
+
+
+class MotorMySQL(MotorBusqueda):
+    # El nombre pesa el doble: tiene su propio índice FULLTEXT.
+    PUNTAJE = (
+        "ROUND(2 * MATCH(nombre) AGAINST (%s IN BOOLEAN MODE) + "
+        "MATCH(nombre, descripcion, tags, categoria, usuario) AGAINST (%s IN BOOLEAN MODE), "
+        f"{DECIMALES_PUNTAJE})"
+    )
+
+    def consulta(self, texto, despues_de, limite):
+        # +término*: obligatorio y por prefijo (terminos() solo deja letras y
+        # dígitos, así que el usuario no puede meter operadores)
+        expresion = " ".join(f"+{t}*" for t in terminos(texto))
+        sql = (
+            f"SELECT producto_id, {self.PUNTAJE} AS puntaje FROM `{TABLA}` "
+            "WHERE MATCH(nombre, descripcion, tags, categoria, usuario) AGAINST (%s IN BOOLEAN MODE)"
+        )
+        params = [expresion, expresion, expresion]
+        if despues_de:
+            puntaje, producto_id = despues_de
+            sql += " HAVING puntaje < %s OR (puntaje = %s AND producto_id < %s)"
+            params += [puntaje, puntaje, producto_id]
+        sql += " ORDER BY puntaje DESC, producto_id DESC LIMIT %s"
+        return self._ejecutar(sql, params + [limite])
+
+
+class MotorSQLite(MotorBusqueda):
+    # Pesos bm25 por columna: nombre, descripcion, tags, categoria, usuario
+    PESOS = "10.0, 1.0, 4.0, 3.0, 2.0"
+
+    def consulta(self, texto, despues_de, limite):
+        # Cada término entre comillas (sin sintaxis FTS del usuario) y con
+        # prefijo; separados por espacio FTS5 exige todos, como MotorMySQL.
+        expresion = " ".join(f'"{t}"*' for t in terminos(texto))
+        sql = (
+            f'SELECT producto_id, puntaje FROM ('
+            f'SELECT rowid AS producto_id, ROUND(-bm25("{FTS}", {self.PESOS}), {DECIMALES_PUNTAJE}) AS puntaje '
+            f'FROM "{FTS}" WHERE "{FTS}" MATCH %s)'
+        )
+        params = [expresion]
+        if despues_de:
+            puntaje, producto_id = despues_de
+            sql += " WHERE puntaje < %s OR (puntaje = %s AND producto_id < %s)"
+            params += [puntaje, puntaje, producto_id]
+        sql += " ORDER BY puntaje DESC, producto_id DESC LIMIT %s"
+        return self._ejecutar(sql, params + [limite])
+
+
+class MotorLike(MotorBusqueda):
+
+    def consulta(self, texto, despues_de, limite):
+        filtro = Q()
+        for termino in terminos(texto):
+            for campo in ("nombre", "descripcion", "tags", "categoria", "usuario"):
+                filtro |= Q(**{f"{campo}__icontains": termino})
+        qs = ProductoBusqueda.objects.filter(filtro).order_by("-producto_id")
+        if despues_de:
+            qs = qs.filter(producto_id__lt=despues_de[1])
+        return [(producto_id, 0.0) for producto_id in qs.values_list("producto_id", flat=True)[:limite]]
+
+
+_motor = None
+
+
+def motor():
+    global _motor
+    if _motor is None:
+        if connection.vendor == "mysql":
+            _motor = MotorMySQL()
+        elif connection.vendor == "sqlite" and FTS in connection.introspection.table_names():
+            _motor = MotorSQLite()
+        else:
+            _motor = MotorLike()
+    return _motor
+
+
+# ---------------------- CACHE DE RESULTADOS ----------------------
+def version_catalogo():
+    version = cache.get(CLAVE_VERSION)
+    if version is None:
+        # Se parte de la hora actual para no reutilizar versiones viejas
+        # si la clave se pierde de la cache.
+        cache.add(CLAVE_VERSION, time.time_ns(), None)
+        version = cache.get(CLAVE_VERSION)
+    return version
+
+
+def invalidar_catalogo():
+    try:
+        cache.incr(CLAVE_VERSION)
+    except ValueError:
+        cache.add(CLAVE_VERSION, time.time_ns(), None)
+
+
+class _Llamada:
+    def __init__(self):
+        self.listo = threading.Event()
+        self.resultado = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Junta llamadas concurrentes con la misma clave: la primera ejecuta la
+    función y las demás esperan su resultado en vez de repetir la consulta.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._en_curso = {}
+
+    def ejecutar(self, clave, funcion):
+        with self._lock:
+            llamada = self._en_curso.get(clave)
+            lider = llamada is None
+            if lider:
+                llamada = self._en_curso[clave] = _Llamada()
+
+        if not lider:
+            llamada.listo.wait()
+            if llamada.error is not None:
+                raise llamada.error
+            return llamada.resultado
+
+        try:
+            llamada.resultado = funcion()
+            return llamada.resultado
+        except Exception as error:
+            llamada.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._en_curso[clave]
+            llamada.listo.set()
+
+
+_vuelos = SingleFlight()
+
+
+def _clave_resultados(consulta, cursor, limite):
+    firma = hashlib.sha1(f"{consulta}|{cursor or ''}|{limite}".encode("utf-8")).hexdigest()
+    return f"busqueda:{version_catalogo()}:{firma}"
+
+
+def _calcular_compartido(clave, funcion):
+    """
+    Entre workers: quien consigue el candado calcula; el resto revisa la
+    cache un momento antes de rendirse y calcular por su cuenta.
+    """
+    candado = f"{clave}:candado"
+    adquirido = cache.add(candado, 1, int(ESPERA_MAXIMA) + 1)
+    if not adquirido:
+        limite = time.monotonic() + ESPERA_MAXIMA
+        while time.monotonic() < limite:
+            time.sleep(0.05)
+            resultado = cache.get(clave)
+            if resultado is not None:
+                return resultado
+    try:
+        resultado = funcion()
+        cache.set(clave, resultado, DURACION_RESULTADOS)
+        return resultado
+    finally:
+        # Quien se rindió no suelta el candado del que sigue calculando
+        if adquirido:
+            cache.delete(candado)
+
+
+def buscar(texto, cursor=None, limite=RESULTADOS_POR_PAGINA):
+    """
+    Como MotorBusqueda.buscar, pero con cache por consulta normalizada
+    (mayúsculas, tildes y espacios no importan) y sin repetir consultas
+    idénticas que llegan al mismo tiempo.
+    """
+    consulta = normalizar(texto)
+    leer_cursor(cursor)  # valida antes de cachear
+    clave = _clave_resultados(consulta, cursor, limite)
+
+    resultado = cache.get(clave)
+    if resultado is None:
+        resultado = _vuelos.ejecutar(clave, lambda: _calcular_compartido(
+            clave, lambda: list(motor().buscar(consulta, cursor, limite))
+        ))
+    ids, siguiente = resultado
+    return ids, siguiente
+
+
+# ---------------------- MANTENCIÓN DEL DOCUMENTO ----------------------
+def indexar_productos(productos):
+    """Regenera el documento de búsqueda de los productos dados."""
+    productos = productos.select_related("usuario", "categoria").prefetch_related("tags")
+    for p in productos:
+        ProductoBusqueda.objects.update_or_create(
+            producto_id=p.id,
+            defaults={
+                "nombre": p.nombre,
+                "descripcion": p.descripcion,
+                "tags": " ".join(t.nombre for t in p.tags.all()),
+                "categoria": p.categoria.nombre if p.categoria else "",
+                "usuario": p.usuario.username,
+            },
+        )
+    invalidar_catalogo()
+
+
+def indexar_producto(producto_id):
+    indexar_productos(Producto.objects.filter(id=producto_id))
@@ -0,0 +1,78 @@
+from django.core.cache import cache
+from django.db.models import F, Q
+
+from .models import Chat, Notificacion
+
+
+# ======================================================
+# CONTADORES DE NO LEÍDOS
+# ======================================================
+# Por usuario se guardan en cache tres números para los globos del menú:
+#   - notificaciones: notificaciones visibles.
+#   - strikes: notificaciones visibles de tipo alerta/peligro.
+#   - mensajes: chats con mensajes sin leer.
+# Las notificaciones nuevas o leídas los ajustan con incr/decr (atómicos
+# en la cache); lo que no se puede ajustar con exactitud se invalida. Si un
+# contador no está en cache se calcula desde la base y se guarda.
+
+DURACION = 10 * 60
+TIPOS_STRIKE = ("alerta", "peligro")
+CONTADORES = ("notificaciones", "strikes", "mensajes")
+
+
+def _clave(usuario_id, nombre):
+    return f"no_leidas:{usuario_id}:{nombre}"
+
+
+def _calcular(usuario_id, nombre):
+    visibles = Notificacion.objects.filter(usuario_id=usuario_id, visible=True)
+    if nombre == "notificaciones":
+        return visibles.count()
+    if nombre == "strikes":
+        return visibles.filter(tipo__in=TIPOS_STRIKE).count()
+    return Chat.objects.filter(
+        Q(trueque__solicitante_id=usuario_id, ultimo_mensaje_id__gt=F("ultimo_leido_solicitante")) |
+        Q(trueque__receptor_id=usuario_id, ultimo_mensaje_id__gt=F("ultimo_leido_receptor"))
+    ).count()
+
+
+def no_leidas(usuario_id):
+    """{"notificaciones": n, "strikes": n, "mensajes": n} del usuario."""
+    claves = {nombre: _clave(usuario_id, nombre) for nombre in CONTADORES}
+    guardados = cache.get_many(claves.values())
+    resultado = {}
+    for nombre, clave in claves.items():
+        valor = guardados.get(clave)
+        if valor is None:
+            valor = _calcular(usuario_id, nombre)
+            # add y no set: si otro request ya lo guardó (y lo ajustó) no se pisa
+            if not cache.add(clave, valor, DURACION):
+                valor = cache.get(clave, valor)
+        resultado[nombre] = max(valor, 0)
+    return resultado
+
+
+def _sumar(usuario_id, nombre, delta):
+    try:
+        cache.incr(_clave(usuario_id, nombre), delta)
+    except ValueError:
+        # No está en cache: se calculará desde la base cuando se pida
+        pass
+
+
+def notificacion_creada(notificacion):
+    if notificacion.visible:
+        _sumar(notificacion.usuario_id, "notificaciones", 1)
+        if notificacion.tipo in TIPOS_STRIKE:
+            _sumar(notificacion.usuario_id, "strikes", 1)
+
+
+def notificacion_leida(notificacion):
+    """Llamar cuando una notificación visible deja de serlo."""
+    _sumar(notificacion.usuario_id, "notificaciones", -1)
+    if notificacion.tipo in TIPOS_STRIKE:
+        _sumar(notificacion.usuario_id, "strikes", -1)
+
+
+def invalidar(usuario_id, *nombres):
+    cache.delete_many([_clave(usuario_id, nombre) for nombre in nombres or CONTADORES])
@@ -0,0 +1,70 @@
+import heapq
+import random
+
+from django.core.cache import cache
+
+from .models import Producto
+
+
+# ======================================================
+# POOL DE DESCUBRIMIENTO ("Quizás te interese")
+# ======================================================
+# En lugar de ORDER BY RAND() sobre toda la tabla, se guarda en cache una
+# muestra aleatoria de productos recientes, ponderada por visitas. Servir
+# el bloque es tomar unos ids al azar de la muestra y traerlos por id.
+# La muestra se renueva al expirar o con `manage.py refrescar_descubrimiento`.
+
+CLAVE_POOL = "descubrimiento:pool"
+CLAVE_CANDADO = "descubrimiento:candado"
+TAMANO_POOL = 300
+VENTANA_RECIENTES = 5000
+DURACION = 10 * 60
+
+
+def construir_pool(tamano=TAMANO_POOL, ventana=VENTANA_RECIENTES):
+    """
+    Muestreo de reservorio ponderado (Efraimidis-Spirakis) sobre los
+    últimos ``ventana`` productos: cada uno recibe la clave u^(1/peso) con
+    peso = 1 + visitas y se conservan las ``tamano`` claves mayores.
+    """
+    filas = (
+        Producto.objects.order_by("-fecha_agregado", "-id")
+        .values_list("id", "usuario_id", "visitas")[:ventana]
+    )
+    reservorio = []
+    for producto_id, usuario_id, visitas in filas.iterator(chunk_size=1000):
+        clave = random.random() ** (1.0 / (1 + visitas))
+        item = (clave, producto_id, usuario_id)
+        if len(reservorio) < tamano:
+            heapq.heappush(reservorio, item)
+        elif clave > reservorio[0][0]:
+            heapq.heapreplace(reservorio, item)
+
+    pool = [[producto_id, usuario_id] for _, producto_id, usuario_id in reservorio]
+    cache.set(CLAVE_POOL, pool, DURACION)
+    return pool
+
+
+def obtener_pool():
+    pool = cache.get(CLAVE_POOL)
+    if pool is None and cache.add(CLAVE_CANDADO, 1, 60):
+        # Un solo request reconstruye; el resto usa el respaldo mientras tanto
+        try:
+            pool = construir_pool()
+        finally:
+            cache.delete(CLAVE_CANDADO)
+    return pool
+
+
+def descubrir(user, limite=8):
+    pool = obtener_pool()
+    if pool is None:
+        return list(
+            Producto.objects.exclude(usuario=user).select_related("usuario")
+            .order_by("-fecha_agregado", "-id")[:limite]
+        )
+
+    candidatos = [producto_id for producto_id, usuario_id in pool if usuario_id != user.id]
+    ids = random.sample(candidatos, min(limite, len(candidatos)))
+    productos = Producto.objects.select_related("usuario").in_bulk(ids)
+    return [productos[i] for i in ids if i in productos]
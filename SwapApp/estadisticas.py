@@ -0,0 +1,166 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import connection, transaction
+from django.db.models import Case, Count, F, PositiveIntegerField, Q, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Producto, ProductoStatsDiario, Trueque
+
+
+# ======================================================
+# ESTADÍSTICAS DIARIAS (panel del vendedor)
+# ======================================================
+# ProductoStatsDiario guarda una fila por producto y día. El panel arma sus
+# gráficos de 30/90 días sumando esas filas (a lo más una por día y
+# producto) en vez de recorrer Trueque y Producto.
+#   - visitas: las suma visitas.volcar() al escribir su buffer.
+#   - solicitudes / aceptados / rechazados: consolidar() los recalcula desde
+#     Trueque para los últimos días. Las solicitudes cuentan el día en que se
+#     crearon; aceptados y rechazados, el día en que se respondieron
+#     (Trueque.resuelto, que no cambia con los guardados posteriores).
+
+CAMPOS_TRUEQUE = ("solicitudes", "aceptados", "rechazados")
+ESTADOS_ACEPTADOS = ("aceptado", "finalizado")
+PERIODOS = (30, 90)
+
+
+def sumar_visitas(deltas, fecha=None):
+    """Suma {producto_id: visitas} a las filas del día (hoy por defecto)."""
+    fecha = fecha or timezone.localdate()
+    existentes = Producto.objects.filter(id__in=deltas).values_list("id", flat=True)
+    # Primero se aseguran las filas y después se suma sobre ellas, así dos
+    # volcados simultáneos no se pisan
+    ProductoStatsDiario.objects.bulk_create(
+        [ProductoStatsDiario(producto_id=pid, fecha=fecha) for pid in existentes],
+        ignore_conflicts=True,
+    )
+    ProductoStatsDiario.objects.filter(fecha=fecha, producto_id__in=deltas).update(visitas=F("visitas") + Case(
+        *[When(producto_id=pid, then=Value(n)) for pid, n in deltas.items()],
+        default=Value(0), output_field=PositiveIntegerField(),
+    ))
+
+
+def _inicio_del_dia(fecha):
+    return timezone.make_aware(datetime.combine(fecha, time.min))
+
+
+def _respuestas(trueques):
+    """{(producto_id, fecha): (aceptados, rechazados)} por día de respuesta."""
+    filas = (
+        trueques.exclude(estado="pendiente")
+        .annotate(dia=TruncDate("resuelto"))
+        .values_list("producto_id", "dia")
+        .annotate(
+            aceptados=Count("id", filter=Q(estado__in=ESTADOS_ACEPTADOS)),
+            rechazados=Count("id", filter=Q(estado="rechazado")),
+        )
+        .order_by()
+    )
+    return {(producto_id, dia): (aceptados, rechazados) for producto_id, dia, aceptados, rechazados in filas}
+
+
+def _conteos_trueques(desde):
+    """{(producto_id, fecha): {campo: n}} de los trueques desde esa fecha."""
+    inicio = _inicio_del_dia(desde)
+    conteos = defaultdict(lambda: dict.fromkeys(CAMPOS_TRUEQUE, 0))
+
+    solicitudes = (
+        Trueque.objects.filter(fecha__gte=inicio)
+        .annotate(dia=TruncDate("fecha"))
+        .values_list("producto_id", "dia")
+        .annotate(n=Count("id"))
+        .order_by()
+    )
+    for producto_id, dia, n in solicitudes:
+        conteos[producto_id, dia]["solicitudes"] = n
+
+    for clave, (aceptados, rechazados) in _respuestas(Trueque.objects.filter(resuelto__gte=inicio)).items():
+        conteos[clave]["aceptados"] = aceptados
+        conteos[clave]["rechazados"] = rechazados
+    return conteos
+
+
+def _respuestas_anteriores(desde):
+    """
+    Aceptados y rechazados de los días anteriores a la ventana en que se
+    respondió algún trueque que cambió dentro de ella (p. ej. aceptado →
+    rechazado): esos días quedan fuera de la ventana y hay que recalcularlos.
+    """
+    inicio = _inicio_del_dia(desde)
+    dias = set(
+        Trueque.objects.filter(actualizado__gte=inicio, resuelto__lt=inicio)
+        .annotate(dia=TruncDate("resuelto"))
+        .values_list("producto_id", "dia")
+        .distinct()
+    )
+    if not dias:
+        return {}
+    filtro = Q()
+    for producto_id, dia in dias:
+        filtro |= Q(producto_id=producto_id, resuelto__gte=_inicio_del_dia(dia),
+                    resuelto__lt=_inicio_del_dia(dia + timedelta(days=1)))
+    return _respuestas(Trueque.objects.filter(filtro))
+
+
+def consolidar(dias=2, lote=1000):
+    """
+    Recalcula solicitudes, aceptados y rechazados de los últimos ``dias``
+    días (hoy incluido), y aceptados y rechazados de los días anteriores
+    afectados por trueques que cambiaron en ese plazo. Devuelve cuántas
+    filas escribió.
+    """
+    desde = timezone.localdate() - timedelta(days=dias - 1)
+    filas = [
+        ProductoStatsDiario(producto_id=producto_id, fecha=dia, **valores)
+        for (producto_id, dia), valores in _conteos_trueques(desde).items()
+    ]
+    anteriores = [
+        ProductoStatsDiario(producto_id=producto_id, fecha=dia, aceptados=aceptados, rechazados=rechazados)
+        for (producto_id, dia), (aceptados, rechazados) in _respuestas_anteriores(desde).items()
+    ]
+    # MySQL no acepta columnas de conflicto (usa cualquier índice único)
+    unicos = ["producto", "fecha"] if connection.features.supports_update_conflicts_with_target else None
+
+    with transaction.atomic():
+        # Lo que ya no aparece en Trueque (se borró) queda en 0
+        ProductoStatsDiario.objects.filter(fecha__gte=desde).update(
+            **dict.fromkeys(CAMPOS_TRUEQUE, 0)
+        )
+        ProductoStatsDiario.objects.bulk_create(
+            filas, batch_size=lote,
+            update_conflicts=True, unique_fields=unicos, update_fields=list(CAMPOS_TRUEQUE),
+        )
+        # En los días anteriores las solicitudes no cambian
+        ProductoStatsDiario.objects.bulk_create(
+            anteriores, batch_size=lote,
+            update_conflicts=True, unique_fields=unicos, update_fields=["aceptados", "rechazados"],
+        )
+    return len(filas) + len(anteriores)
+
+
+def serie_vendedor(usuario_id, dias):
+    """
+    Totales por día de los productos del usuario en los últimos ``dias``
+    días (los días sin datos van en 0) y la suma del periodo.
+    """
+    hoy = timezone.localdate()
+    desde = hoy - timedelta(days=dias - 1)
+    campos = ("visitas",) + CAMPOS_TRUEQUE
+    por_dia = {
+        fila["fecha"]: fila
+        for fila in (
+            ProductoStatsDiario.objects.filter(producto__usuario_id=usuario_id, fecha__gte=desde)
+            .values("fecha")
+            .annotate(**{campo: Sum(campo) for campo in campos})
+            .order_by("fecha")
+        )
+    }
+    serie = []
+    for i in range(dias):
+        fecha = desde + timedelta(days=i)
+        fila = por_dia.get(fecha, {})
+        serie.append({"fecha": fecha, **{campo: fila.get(campo) or 0 for campo in campos}})
+    totales = {campo: sum(d[campo] for d in serie) for campo in campos}
+    return serie, totales
@@ -0,0 +1,113 @@
+import csv
+import json
+import zlib
+from datetime import datetime, timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from .models import Calificacion, Mensaje, Notificacion, Trueque
+
+
+# ======================================================
+# EXPORTACIÓN DE DATOS (CSV / JSONL)
+# ======================================================
+# Genera el contenido como un iterador de bytes para StreamingHttpResponse
+# o para escribirlo a un archivo, sin cargar la tabla en memoria: las filas
+# se leen con .values() en lotes de LOTE ordenados por id (paginación por
+# cursor: id > último leído) y se van escribiendo a medida que llegan. Con
+# gzip=True la salida se comprime al vuelo (zlib con wbits=31 = formato gzip).
+# Los mensajes movidos al archivo (SwapApp/archivo.py) no se incluyen.
+
+LOTE = 2000
+TAMANO_TROZO = 64 * 1024
+FORMATOS = ("csv", "jsonl")
+
+# nombre → (modelo, campo de fecha para filtrar, columnas)
+TABLAS = {
+    "trueques": (Trueque, "fecha", ("id", "solicitante_id", "receptor_id", "producto_id", "estado", "fecha", "actualizado")),
+    "mensajes": (Mensaje, "fecha", ("id", "chat_id", "autor_id", "contenido", "fecha")),
+    "calificaciones": (Calificacion, "fecha", ("id", "vendedor_id", "comprador_id", "trueque_id", "estrellas", "fecha")),
+    "notificaciones": (Notificacion, "creado", ("id", "usuario_id", "tipo", "titulo", "mensaje", "link", "visible", "cantidad", "creado")),
+}
+
+
+def _inicio_del_dia(fecha):
+    return timezone.make_aware(datetime.combine(fecha, datetime.min.time()))
+
+
+def filas(tabla, desde=None, hasta=None, lote=LOTE):
+    """Diccionarios de la tabla con fecha entre desde y hasta (fechas, ambas incluidas)."""
+    modelo, campo_fecha, columnas = TABLAS[tabla]
+    qs = modelo.objects.all()
+    if desde:
+        qs = qs.filter(**{f"{campo_fecha}__gte": _inicio_del_dia(desde)})
+    if hasta:
+        qs = qs.filter(**{f"{campo_fecha}__lt": _inicio_del_dia(hasta + timedelta(days=1))})
+
+    ultimo = 0
+    while True:
+        bloque = list(qs.filter(id__gt=ultimo).order_by("id").values(*columnas)[:lote])
+        yield from bloque
+        if len(bloque) < lote:
+            return
+        ultimo = bloque[-1]["id"]
+
+
+class _Linea:
+    """Destino para csv.writer: devuelve la línea en vez de guardarla."""
+
+    def write(self, texto):
+        return texto
+
+
+def _csv(columnas, datos):
+    escritor = csv.writer(_Linea())
+    yield escritor.writerow(columnas)
+    for fila in datos:
+        yield escritor.writerow([
+            v.isoformat() if isinstance(v, datetime) else v
+            for v in fila.values()
+        ])
+
+
+def _jsonl(datos):
+    for fila in datos:
+        yield json.dumps(fila, cls=DjangoJSONEncoder, ensure_ascii=False) + "\n"
+
+
+def _agrupar(lineas, tamano=TAMANO_TROZO):
+    """Junta las líneas en trozos de unos ``tamano`` bytes (menos escrituras)."""
+    buffer, largo = [], 0
+    for linea in lineas:
+        datos = linea.encode("utf-8")
+        buffer.append(datos)
+        largo += len(datos)
+        if largo >= tamano:
+            yield b"".join(buffer)
+            buffer, largo = [], 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def _gzip(trozos):
+    compresor = zlib.compressobj(wbits=31)
+    for trozo in trozos:
+        salida = compresor.compress(trozo)
+        if salida:
+            yield salida
+    yield compresor.flush()
+
+
+def exportar(tabla, formato="csv", desde=None, hasta=None, gzip=False, lote=LOTE):
+    """Iterador de bytes con el contenido exportado."""
+    columnas = TABLAS[tabla][2]
+    datos = filas(tabla, desde, hasta, lote)
+    lineas = _csv(columnas, datos) if formato == "csv" else _jsonl(datos)
+    trozos = _agrupar(lineas)
+    return _gzip(trozos) if gzip else trozos
+
+
+def nombre_archivo(tabla, formato, desde=None, hasta=None, gzip=False):
+    partes = [tabla] + [f.isoformat() for f in (desde, hasta) if f]
+    return "_".join(partes) + f".{formato}" + (".gz" if gzip else "")
@@ -0,0 +1,61 @@
+from django.core.cache import cache
+from django.db.models import Count
+
+from .busqueda import version_catalogo
+from .models import Producto
+
+
+# ======================================================
+# FACETAS DEL CATÁLOGO (categorías y tags con conteos)
+# ======================================================
+# Cada dimensión se cuenta con una sola consulta agrupada. Las categorías
+# se cuentan sin el filtro de categoría (para ver cuántos productos habría
+# al cambiarla); los tags con todos los filtros, porque se combinan entre sí.
+# Se guardan en cache por combinación de filtros y versión del catálogo.
+
+DURACION = 10 * 60
+
+
+def filtrar(queryset, categoria=None, tags=()):
+    if categoria is not None:
+        queryset = queryset.filter(categoria_id=categoria)
+    for tag in tags:
+        queryset = queryset.filter(tags__id=tag)
+    return queryset
+
+
+def _contar_categorias(tags):
+    filas = (
+        filtrar(Producto.objects.all(), tags=tags)
+        .values("categoria_id", "categoria__nombre")
+        .annotate(total=Count("id"))
+        .order_by("-total", "categoria__nombre")
+    )
+    return [
+        {"id": f["categoria_id"], "nombre": f["categoria__nombre"] or "Sin categoría", "total": f["total"]}
+        for f in filas
+    ]
+
+
+def _contar_tags(categoria, tags):
+    productos = filtrar(Producto.objects.all(), categoria, tags).values("id")
+    filas = (
+        Producto.tags.through.objects.filter(producto_id__in=productos)
+        .values("tag_id", "tag__nombre")
+        .annotate(total=Count("producto_id"))
+        .order_by("-total", "tag__nombre")
+    )
+    return [{"id": f["tag_id"], "nombre": f["tag__nombre"], "total": f["total"]} for f in filas]
+
+
+def facetas(categoria=None, tags=()):
+    tags = sorted(set(tags))
+    clave = f"facetas:{version_catalogo()}:{categoria or ''}:{','.join(map(str, tags))}"
+    resultado = cache.get(clave)
+    if resultado is None:
+        resultado = {
+            "categorias": _contar_categorias(tags),
+            "tags": _contar_tags(categoria, tags),
+        }
+        cache.set(clave, resultado, DURACION)
+    return resultado
@@ -0,0 +1,158 @@
+import time
+from datetime import datetime, timedelta
+
+from django.contrib.auth.models import User
+from django.db.models import Count, Q
+from django.db.models.functions import TruncWeek
+from django.utils import timezone
+
+from .models import Mensaje, Producto, SnapshotInsights, Trueque
+
+
+# ======================================================
+# SNAPSHOT DE INSIGHTS
+# ======================================================
+# Las estadísticas del panel de administración recorren tablas completas
+# (agrupar Trueque por producto, contar usuarios, productos y trueques), así
+# que no se calculan en cada visita: `manage.py refrescar_insights` (cada
+# unos minutos, p. ej. desde cron) guarda el resultado como una fila de
+# SnapshotInsights y panel_insight solo lee la más reciente.
+
+TOP = 10
+SEMANAS = 12
+DIAS_ACTIVOS = 30
+CONSERVAR = 100
+# Más antiguo que esto, el panel avisa que el snapshot está desactualizado
+ANTIGUEDAD_MAXIMA = timedelta(hours=1)
+ESTADOS_ACEPTADOS = ("aceptado", "finalizado")
+
+
+def _tasa(aceptados, rechazados):
+    resueltos = aceptados + rechazados
+    return round(100 * aceptados / resueltos, 1) if resueltos else None
+
+
+def _totales():
+    trueques = Trueque.objects.aggregate(
+        trueques=Count("id"),
+        aceptados=Count("id", filter=Q(estado__in=ESTADOS_ACEPTADOS)),
+        rechazados=Count("id", filter=Q(estado="rechazado")),
+        pendientes=Count("id", filter=Q(estado="pendiente")),
+    )
+    return {
+        "usuarios": User.objects.count(),
+        "productos": Producto.objects.count(),
+        **trueques,
+    }
+
+
+def _usuarios_activos(desde):
+    """Usuarios que publicaron, pidieron o respondieron un trueque o escribieron."""
+    activos = set(Producto.objects.filter(fecha_agregado__gte=desde).values_list("usuario_id", flat=True).distinct())
+    activos.update(Trueque.objects.filter(fecha__gte=desde).values_list("solicitante_id", flat=True).distinct())
+    activos.update(Trueque.objects.filter(actualizado__gte=desde).exclude(estado="pendiente")
+                   .values_list("receptor_id", flat=True).distinct())
+    activos.update(Mensaje.objects.filter(fecha__gte=desde).values_list("autor_id", flat=True).distinct())
+    return len(activos)
+
+
+def _top_productos(top):
+    filas = (
+        Trueque.objects.values("producto_id", "producto__nombre", "producto__usuario__username")
+        .annotate(
+            solicitudes=Count("id"),
+            aceptados=Count("id", filter=Q(estado__in=ESTADOS_ACEPTADOS)),
+            rechazados=Count("id", filter=Q(estado="rechazado")),
+        )
+        .order_by("-solicitudes", "producto_id")[:top]
+    )
+    return [
+        {
+            "id": f["producto_id"],
+            "nombre": f["producto__nombre"],
+            "vendedor": f["producto__usuario__username"],
+            "solicitudes": f["solicitudes"],
+            "aceptados": f["aceptados"],
+            "tasa_aceptacion": _tasa(f["aceptados"], f["rechazados"]),
+        }
+        for f in filas
+    ]
+
+
+def _top_vendedores(top):
+    filas = (
+        Producto.objects.values(
+            "usuario_id", "usuario__username",
+            "usuario__perfil__estrellas_totales", "usuario__perfil__cantidad_calificaciones",
+        )
+        .annotate(total_productos=Count("id"))
+        .order_by("-total_productos", "usuario_id")[:top]
+    )
+    vendedores = []
+    for f in filas:
+        cantidad = f["usuario__perfil__cantidad_calificaciones"] or 0
+        vendedores.append({
+            "usuario": f["usuario__username"],
+            "total_productos": f["total_productos"],
+            "promedio": round(f["usuario__perfil__estrellas_totales"] / cantidad, 2) if cantidad else 0,
+        })
+    return vendedores
+
+
+def _crecimiento(semanas):
+    """Altas por semana (lunes) de usuarios, productos y trueques."""
+    hoy = timezone.localdate()
+    lunes = hoy - timedelta(days=hoy.weekday())
+    inicio = lunes - timedelta(weeks=semanas - 1)
+    desde = timezone.make_aware(datetime.combine(inicio, datetime.min.time()))
+
+    serie = {
+        (inicio + timedelta(weeks=i)).isoformat(): {"usuarios": 0, "productos": 0, "trueques": 0}
+        for i in range(semanas)
+    }
+    fuentes = (
+        ("usuarios", User.objects, "date_joined"),
+        ("productos", Producto.objects, "fecha_agregado"),
+        ("trueques", Trueque.objects, "fecha"),
+    )
+    for nombre, qs, campo in fuentes:
+        filas = (
+            qs.filter(**{f"{campo}__gte": desde})
+            .annotate(semana=TruncWeek(campo))
+            .values_list("semana")
+            .annotate(n=Count("id"))
+            .order_by()
+        )
+        for semana, n in filas:
+            clave = timezone.localtime(semana).date().isoformat()
+            if clave in serie:
+                serie[clave][nombre] = n
+    return [{"semana": semana, **valores} for semana, valores in serie.items()]
+
+
+def calcular(top=TOP):
+    inicio = time.monotonic()
+    totales = _totales()
+    datos = {
+        "totales": totales,
+        "tasa_aceptacion": _tasa(totales["aceptados"], totales["rechazados"]),
+        "usuarios_activos": _usuarios_activos(timezone.now() - timedelta(days=DIAS_ACTIVOS)),
+        "dias_activos": DIAS_ACTIVOS,
+        "top_productos": _top_productos(top),
+        "top_vendedores": _top_vendedores(top),
+        "crecimiento": _crecimiento(SEMANAS),
+    }
+    datos["segundos"] = round(time.monotonic() - inicio, 2)
+    return datos
+
+
+def refrescar(top=TOP, conservar=CONSERVAR):
+    """Calcula y guarda un snapshot nuevo; borra los que pasen de ``conservar``."""
+    snapshot = SnapshotInsights.objects.create(datos=calcular(top))
+    viejos = SnapshotInsights.objects.order_by("-creado", "-id").values_list("id", flat=True)[conservar:]
+    SnapshotInsights.objects.filter(id__in=list(viejos)).delete()
+    return snapshot
+
+
+def ultimo():
+    return SnapshotInsights.objects.order_by("-creado").first()
@@ -0,0 +1,43 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.utils import timezone
+
+from SwapApp import archivo
+from SwapApp.models import Chat
+
+
+class Command(BaseCommand):
+    help = "Mueve los mensajes antiguos de chats inactivos a archivos comprimidos."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dias", type=int, default=90,
+                            help="Chats sin mensajes nuevos en estos días.")
+        parser.add_argument("--cerrados", action="store_true",
+                            help="Incluye los chats de trueques cerrados (rechazados o finalizados) "
+                                 "sin importar su actividad.")
+        parser.add_argument("--mantener", type=int, default=archivo.MANTENER,
+                            help="Mensajes más recientes de cada chat que quedan en la tabla.")
+        parser.add_argument("--lote", type=int, default=archivo.LOTE,
+                            help="Mensajes por segmento comprimido.")
+
+    def handle(self, *args, **options):
+        if options["mantener"] < 1:
+            # El último mensaje es la vista previa de la bandeja (Chat.ultimo_mensaje)
+            raise CommandError("--mantener debe ser al menos 1.")
+        if options["lote"] < 1:
+            raise CommandError("--lote debe ser al menos 1.")
+
+        filtro = Q(ultima_actividad__lt=timezone.now() - timedelta(days=options["dias"]))
+        if options["cerrados"]:
+            filtro |= Q(trueque__estado__in=["rechazado", "finalizado"])
+        chat_ids = Chat.objects.filter(filtro).order_by("id").values_list("id", flat=True)
+
+        chats = mensajes = 0
+        for chat_id in chat_ids.iterator(chunk_size=500):
+            movidos = archivo.archivar(chat_id, options["mantener"], options["lote"])
+            if movidos:
+                chats += 1
+                mensajes += movidos
+        self.stdout.write(self.style.SUCCESS(f"{mensajes} mensajes archivados de {chats} chats."))
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from SwapApp import estadisticas
+
+
+class Command(BaseCommand):
+    help = "Recalcula las estadísticas diarias de trueques por producto (panel del vendedor)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dias", type=int, default=2,
+                            help="Días hacia atrás que se recalculan, hoy incluido "
+                                 "(la primera vez, p. ej. --dias 90).")
+        parser.add_argument("--lote", type=int, default=1000,
+                            help="Filas por INSERT.")
+
+    def handle(self, *args, **options):
+        if options["dias"] < 1 or options["lote"] < 1:
+            raise CommandError("--dias y --lote deben ser al menos 1.")
+
+        inicio = time.monotonic()
+        filas = estadisticas.consolidar(options["dias"], options["lote"])
+        self.stdout.write(self.style.SUCCESS(
+            f"{filas} filas consolidadas en {time.monotonic() - inicio:.1f} s."
+        ))
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from SwapApp import notificaciones
+
+
+class Command(BaseCommand):
+    help = "Worker que entrega las notificaciones encoladas con notificar()."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lote", type=int, default=notificaciones.LOTE,
+                            help="Pendientes que se despachan por transacción.")
+        parser.add_argument("--pausa", type=float, default=1.0,
+                            help="Segundos de espera cuando la cola está vacía.")
+        parser.add_argument("--una-vez", action="store_true",
+                            help="Vacía la cola y termina.")
+
+    def handle(self, *args, **options):
+        total = 0
+        try:
+            while True:
+                despachados = notificaciones.despachar(options["lote"])
+                total += despachados
+                if despachados:
+                    continue
+                if options["una_vez"]:
+                    break
+                close_old_connections()
+                time.sleep(options["pausa"])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f"{total} pendientes despachados."))
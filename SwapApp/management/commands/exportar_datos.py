@@ -0,0 +1,49 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from SwapApp import exportacion
+
+
+def _fecha(valor):
+    fecha = parse_date(valor)
+    if fecha is None:
+        raise ValueError(valor)
+    return fecha
+
+
+class Command(BaseCommand):
+    help = "Exporta trueques, mensajes, calificaciones o notificaciones como CSV o JSONL."
+
+    def add_arguments(self, parser):
+        parser.add_argument("tabla", choices=sorted(exportacion.TABLAS))
+        parser.add_argument("--formato", choices=exportacion.FORMATOS, default="csv")
+        parser.add_argument("--desde", type=_fecha, help="Fecha inicial AAAA-MM-DD (incluida).")
+        parser.add_argument("--hasta", type=_fecha, help="Fecha final AAAA-MM-DD (incluida).")
+        parser.add_argument("--gzip", action="store_true", help="Comprime la salida con gzip.")
+        parser.add_argument("--lote", type=int, default=exportacion.LOTE,
+                            help="Filas por consulta.")
+        parser.add_argument("--salida", default="-",
+                            help="Archivo de destino ('-' = salida estándar).")
+
+    def handle(self, *args, **options):
+        if options["lote"] < 1:
+            raise CommandError("--lote debe ser al menos 1.")
+
+        trozos = exportacion.exportar(
+            options["tabla"], options["formato"], options["desde"], options["hasta"],
+            options["gzip"], options["lote"],
+        )
+        if options["salida"] == "-":
+            for trozo in trozos:
+                sys.stdout.buffer.write(trozo)
+            sys.stdout.buffer.flush()
+            return
+
+        total = 0
+        with open(options["salida"], "wb") as f:
+            for trozo in trozos:
+                f.write(trozo)
+                total += len(trozo)
+        self.stdout.write(self.style.SUCCESS(f"{total} bytes escritos en {options['salida']}."))
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from SwapApp import notificaciones
+
+
+class Command(BaseCommand):
+    help = "Borra notificaciones leídas antiguas y limita el historial por usuario."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dias", type=int, default=30,
+                            help="Borra las leídas con más de estos días.")
+        parser.add_argument("--max-por-usuario", type=int, default=200,
+                            help="Leídas que se conservan por usuario (0 = sin límite).")
+        parser.add_argument("--lote", type=int, default=notificaciones.LOTE_PURGA,
+                            help="Filas por DELETE.")
+        parser.add_argument("--pausa", type=float, default=0.2,
+                            help="Segundos de espera entre lotes.")
+
+    def handle(self, *args, **options):
+        if options["lote"] < 1:
+            raise CommandError("--lote debe ser al menos 1.")
+
+        fases = [("antiguas", lambda: notificaciones.purgar_antiguas(
+            options["dias"], options["lote"], options["pausa"]))]
+        if options["max_por_usuario"] > 0:
+            fases.append(("excedentes", lambda: notificaciones.purgar_excedentes(
+                options["max_por_usuario"], options["lote"], options["pausa"])))
+
+        for nombre, purgar in fases:
+            inicio = time.monotonic()
+            borradas = purgar()
+            segundos = time.monotonic() - inicio
+            ritmo = borradas / segundos if segundos else 0
+            self.stdout.write(self.style.SUCCESS(
+                f"{nombre}: {borradas} notificaciones borradas en {segundos:.1f} s ({ritmo:.0f} filas/s)."
+            ))
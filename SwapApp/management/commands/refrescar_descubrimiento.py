@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from SwapApp import descubrimiento
+
+
+class Command(BaseCommand):
+    help = "Renueva la muestra aleatoria de productos del bloque 'Quizás te interese'."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tamano", type=int, default=descubrimiento.TAMANO_POOL)
+        parser.add_argument("--ventana", type=int, default=descubrimiento.VENTANA_RECIENTES)
+
+    def handle(self, *args, **options):
+        pool = descubrimiento.construir_pool(options["tamano"], options["ventana"])
+        self.stdout.write(self.style.SUCCESS(f"Pool de descubrimiento con {len(pool)} productos."))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from SwapApp import insights
+
+
+class Command(BaseCommand):
+    help = "Recalcula las estadísticas del panel de insights y guarda un snapshot nuevo."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top", type=int, default=insights.TOP,
+                            help="Productos y vendedores en los rankings.")
+        parser.add_argument("--conservar", type=int, default=insights.CONSERVAR,
+                            help="Snapshots que se conservan (los más nuevos).")
+
+    def handle(self, *args, **options):
+        if options["top"] < 1 or options["conservar"] < 1:
+            raise CommandError("--top y --conservar deben ser al menos 1.")
+
+        snapshot = insights.refrescar(options["top"], options["conservar"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Snapshot de insights guardado en {snapshot.datos['segundos']} s."
+        ))
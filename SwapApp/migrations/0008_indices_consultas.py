@@ -0,0 +1,43 @@
+# Generated by Django 5.0 on 2026-10-17 20:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('SwapApp', '0007_alter_calificacion_estrellas_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='mensaje',
+            index=models.Index(fields=['chat', 'id'], name='mensaje_chat_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mensaje',
+            index=models.Index(fields=['chat', 'fecha'], name='mensaje_chat_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notificacion',
+            index=models.Index(fields=['usuario', 'visible', 'creado'], name='notif_usuario_visible_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['fecha_agregado', 'id'], name='producto_fecha_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['usuario', 'fecha_agregado'], name='producto_usuario_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trueque',
+            index=models.Index(fields=['receptor', 'estado', 'fecha'], name='trueque_receptor_estado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trueque',
+            index=models.Index(fields=['solicitante', 'estado', 'fecha'], name='trueque_solicit_estado_idx'),
+        ),
+    ]
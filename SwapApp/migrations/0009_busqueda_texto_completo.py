@@ -0,0 +1,107 @@
+# Generated by Django 5.0 on 2026-10-17 20:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+TABLA = 'SwapApp_productobusqueda'
+FTS = 'SwapApp_productobusqueda_fts'
+COLUMNAS = 'nombre, descripcion, tags, categoria, usuario'
+
+SQLITE_FTS = [
+    f"""CREATE VIRTUAL TABLE "{FTS}" USING fts5(
+        {COLUMNAS}, content='{TABLA}', content_rowid='producto_id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER "{FTS}_ai" AFTER INSERT ON "{TABLA}" BEGIN
+        INSERT INTO "{FTS}"(rowid, {COLUMNAS})
+        VALUES (new.producto_id, new.nombre, new.descripcion, new.tags, new.categoria, new.usuario);
+    END""",
+    f"""CREATE TRIGGER "{FTS}_ad" AFTER DELETE ON "{TABLA}" BEGIN
+        INSERT INTO "{FTS}"("{FTS}", rowid, {COLUMNAS})
+        VALUES ('delete', old.producto_id, old.nombre, old.descripcion, old.tags, old.categoria, old.usuario);
+    END""",
+    f"""CREATE TRIGGER "{FTS}_au" AFTER UPDATE ON "{TABLA}" BEGIN
+        INSERT INTO "{FTS}"("{FTS}", rowid, {COLUMNAS})
+        VALUES ('delete', old.producto_id, old.nombre, old.descripcion, old.tags, old.categoria, old.usuario);
+        INSERT INTO "{FTS}"(rowid, {COLUMNAS})
+        VALUES (new.producto_id, new.nombre, new.descripcion, new.tags, new.categoria, new.usuario);
+    END""",
+    f"""INSERT INTO "{FTS}"("{FTS}") VALUES ('rebuild')""",
+]
+
+MYSQL_FULLTEXT = [
+    f"CREATE FULLTEXT INDEX busqueda_texto_ft ON `{TABLA}` ({COLUMNAS})",
+    f"CREATE FULLTEXT INDEX busqueda_nombre_ft ON `{TABLA}` (nombre)",
+]
+
+
+def poblar_documentos(apps, schema_editor):
+    Producto = apps.get_model('SwapApp', 'Producto')
+    ProductoBusqueda = apps.get_model('SwapApp', 'ProductoBusqueda')
+
+    lote = []
+    productos = Producto.objects.select_related('usuario', 'categoria').prefetch_related('tags')
+    for p in productos.iterator(chunk_size=500):
+        lote.append(ProductoBusqueda(
+            producto_id=p.id,
+            nombre=p.nombre,
+            descripcion=p.descripcion,
+            tags=' '.join(t.nombre for t in p.tags.all()),
+            categoria=p.categoria.nombre if p.categoria else '',
+            usuario=p.usuario.username,
+        ))
+        if len(lote) >= 500:
+            ProductoBusqueda.objects.bulk_create(lote)
+            lote = []
+    ProductoBusqueda.objects.bulk_create(lote)
+
+
+def crear_indice_texto(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'mysql':
+        sentencias = MYSQL_FULLTEXT
+    elif vendor == 'sqlite':
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+            if not cursor.fetchone()[0]:
+                return
+        sentencias = SQLITE_FTS
+    else:
+        return
+    for sql in sentencias:
+        schema_editor.execute(sql)
+
+
+def borrar_indice_texto(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'mysql':
+        schema_editor.execute(f"DROP INDEX busqueda_texto_ft ON `{TABLA}`")
+        schema_editor.execute(f"DROP INDEX busqueda_nombre_ft ON `{TABLA}`")
+    elif vendor == 'sqlite':
+        for sufijo in ('ai', 'ad', 'au'):
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS "{FTS}_{sufijo}"')
+        schema_editor.execute(f'DROP TABLE IF EXISTS "{FTS}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('SwapApp', '0008_indices_consultas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductoBusqueda',
+            fields=[
+                ('producto', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='busqueda', serialize=False, to='SwapApp.producto')),
+                ('nombre', models.CharField(max_length=100)),
+                ('descripcion', models.TextField(blank=True)),
+                ('tags', models.TextField(blank=True)),
+                ('categoria', models.CharField(blank=True, max_length=100)),
+                ('usuario', models.CharField(blank=True, max_length=150)),
+            ],
+        ),
+        migrations.RunPython(poblar_documentos, migrations.RunPython.noop),
+        migrations.RunPython(crear_indice_texto, borrar_indice_texto),
+    ]
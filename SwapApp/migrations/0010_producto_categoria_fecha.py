@@ -0,0 +1,19 @@
+# Generated by Django 5.0 on 2026-10-17 20:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('SwapApp', '0009_busqueda_texto_completo'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['categoria', 'fecha_agregado', 'id'], name='producto_categoria_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.0 on 2026-10-17 20:49
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def poblar_bandeja(apps, schema_editor):
+    # El historial existente se da por leído para no llenar la bandeja de avisos
+    Chat = apps.get_model('SwapApp', 'Chat')
+    Mensaje = apps.get_model('SwapApp', 'Mensaje')
+    ultimo = Mensaje.objects.filter(chat=OuterRef('pk')).order_by('-id').values('id')[:1]
+    Chat.objects.update(
+        ultimo_mensaje_id=Subquery(ultimo),
+        ultimo_leido_solicitante=Coalesce(Subquery(ultimo), 0),
+        ultimo_leido_receptor=Coalesce(Subquery(ultimo), 0),
+    )
+    fecha = Mensaje.objects.filter(id=OuterRef('ultimo_mensaje_id')).values('fecha')[:1]
+    Chat.objects.filter(ultimo_mensaje__isnull=False).update(ultima_actividad=Subquery(fecha))
+    Chat.objects.filter(ultimo_mensaje__isnull=True).update(ultima_actividad=F('creado'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('SwapApp', '0010_producto_categoria_fecha'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chat',
+            name='ultima_actividad',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='chat',
+            name='ultimo_leido_receptor',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='chat',
+            name='ultimo_leido_solicitante',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='chat',
+            name='ultimo_mensaje',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='SwapApp.mensaje'),
+        ),
+        migrations.RunPython(poblar_bandeja, migrations.RunPython.noop),
+    ]
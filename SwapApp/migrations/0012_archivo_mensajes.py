@@ -0,0 +1,34 @@
+# Generated by Django 5.0 on 2026-10-17 21:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('SwapApp', '0011_bandeja_chats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chat',
+            name='archivado_hasta',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='ArchivoMensajes',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('desde_id', models.PositiveBigIntegerField()),
+                ('hasta_id', models.PositiveBigIntegerField()),
+                ('cantidad', models.PositiveIntegerField()),
+                ('archivo', models.FileField(upload_to='archivo_chats/')),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('chat', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archivos', to='SwapApp.chat')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['chat', 'hasta_id'], name='archivo_chat_hasta_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.0 on 2026-10-17 21:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('SwapApp', '0012_archivo_mensajes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificacion',
+            name='cantidad',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='notificacion',
+            name='chat',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='SwapApp.chat'),
+        ),
+        migrations.AddConstraint(
+            model_name='notificacion',
+            constraint=models.UniqueConstraint(fields=('usuario', 'chat'), name='notif_usuario_chat_uniq'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.0 on 2026-10-17 21:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('SwapApp', '0013_notificaciones_agrupadas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificacionPendiente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('usuarios', models.JSONField()),
+                ('titulo', models.CharField(max_length=150)),
+                ('mensaje', models.CharField(max_length=300)),
+                ('tipo', models.CharField(blank=True, max_length=50)),
+                ('link', models.CharField(blank=True, max_length=300)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
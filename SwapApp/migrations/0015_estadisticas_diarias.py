@@ -0,0 +1,59 @@
+# Generated by Django 5.0 on 2026-10-17 21:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F
+
+
+def actualizado_desde_fecha(apps, schema_editor):
+    # Sin historial de cambios: se toma la fecha de la solicitud
+    Trueque = apps.get_model('SwapApp', 'Trueque')
+    Trueque.objects.update(actualizado=F('fecha'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('SwapApp', '0014_cola_notificaciones'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductoStatsDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('visitas', models.PositiveIntegerField(default=0)),
+                ('solicitudes', models.PositiveIntegerField(default=0)),
+                ('aceptados', models.PositiveIntegerField(default=0)),
+                ('rechazados', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='trueque',
+            name='actualizado',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='trueque',
+            index=models.Index(fields=['fecha'], name='trueque_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trueque',
+            index=models.Index(fields=['actualizado'], name='trueque_actualizado_idx'),
+        ),
+        migrations.AddField(
+            model_name='productostatsdiario',
+            name='producto',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stats_diarias', to='SwapApp.producto'),
+        ),
+        migrations.AddIndex(
+            model_name='productostatsdiario',
+            index=models.Index(fields=['fecha'], name='stats_fecha_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='productostatsdiario',
+            constraint=models.UniqueConstraint(fields=('producto', 'fecha'), name='stats_producto_fecha_uniq'),
+        ),
+        migrations.RunPython(actualizado_desde_fecha, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.0 on 2026-10-17 22:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('SwapApp', '0015_estadisticas_diarias'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SnapshotInsights',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('creado', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('datos', models.JSONField()),
+            ],
+        ),
+    ]
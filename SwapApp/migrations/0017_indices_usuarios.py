@@ -0,0 +1,36 @@
+# Generated by Django 5.0 on 2026-10-17 22:45
+
+from django.db import migrations, models
+
+
+# auth_user no es un modelo de la app, así que sus índices para la consola
+# de moderación (búsqueda por prefijo de email y orden por fecha de alta)
+# se crean a mano.
+INDICES = [
+    models.Index(fields=['email'], name='auth_user_email_idx'),
+    models.Index(fields=['date_joined', 'id'], name='auth_user_joined_idx'),
+]
+
+
+def crear_indices(apps, schema_editor):
+    User = apps.get_model('auth', 'User')
+    for indice in INDICES:
+        schema_editor.add_index(User, indice)
+
+
+def borrar_indices(apps, schema_editor):
+    User = apps.get_model('auth', 'User')
+    for indice in INDICES:
+        schema_editor.remove_index(User, indice)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('SwapApp', '0016_snapshot_insights'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indices, borrar_indices),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.0 on 2026-10-18 10:20
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def resuelto_desde_actualizado(apps, schema_editor):
+    # Sin historial: para los ya respondidos se toma su último cambio
+    Trueque = apps.get_model('SwapApp', 'Trueque')
+    Trueque.objects.exclude(estado='pendiente').update(resuelto=F('actualizado'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('SwapApp', '0017_indices_usuarios'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trueque',
+            name='resuelto',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='trueque',
+            index=models.Index(fields=['resuelto'], name='trueque_resuelto_idx'),
+        ),
+        migrations.RunPython(resuelto_desde_actualizado, migrations.RunPython.noop),
+    ]
@@ -77,10 +77,69 @@ class Producto(models.Model):
 
     visitas = models.PositiveIntegerField(default=0)
 
+    class Meta:
+        indexes = [
+            # Feed del home (paginación por cursor)
+            models.Index(fields=['fecha_agregado', 'id'], name='producto_fecha_id_idx'),
+            # Productos de un usuario, más recientes primero
+            models.Index(fields=['usuario', 'fecha_agregado'], name='producto_usuario_fecha_idx'),
+            # Feed filtrado por categoría
+            models.Index(fields=['categoria', 'fecha_agregado', 'id'], name='producto_categoria_fecha_idx'),
+        ]
+
     def __str__(self):
         return self.nombre
 
 
+# ======================================================
+# DOCUMENTO DE BÚSQUEDA (texto indexado de cada producto)
+# ======================================================
+class ProductoBusqueda(models.Model):
+    """
+    Copia desnormalizada del texto buscable de un producto. Sobre esta
+    tabla va el índice FULLTEXT (MySQL) o la tabla FTS5 (SQLite).
+    Se mantiene desde signal.py.
+    """
+    producto = models.OneToOneField(Producto, on_delete=models.CASCADE, primary_key=True, related_name='busqueda')
+    nombre = models.CharField(max_length=100)
+    descripcion = models.TextField(blank=True)
+    tags = models.TextField(blank=True)
+    categoria = models.CharField(max_length=100, blank=True)
+    usuario = models.CharField(max_length=150, blank=True)
+
+    def __str__(self):
+        return f"Búsqueda de {self.nombre}"
+
+
+# ======================================================
+# ESTADÍSTICAS DIARIAS DE PRODUCTO
+# ======================================================
+class ProductoStatsDiario(models.Model):
+    """
+    Totales de un producto en un día, para los gráficos del panel del
+    vendedor. Las visitas las suma visitas.volcar(); solicitudes, aceptados
+    y rechazados los recalcula el comando consolidar_estadisticas.
+    """
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='stats_diarias')
+    fecha = models.DateField()
+    visitas = models.PositiveIntegerField(default=0)
+    solicitudes = models.PositiveIntegerField(default=0)
+    aceptados = models.PositiveIntegerField(default=0)
+    rechazados = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['producto', 'fecha'], name='stats_producto_fecha_uniq'),
+        ]
+        indexes = [
+            # Recálculo de una ventana de días
+            models.Index(fields=['fecha'], name='stats_fecha_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.producto_id} {self.fecha}"
+
+
 # ======================================================
 # TRUEQUE
 # ======================================================
@@ -96,6 +155,30 @@ class Trueque(models.Model):
     producto = models.ForeignKey(Producto, on_delete=models.CASCADE)
     estado = models.CharField(max_length=10, choices=ESTADOS, default='pendiente')
     fecha = models.DateTimeField(auto_now_add=True)
+    # Último guardado (cualquier cambio, también las confirmaciones del trato)
+    actualizado = models.DateTimeField(auto_now=True)
+    # Cuándo dejó de estar pendiente; se fija una sola vez en save().
+    # consolidar_estadisticas cuenta aceptados y rechazados en este día.
+    resuelto = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Solicitudes pendientes / aceptadas del receptor
+            models.Index(fields=['receptor', 'estado', 'fecha'], name='trueque_receptor_estado_idx'),
+            # Trueques aceptados del solicitante
+            models.Index(fields=['solicitante', 'estado', 'fecha'], name='trueque_solicit_estado_idx'),
+            # Ventanas de consolidar_estadisticas
+            models.Index(fields=['fecha'], name='trueque_fecha_idx'),
+            models.Index(fields=['actualizado'], name='trueque_actualizado_idx'),
+            models.Index(fields=['resuelto'], name='trueque_resuelto_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.estado != 'pendiente' and self.resuelto is None:
+            self.resuelto = timezone.now()
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'resuelto'}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.solicitante.username} → {self.receptor.username} ({self.estado})"
@@ -109,6 +192,18 @@ class Chat(models.Model):
     usuarios = models.ManyToManyField(User)
     creado = models.DateTimeField(auto_now_add=True)
 
+    # Bandeja de entrada: se actualizan en api_send_message para listar los
+    # chats por actividad, con vista previa y no leídos, sin una consulta por chat.
+    ultimo_mensaje = models.ForeignKey(
+        'Mensaje', null=True, blank=True, on_delete=models.SET_NULL, related_name='+'
+    )
+    ultima_actividad = models.DateTimeField(default=timezone.now, db_index=True)
+    # Id del último mensaje leído por cada participante del trueque
+    ultimo_leido_solicitante = models.PositiveBigIntegerField(default=0)
+    ultimo_leido_receptor = models.PositiveBigIntegerField(default=0)
+    # Id del mensaje más nuevo movido al archivo (0 si no hay archivo)
+    archivado_hasta = models.PositiveBigIntegerField(default=0)
+
     def __str__(self):
         try:
             nombres = ', '.join([u.username for u in self.usuarios.all()])
@@ -126,10 +221,42 @@ class Mensaje(models.Model):
     contenido = models.TextField(max_length=500)
     fecha = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Mensajes de un chat (since_id / historial)
+            models.Index(fields=['chat', 'id'], name='mensaje_chat_id_idx'),
+            models.Index(fields=['chat', 'fecha'], name='mensaje_chat_fecha_idx'),
+        ]
+
     def __str__(self):
         return f"{self.autor.username}: {self.contenido[:30]}"
 
 
+# ======================================================
+# ARCHIVO DE MENSAJES (mensajes antiguos comprimidos)
+# ======================================================
+class ArchivoMensajes(models.Model):
+    """
+    Segmento de mensajes consecutivos de un chat (ids desde_id..hasta_id)
+    guardado como JSONL comprimido con gzip. Lo genera el comando
+    compactar_mensajes y se lee al paginar hacia atrás (SwapApp/archivo.py).
+    """
+    chat = models.ForeignKey(Chat, on_delete=models.CASCADE, related_name='archivos')
+    desde_id = models.PositiveBigIntegerField()
+    hasta_id = models.PositiveBigIntegerField()
+    cantidad = models.PositiveIntegerField()
+    archivo = models.FileField(upload_to='archivo_chats/')
+    creado = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['chat', 'hasta_id'], name='archivo_chat_hasta_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archivo chat {self.chat_id}: {self.desde_id}-{self.hasta_id}"
+
+
 # ======================================================
 # NOTIFICACIONES
 # ======================================================
@@ -141,11 +268,44 @@ class Notificacion(models.Model):
     link = models.CharField(max_length=300, blank=True)
     creado = models.DateTimeField(auto_now_add=True)
     visible = models.BooleanField(default=True)
+    # Avisos de mensajes: uno por chat y destinatario, que se actualiza en
+    # lugar de crear otro (cantidad = mensajes sin ver desde el último aviso)
+    chat = models.ForeignKey('Chat', null=True, blank=True, on_delete=models.CASCADE, related_name='+')
+    cantidad = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        indexes = [
+            # Notificaciones visibles de un usuario, más recientes primero
+            models.Index(fields=['usuario', 'visible', 'creado'], name='notif_usuario_visible_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['usuario', 'chat'], name='notif_usuario_chat_uniq'),
+        ]
 
     def __str__(self):
         return f"Notif a {self.usuario.username}: {self.titulo}"
 
 
+# ======================================================
+# COLA DE NOTIFICACIONES
+# ======================================================
+class NotificacionPendiente(models.Model):
+    """
+    Notificación por entregar a uno o más usuarios. La encola
+    notificaciones.notificar() y el comando despachar_notificaciones crea
+    las filas de Notificacion en lote.
+    """
+    usuarios = models.JSONField()  # lista de ids de User
+    titulo = models.CharField(max_length=150)
+    mensaje = models.CharField(max_length=300)
+    tipo = models.CharField(max_length=50, blank=True)
+    link = models.CharField(max_length=300, blank=True)
+    creado = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Pendiente: {self.titulo} ({len(self.usuarios)} usuarios)"
+
+
 # ======================================================
 # REPORTES
 # ======================================================
@@ -191,3 +351,19 @@ class Moderacion(models.Model):
 
     def __str__(self):
         return f"{self.usuario.username} - {self.estado}"
+
+
+# ======================================================
+# SNAPSHOT DE INSIGHTS (panel de administración)
+# ======================================================
+class SnapshotInsights(models.Model):
+    """
+    Estadísticas de la plataforma calculadas por el comando
+    refrescar_insights (SwapApp/insights.py). panel_insight muestra el
+    más reciente.
+    """
+    creado = models.DateTimeField(auto_now_add=True, db_index=True)
+    datos = models.JSONField()
+
+    def __str__(self):
+        return f"Insights {self.creado:%d/%m/%Y %H:%M}"
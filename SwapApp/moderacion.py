@@ -0,0 +1,91 @@
+from collections import defaultdict
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Moderacion, Perfil
+from .notificaciones import notificar
+
+
+# ======================================================
+# ACCIONES DE MODERACIÓN EN LOTE
+# ======================================================
+# La consola de moderación aplica cada acción a todos los usuarios
+# seleccionados con unos pocos UPDATE/INSERT sobre el conjunto (no una
+# ronda de consultas por usuario) y encola los avisos con un solo notificar()
+# por mensaje distinto. Los superusuarios nunca se modifican desde aquí.
+
+MAX_STRIKES = 3
+MAX_SELECCION = 500
+
+
+def _objetivos(usuario_ids):
+    return list(
+        User.objects.filter(id__in=usuario_ids[:MAX_SELECCION], is_superuser=False)
+        .values_list("id", flat=True)
+    )
+
+
+def bloquear(usuario_ids):
+    """
+    Bloquea a los usuarios y les suma un strike. Los que llegan a
+    MAX_STRIKES se eliminan con su contenido; al resto se le avisa del
+    strike. Devuelve (bloqueados, eliminados).
+    """
+    ids = _objetivos(usuario_ids)
+    if not ids:
+        return 0, 0
+
+    with transaction.atomic():
+        # Se crean las filas que falten y después se actualiza todo el conjunto
+        Moderacion.objects.bulk_create([Moderacion(usuario_id=i) for i in ids], ignore_conflicts=True)
+        Moderacion.objects.filter(usuario_id__in=ids).update(estado="bloqueado", fecha_modificacion=timezone.now())
+        Perfil.objects.bulk_create([Perfil(usuario_id=i) for i in ids], ignore_conflicts=True)
+        Perfil.objects.filter(usuario_id__in=ids).update(advertencias=F("advertencias") + 1)
+
+        por_strikes = defaultdict(list)
+        for usuario_id, advertencias in Perfil.objects.filter(usuario_id__in=ids).values_list("usuario_id", "advertencias"):
+            por_strikes[advertencias].append(usuario_id)
+
+        # Al llegar al máximo se elimina la cuenta; productos, trueques,
+        # chats y notificaciones caen en cascada. No se les avisa: un aviso
+        # dentro de la app no tendría a quién llegar.
+        eliminar = [u for strikes, usuarios in por_strikes.items() if strikes >= MAX_STRIKES for u in usuarios]
+        if eliminar:
+            User.objects.filter(id__in=eliminar).delete()
+
+        for strikes, usuarios in sorted(por_strikes.items()):
+            if strikes < MAX_STRIKES:
+                notificar(
+                    usuarios, "alerta",
+                    titulo="Has recibido un strike",
+                    mensaje=f"Tu cuenta ha recibido un strike. Strike {strikes}/{MAX_STRIKES}."
+                )
+    return len(ids) - len(eliminar), len(eliminar)
+
+
+def desbloquear(usuario_ids):
+    """Reactiva a los usuarios bloqueados. Devuelve cuántos cambiaron."""
+    ids = _objetivos(usuario_ids)
+    with transaction.atomic():
+        bloqueados = list(
+            Moderacion.objects.filter(usuario_id__in=ids, estado="bloqueado").values_list("usuario_id", flat=True)
+        )
+        if not bloqueados:
+            return 0
+        Moderacion.objects.filter(usuario_id__in=bloqueados).update(estado="activo", fecha_modificacion=timezone.now())
+        notificar(
+            bloqueados, "info",
+            titulo="Tu cuenta ha sido desbloqueada",
+            mensaje="Un administrador ha restaurado el acceso a tu cuenta."
+        )
+    return len(bloqueados)
+
+
+def reducir_strike(usuario_ids):
+    """Quita un strike a cada usuario que tenga alguno. Devuelve cuántos cambiaron."""
+    return Perfil.objects.filter(usuario_id__in=_objetivos(usuario_ids), advertencias__gt=0).update(
+        advertencias=F("advertencias") - 1
+    )
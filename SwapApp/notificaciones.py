@@ -0,0 +1,137 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from . import contadores
+from .models import Notificacion, NotificacionPendiente
+
+
+# ======================================================
+# ENVÍO DE NOTIFICACIONES EN SEGUNDO PLANO
+# ======================================================
+# notificar() deja la notificación en la cola (NotificacionPendiente, una
+# fila por llamada sin importar cuántos destinatarios tenga) y el request
+# sigue. El comando despachar_notificaciones vacía la cola: toma un lote
+# con SELECT ... FOR UPDATE SKIP LOCKED (varios workers no se pisan), crea
+# todas las Notificacion con un bulk_create y borra lo despachado.
+#
+# Con settings.NOTIFICACIONES_EN_COLA = False se crean en el momento.
+
+LOTE = 200
+
+
+def _en_cola():
+    return getattr(settings, "NOTIFICACIONES_EN_COLA", True)
+
+
+def _ajustar_contadores(filas):
+    for fila in filas:
+        contadores.notificacion_creada(fila)
+
+
+def _crear(filas):
+    Notificacion.objects.bulk_create(filas, batch_size=500)
+    # bulk_create no emite post_save: los contadores se ajustan aquí
+    transaction.on_commit(lambda: _ajustar_contadores(filas))
+
+
+def notificar(usuario_ids, tipo, titulo, mensaje, link=""):
+    """Notifica a los usuarios dados (ids); la escritura ocurre en el worker."""
+    usuario_ids = list(dict.fromkeys(usuario_ids))
+    if not usuario_ids:
+        return
+    if not _en_cola():
+        _crear([
+            Notificacion(usuario_id=uid, titulo=titulo, mensaje=mensaje, tipo=tipo, link=link)
+            for uid in usuario_ids
+        ])
+        return
+    NotificacionPendiente.objects.create(
+        usuarios=usuario_ids, titulo=titulo, mensaje=mensaje, tipo=tipo, link=link
+    )
+
+
+def despachar(lote=LOTE):
+    """Entrega hasta ``lote`` pendientes. Devuelve cuántos pendientes despachó."""
+    skip_locked = connection.features.has_select_for_update_skip_locked
+    with transaction.atomic():
+        pendientes = list(
+            NotificacionPendiente.objects.select_for_update(skip_locked=skip_locked).order_by("id")[:lote]
+        )
+        if not pendientes:
+            return 0
+        # Usuarios eliminados después de encolar se omiten
+        existentes = set(
+            User.objects.filter(id__in={uid for p in pendientes for uid in p.usuarios})
+            .values_list("id", flat=True)
+        )
+        filas = [
+            Notificacion(usuario_id=uid, titulo=p.titulo, mensaje=p.mensaje, tipo=p.tipo, link=p.link)
+            for p in pendientes
+            for uid in p.usuarios
+            if uid in existentes
+        ]
+        _crear(filas)
+        NotificacionPendiente.objects.filter(id__in=[p.id for p in pendientes]).delete()
+    return len(pendientes)
+
+
+# ---------------------- RETENCIÓN ----------------------
+# Las notificaciones leídas (visible=False) se borran por lotes ordenados
+# por id, con una pausa entre lotes para no retener bloqueos largos sobre
+# la tabla. Las no leídas nunca se borran.
+
+LOTE_PURGA = 1000
+
+
+def _borrar_lote(ids, pausa):
+    borradas = Notificacion.objects.filter(id__in=ids, visible=False).delete()[0]
+    if pausa:
+        time.sleep(pausa)
+    return borradas
+
+
+def purgar_antiguas(dias, lote=LOTE_PURGA, pausa=0.0):
+    """Borra las leídas con más de ``dias`` días. Devuelve cuántas borró."""
+    limite = timezone.now() - timedelta(days=dias)
+    # Los ids crecen con la fecha: todo lo anterior a `limite` queda antes
+    # de la primera notificación reciente y no hace falta recorrer el resto.
+    # Los avisos de chat se excluyen del cálculo porque actualizan su fecha.
+    tope = (
+        Notificacion.objects.filter(creado__gte=limite, chat__isnull=True)
+        .order_by("id").values_list("id", flat=True).first()
+    )
+    antiguas = Notificacion.objects.filter(visible=False, creado__lt=limite)
+    if tope is not None:
+        antiguas = antiguas.filter(id__lt=tope)
+
+    total, ultimo = 0, 0
+    while True:
+        ids = list(antiguas.filter(id__gt=ultimo).order_by("id").values_list("id", flat=True)[:lote])
+        if not ids:
+            return total
+        total += _borrar_lote(ids, pausa)
+        ultimo = ids[-1]
+
+
+def purgar_excedentes(maximo, lote=LOTE_PURGA, pausa=0.0):
+    """Deja a cada usuario a lo más ``maximo`` leídas (las más recientes)."""
+    usuarios = (
+        Notificacion.objects.filter(visible=False)
+        .values("usuario").annotate(total=Count("id")).filter(total__gt=maximo)
+        .order_by("usuario").values_list("usuario", flat=True)
+    )
+    total = 0
+    for usuario_id in list(usuarios):
+        leidas = Notificacion.objects.filter(usuario_id=usuario_id, visible=False).order_by("-creado", "-id")
+        while True:
+            ids = sorted(leidas.values_list("id", flat=True)[maximo:maximo + lote])
+            if not ids:
+                break
+            total += _borrar_lote(ids, pausa)
+    return total
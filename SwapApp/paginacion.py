@@ -0,0 +1,138 @@
+import base64
+import json
+import math
+from datetime import datetime
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+# ======================================================
+# PAGINACIÓN POR CURSOR (keyset)
+# ======================================================
+# En vez de OFFSET + COUNT(*) se usa la última fila vista como punto de
+# partida: "dame las N filas anteriores a (fecha, id)". Así la página 500
+# cuesta lo mismo que la página 1 (un rango sobre el índice).
+
+class CursorInvalido(ValueError):
+    pass
+
+
+def codificar_cursor(valores):
+    """Convierte una tupla (valor, id) en un token opaco para la URL."""
+    datos = [v.isoformat() if isinstance(v, datetime) else v for v in valores]
+    crudo = json.dumps(datos, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(crudo).decode("ascii").rstrip("=")
+
+
+def _valor_cursor(dato):
+    if isinstance(dato, str):
+        # parse_datetime lanza ValueError si el formato calza pero la fecha
+        # no existe (2026-13-45T00:00) y devuelve None si no calza
+        fecha = parse_datetime(dato)
+        if fecha is None:
+            raise ValueError(dato)
+        return fecha
+    if isinstance(dato, bool) or not isinstance(dato, (int, float)) or not math.isfinite(dato):
+        raise TypeError(dato)
+    return dato
+
+
+def decodificar_cursor(token, campos):
+    """
+    Devuelve la tupla de valores del token, o None si no hay token. Cualquier
+    token que no haya salido de codificar_cursor lanza CursorInvalido.
+    """
+    if not token:
+        return None
+    try:
+        relleno = "=" * (-len(token) % 4)
+        datos = json.loads(base64.urlsafe_b64decode(token + relleno))
+        if not isinstance(datos, list) or len(datos) != len(campos):
+            raise ValueError(datos)
+        return tuple(_valor_cursor(dato) for dato in datos)
+    except (ValueError, TypeError, KeyError):
+        raise CursorInvalido(token) from None
+
+
+class PaginaKeyset:
+    """Página de resultados con enlaces siguiente/anterior, sin total."""
+
+    def __init__(self, object_list, cursor_siguiente, cursor_anterior):
+        self.object_list = object_list
+        self.cursor_siguiente = cursor_siguiente
+        self.cursor_anterior = cursor_anterior
+
+    @property
+    def has_next(self):
+        return self.cursor_siguiente is not None
+
+    @property
+    def has_previous(self):
+        return self.cursor_anterior is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def _despues_de(campos, valores, descendente):
+    """Filtro (a, b) < (x, y) expandido, porque MySQL no usa índice con tuplas."""
+    op = "lt" if descendente else "gt"
+    (campo_a, campo_b), (valor_a, valor_b) = campos, valores
+    return Q(**{f"{campo_a}__{op}": valor_a}) | Q(**{campo_a: valor_a, f"{campo_b}__{op}": valor_b})
+
+
+def paginar_keyset(queryset, cursor=None, direccion="sig", por_pagina=9,
+                   campos=("fecha_agregado", "id")):
+    """
+    Pagina ``queryset`` en orden descendente por ``campos``.
+
+    ``cursor`` es el token recibido en la URL y ``direccion`` indica si se
+    avanza ("sig") o se retrocede ("ant") desde él. Lanza CursorInvalido si
+    el token no se puede leer.
+    """
+    valores = decodificar_cursor(cursor, campos)
+    if valores is not None:
+        # Un número donde va una fecha (o al revés) fallaría recién al
+        # ejecutar la consulta
+        modelo = queryset.model._meta
+        try:
+            valores = tuple(modelo.get_field(c).to_python(v) for c, v in zip(campos, valores))
+        except (ValidationError, TypeError, ValueError):
+            raise CursorInvalido(cursor) from None
+    retroceder = direccion == "ant" and valores is not None
+
+    orden = [f"-{c}" for c in campos]
+    if retroceder:
+        orden = list(campos)
+    qs = queryset.order_by(*orden)
+    if valores is not None:
+        qs = qs.filter(_despues_de(campos, valores, descendente=not retroceder))
+
+    # Se pide una fila extra para saber si existe otra página sin contar.
+    filas = list(qs[:por_pagina + 1])
+    hay_mas = len(filas) > por_pagina
+    filas = filas[:por_pagina]
+    if retroceder:
+        if not hay_mas:
+            # Se llegó al inicio: se muestra la primera página completa.
+            return paginar_keyset(queryset, por_pagina=por_pagina, campos=campos)
+        filas.reverse()
+
+    def clave(obj):
+        return codificar_cursor([getattr(obj, c) for c in campos])
+
+    if not filas:
+        return PaginaKeyset([], None, None)
+
+    if retroceder:
+        siguiente = clave(filas[-1])
+        anterior = clave(filas[0]) if hay_mas else None
+    else:
+        siguiente = clave(filas[-1]) if hay_mas else None
+        anterior = clave(filas[0]) if valores is not None else None
+    return PaginaKeyset(filas, siguiente, anterior)
@@ -0,0 +1,58 @@
+from django.core.cache import cache
+from django.http import Http404
+
+from .models import Chat
+
+
+# ======================================================
+# PARTICIPANTES DE UN CHAT
+# ======================================================
+# Un chat pertenece a un trueque y sus participantes son siempre el
+# solicitante y el receptor, que no cambian. Se leen del trueque con una
+# sola consulta (sin pasar por la tabla M2M Chat.usuarios) y se guardan en
+# cache; signal.py borra la entrada cuando el chat se crea o se elimina.
+
+DURACION = 60 * 60
+# Un chat que no existe se recuerda solo unos segundos: los ids son
+# correlativos y el chat puede crearse justo después de la consulta
+DURACION_INEXISTENTE = 5
+
+
+def _clave(chat_id):
+    return f"chat:{chat_id}:participantes"
+
+
+def participantes(chat_id):
+    """(solicitante_id, receptor_id) del chat, o () si no existe."""
+    clave = _clave(chat_id)
+    ids = cache.get(clave)
+    if ids is None:
+        fila = (
+            Chat.objects.filter(id=chat_id)
+            .values_list("trueque__solicitante_id", "trueque__receptor_id")
+            .first()
+        )
+        ids = tuple(fila) if fila else ()
+        cache.set(clave, ids, DURACION if ids else DURACION_INEXISTENTE)
+    return ids
+
+
+def participantes_o_404(chat_id):
+    ids = participantes(chat_id)
+    if not ids:
+        raise Http404("Chat no encontrado")
+    return ids
+
+
+def es_participante(chat_id, user_id):
+    return user_id in participantes(chat_id)
+
+
+def otro_participante(ids, user_id):
+    """Id del otro usuario del chat dados sus participantes."""
+    solicitante_id, receptor_id = ids
+    return receptor_id if user_id == solicitante_id else solicitante_id
+
+
+def olvidar(chat_id):
+    cache.delete(_clave(chat_id))
@@ -0,0 +1,13 @@
+# ======================================================
+# PRESUPUESTO DE CONSULTAS POR VISTA
+# ======================================================
+# Cada vista declara cuántas consultas SQL puede ejecutar como máximo,
+# sin importar cuántas filas devuelva. tests.py recorre las vistas que
+# tienen presupuesto y lo verifica con datos sembrados.
+
+def presupuesto_consultas(maximo):
+    """Marca la vista con el máximo de consultas permitidas por request."""
+    def decorador(vista):
+        vista.presupuesto_consultas = maximo
+        return vista
+    return decorador
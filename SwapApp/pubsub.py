@@ -0,0 +1,119 @@
+import asyncio
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+# ======================================================
+# PUB/SUB DE EVENTOS (mensajes de chat en tiempo real)
+# ======================================================
+# Las vistas publican en un canal (p. ej. "chat:15") y las conexiones SSE
+# abiertas en ese canal reciben el evento sin consultar la base de datos.
+# El backend se elige con settings.PUBSUB_BROKER; BrokerMemoria sirve
+# cuando todo corre en un solo proceso ASGI. Con varios procesos hay que
+# usar un broker compartido (p. ej. uno sobre Redis) con la misma interfaz.
+
+class Suscripcion:
+    """Cola de eventos de un suscriptor, atada al event loop que la creó."""
+
+    MAX_PENDIENTES = 100
+
+    def __init__(self, broker, canal):
+        self.broker = broker
+        self.canal = canal
+        self.loop = asyncio.get_running_loop()
+        self.cola = asyncio.Queue(maxsize=self.MAX_PENDIENTES)
+
+    def entregar(self, evento):
+        # Se llama desde cualquier hilo (las vistas síncronas corren en otro)
+        self.loop.call_soon_threadsafe(self._encolar, evento)
+
+    def _encolar(self, evento):
+        if self.cola.full():
+            # Un cliente lento pierde lo más antiguo, no bloquea al resto
+            self.cola.get_nowait()
+        self.cola.put_nowait(evento)
+
+    async def recibir(self, timeout=None):
+        """Siguiente evento; lanza asyncio.TimeoutError si no llega a tiempo."""
+        return await asyncio.wait_for(self.cola.get(), timeout)
+
+    def pendientes(self):
+        """Saca sin esperar los eventos que ya están en la cola."""
+        eventos = []
+        while not self.cola.empty():
+            eventos.append(self.cola.get_nowait())
+        return eventos
+
+    def cerrar(self):
+        self.broker.desuscribir(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+
+class Broker:
+
+    def suscribir(self, canal):
+        """Debe llamarse dentro de un event loop; devuelve una Suscripcion."""
+        raise NotImplementedError
+
+    def desuscribir(self, suscripcion):
+        raise NotImplementedError
+
+    def publicar(self, canal, evento):
+        raise NotImplementedError
+
+
+class BrokerMemoria(Broker):
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._suscriptores = defaultdict(set)
+
+    def suscribir(self, canal):
+        suscripcion = Suscripcion(self, canal)
+        with self._lock:
+            self._suscriptores[canal].add(suscripcion)
+        return suscripcion
+
+    def desuscribir(self, suscripcion):
+        with self._lock:
+            suscriptores = self._suscriptores.get(suscripcion.canal)
+            if suscriptores is not None:
+                suscriptores.discard(suscripcion)
+                if not suscriptores:
+                    del self._suscriptores[suscripcion.canal]
+
+    def publicar(self, canal, evento):
+        with self._lock:
+            suscriptores = list(self._suscriptores.get(canal, ()))
+        for suscripcion in suscriptores:
+            try:
+                suscripcion.entregar(evento)
+            except RuntimeError:
+                # El loop del suscriptor ya se cerró
+                self.desuscribir(suscripcion)
+
+
+_broker = None
+_lock_broker = threading.Lock()
+
+
+def broker():
+    global _broker
+    if _broker is None:
+        with _lock_broker:
+            if _broker is None:
+                ruta = getattr(settings, "PUBSUB_BROKER", "SwapApp.pubsub.BrokerMemoria")
+                _broker = import_string(ruta)()
+    return _broker
+
+
+def canal_chat(chat_id):
+    return f"chat:{chat_id}"
@@ -0,0 +1,118 @@
+from collections import defaultdict
+
+from django.core.cache import cache
+
+from .models import Producto, Tag
+
+
+# ======================================================
+# ÍNDICE INVERTIDO DE TAGS (recomendaciones por intereses)
+# ======================================================
+# Por cada tag se guarda en cache la lista de productos que lo tienen,
+# más recientes primero: [[producto_id, usuario_id, timestamp], ...].
+# Recomendar es leer las listas de los intereses del usuario, contar en
+# cuántas aparece cada producto y traer solo los ids ganadores.
+#
+# Las listas se actualizan desde signal.py cuando cambian los tags de un
+# producto o se elimina un producto. Si una lista no está en cache se
+# reconstruye desde la base de datos la próxima vez que se pida.
+
+CLAVE_TAG = "reco:tag:{}"
+MAX_POR_TAG = 200
+DURACION = 60 * 60 * 24
+
+
+def normalizar_tag(nombre):
+    return " ".join(nombre.split()).lower()
+
+
+def parsear_intereses(texto):
+    intereses = []
+    for interes in (texto or "").split(","):
+        interes = normalizar_tag(interes)
+        if interes and interes not in intereses:
+            intereses.append(interes)
+    return intereses
+
+
+def _clave(nombre):
+    # Las claves de memcached no admiten espacios
+    return CLAVE_TAG.format(normalizar_tag(nombre).replace(" ", "_"))
+
+
+def _entrada(producto_id, usuario_id, fecha):
+    return [producto_id, usuario_id, fecha.timestamp()]
+
+
+def _construir(nombre):
+    filas = (
+        Producto.objects.filter(tags__nombre__iexact=nombre)
+        .order_by("-fecha_agregado", "-id")
+        .values_list("id", "usuario_id", "fecha_agregado")
+        .distinct()[:MAX_POR_TAG]
+    )
+    return [_entrada(*fila) for fila in filas]
+
+
+def entradas_por_tag(nombres):
+    """Devuelve {tag: entradas}, reconstruyendo las que falten en cache."""
+    claves = {_clave(n): n for n in nombres}
+    en_cache = cache.get_many(list(claves))
+
+    faltantes = {}
+    for clave, nombre in claves.items():
+        if clave not in en_cache:
+            faltantes[clave] = _construir(nombre)
+    if faltantes:
+        cache.set_many(faltantes, DURACION)
+        en_cache.update(faltantes)
+
+    return {claves[c]: entradas for c, entradas in en_cache.items()}
+
+
+def recomendar(user, intereses, limite=8):
+    """Productos de otros usuarios ordenados por tags en común y recencia."""
+    coincidencias = defaultdict(int)
+    recencia = {}
+    for entradas in entradas_por_tag(intereses).values():
+        for producto_id, usuario_id, ts in entradas:
+            if usuario_id == user.id:
+                continue
+            coincidencias[producto_id] += 1
+            recencia[producto_id] = ts
+
+    ids = sorted(coincidencias, key=lambda i: (coincidencias[i], recencia[i], i), reverse=True)[:limite]
+    productos = Producto.objects.select_related("usuario").in_bulk(ids)
+    return [productos[i] for i in ids if i in productos]
+
+
+# ---------------------- ACTUALIZACIÓN INCREMENTAL ----------------------
+def _modificar(nombres, cambio):
+    """Aplica ``cambio(entradas)`` a las listas que ya están en cache."""
+    claves = {_clave(n) for n in nombres}
+    actuales = cache.get_many(list(claves))
+    if actuales:
+        cache.set_many({c: cambio(entradas) for c, entradas in actuales.items()}, DURACION)
+
+
+def agregar_producto(producto, nombres):
+    nueva = _entrada(producto.id, producto.usuario_id, producto.fecha_agregado)
+
+    def cambio(entradas):
+        entradas = [e for e in entradas if e[0] != producto.id] + [nueva]
+        entradas.sort(key=lambda e: (e[2], e[0]), reverse=True)
+        return entradas[:MAX_POR_TAG]
+
+    _modificar(nombres, cambio)
+
+
+def quitar_producto(producto_id, nombres):
+    _modificar(nombres, lambda entradas: [e for e in entradas if e[0] != producto_id])
+
+
+def invalidar_tags(nombres):
+    cache.delete_many([_clave(n) for n in nombres])
+
+
+def nombres_de_tags(tag_ids):
+    return list(Tag.objects.filter(id__in=tag_ids).values_list("nombre", flat=True))
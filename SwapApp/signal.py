@@ -1,13 +1,152 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, pre_save, pre_delete, post_delete, m2m_changed
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import Perfil
+from .models import Perfil, Producto, ProductoBusqueda, Tag, Categoria, Chat, ArchivoMensajes, Notificacion
+from . import recomendaciones, busqueda, autocompletar, participantes, contadores
 
 @receiver(post_save, sender=User)
 def crear_perfil(sender, instance, created, **kwargs):
     if created:
         Perfil.objects.create(usuario=instance)
 
+
+
+# ---------------------- ÍNDICE DE RECOMENDACIONES ----------------------
+@receiver(m2m_changed, sender=Producto.tags.through)
+def actualizar_indice_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse:
+        # Se modificaron los productos de un tag: se reconstruye su lista
+        if action in ("post_add", "post_remove", "post_clear"):
+            recomendaciones.invalidar_tags([instance.nombre])
+        return
+
+    if action == "post_add":
+        recomendaciones.agregar_producto(instance, recomendaciones.nombres_de_tags(pk_set))
+    elif action == "post_remove":
+        recomendaciones.quitar_producto(instance.id, recomendaciones.nombres_de_tags(pk_set))
+    elif action == "pre_clear":
+        instance._tags_reco = [t.nombre for t in instance.tags.all()]
+    elif action == "post_clear":
+        recomendaciones.quitar_producto(instance.id, getattr(instance, "_tags_reco", []))
+
+@receiver(pre_delete, sender=Producto)
+def recordar_tags_producto(sender, instance, **kwargs):
+    instance._tags_reco = [t.nombre for t in instance.tags.all()]
+
+@receiver(post_delete, sender=Producto)
+def quitar_producto_de_indice(sender, instance, **kwargs):
+    recomendaciones.quitar_producto(instance.id, getattr(instance, "_tags_reco", []))
+
+@receiver(pre_save, sender=Tag)
+def invalidar_tag_renombrado(sender, instance, **kwargs):
+    if instance.pk:
+        anterior = Tag.objects.filter(pk=instance.pk).values_list("nombre", flat=True).first()
+        if anterior and anterior != instance.nombre:
+            recomendaciones.invalidar_tags([anterior, instance.nombre])
+
+@receiver(post_delete, sender=Tag)
+def invalidar_tag_eliminado(sender, instance, **kwargs):
+    recomendaciones.invalidar_tags([instance.nombre])
+
+
+# ---------------------- DOCUMENTO DE BÚSQUEDA ----------------------
+@receiver(post_save, sender=Producto)
+def indexar_producto_guardado(sender, instance, **kwargs):
+    busqueda.indexar_producto(instance.id)
+
+@receiver(m2m_changed, sender=Producto.tags.through)
+def indexar_tags_producto(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            busqueda.indexar_producto(instance.id)
+    elif action == "pre_clear":
+        instance._productos_busqueda = list(instance.producto_set.values_list("id", flat=True))
+    elif action in ("post_add", "post_remove", "post_clear"):
+        ids = pk_set if action != "post_clear" else getattr(instance, "_productos_busqueda", [])
+        busqueda.indexar_productos(Producto.objects.filter(id__in=ids))
+
+@receiver(post_save, sender=Tag)
+def indexar_tag_guardado(sender, instance, created, **kwargs):
+    if not created:
+        busqueda.indexar_productos(Producto.objects.filter(tags=instance))
+
+@receiver(post_save, sender=Categoria)
+def indexar_categoria_guardada(sender, instance, created, **kwargs):
+    if not created:
+        busqueda.indexar_productos(Producto.objects.filter(categoria=instance))
+
+@receiver(post_save, sender=User)
+def indexar_usuario_guardado(sender, instance, created, update_fields, **kwargs):
+    # El login guarda solo last_login: no hace falta tocar los documentos
+    if created or (update_fields and "username" not in update_fields):
+        return
+    ProductoBusqueda.objects.filter(producto__usuario=instance).update(usuario=instance.username)
+    busqueda.invalidar_catalogo()
+
+@receiver(post_delete, sender=Producto)
+def invalidar_busquedas_producto_eliminado(sender, instance, **kwargs):
+    busqueda.invalidar_catalogo()
+
+
+# ---------------------- AUTOCOMPLETAR ----------------------
+@receiver(post_save, sender=Producto)
+def autocompletar_producto_guardado(sender, instance, **kwargs):
+    indice = autocompletar.indice_cargado()
+    if indice is not None:
+        indice.agregar("producto", instance.id, instance.nombre)
+
+@receiver(post_delete, sender=Producto)
+def autocompletar_producto_eliminado(sender, instance, **kwargs):
+    indice = autocompletar.indice_cargado()
+    if indice is not None:
+        indice.quitar("producto", instance.id)
+
 @receiver(post_save, sender=User)
-def guardar_perfil(sender, instance, **kwargs):
-    instance.perfil.save()
+def autocompletar_usuario_guardado(sender, instance, update_fields, **kwargs):
+    indice = autocompletar.indice_cargado()
+    if indice is None or (update_fields and "username" not in update_fields):
+        return
+    if instance.is_active:
+        indice.agregar("usuario", instance.id, instance.username)
+    else:
+        indice.quitar("usuario", instance.id)
+
+@receiver(post_delete, sender=User)
+def autocompletar_usuario_eliminado(sender, instance, **kwargs):
+    indice = autocompletar.indice_cargado()
+    if indice is not None:
+        indice.quitar("usuario", instance.id)
+
+
+# ---------------------- PARTICIPANTES DE CHATS ----------------------
+@receiver(post_save, sender=Chat)
+def chat_creado(sender, instance, created, **kwargs):
+    if created:
+        # Puede haber quedado en cache como inexistente
+        participantes.olvidar(instance.id)
+
+@receiver(post_delete, sender=Chat)
+def chat_eliminado(sender, instance, **kwargs):
+    participantes.olvidar(instance.id)
+
+
+# ---------------------- ARCHIVO DE MENSAJES ----------------------
+@receiver(post_delete, sender=ArchivoMensajes)
+def archivo_eliminado(sender, instance, **kwargs):
+    # El segmento comprimido no se borra solo con la fila
+    instance.archivo.delete(save=False)
+
+
+# ---------------------- CONTADORES DE NO LEÍDOS ----------------------
+@receiver(post_save, sender=Notificacion)
+def notificacion_guardada(sender, instance, created, **kwargs):
+    if created:
+        contadores.notificacion_creada(instance)
+    else:
+        # Un save() puede cambiar visible o tipo: se recalcula al pedirlo
+        contadores.invalidar(instance.usuario_id, "notificaciones", "strikes")
+
+@receiver(post_delete, sender=Notificacion)
+def notificacion_eliminada(sender, instance, **kwargs):
+    if instance.visible:
+        contadores.notificacion_leida(instance)
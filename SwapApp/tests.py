@@ -1,3 +1,1453 @@
-from django.test import TestCase
+import asyncio
+import base64
+import csv
+import gzip
+import json
+import random
+import shutil
+import tempfile
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.db import connection
+from django.db.models import Q, Sum
+from django.http import Http404
+from django.urls import get_resolver, reverse
+from django.utils import timezone
+
+from . import (
+    archivo, autocompletar, busqueda, contadores, descubrimiento, estadisticas, exportacion, insights, moderacion, participantes, recomendaciones,
+    views, visitas,
+)
+from . import notificaciones
+from .notificaciones import notificar
+from .models import (
+    Producto, Trueque, Chat, Mensaje, Notificacion, NotificacionPendiente, Perfil, Moderacion,
+    ProductoStatsDiario, Tag, Categoria, ArchivoMensajes, SnapshotInsights,
+)
+from .paginacion import CursorInvalido, codificar_cursor, decodificar_cursor, paginar_keyset
+from .pubsub import BrokerMemoria, Suscripcion, broker, canal_chat
+
+
+def escribir(chat, autor, contenido):
+    """Crea el mensaje y actualiza la bandeja del chat como api_send_message."""
+    mensaje = Mensaje.objects.create(chat=chat, autor=autor, contenido=contenido)
+    Chat.objects.filter(id=chat.id).update(ultimo_mensaje=mensaje, ultima_actividad=mensaje.fecha)
+    return mensaje
+
+
+def sembrar_datos(usuarios=4, productos_por_usuario=10, mensajes_por_chat=10):
+    """Crea usuarios, productos, trueques, chats, mensajes y notificaciones."""
+    gente = [User.objects.create_user(f"user{i}", password="x") for i in range(usuarios)]
+    for u in gente:
+        Perfil.objects.get_or_create(usuario=u)
+    productos = []
+    for u in gente:
+        for j in range(productos_por_usuario):
+            productos.append(Producto.objects.create(usuario=u, nombre=f"Producto {u.id}-{j}", descripcion="desc"))
+
+    for i, u in enumerate(gente):
+        otro = gente[(i + 1) % len(gente)]
+        for p in [p for p in productos if p.usuario_id == otro.id][:3]:
+            Trueque.objects.create(solicitante=u, receptor=otro, producto=p)
+        t = Trueque.objects.create(solicitante=u, receptor=otro, producto=productos[0], estado="aceptado")
+        chat = Chat.objects.create(trueque=t)
+        chat.usuarios.set([u, otro])
+        for k in range(mensajes_por_chat):
+            escribir(chat, u if k % 2 else otro, f"hola {k}")
+        for k in range(5):
+            Notificacion.objects.create(usuario=u, titulo="t", mensaje="m", tipo="alerta" if k % 2 else "info")
+    return gente
+
+
+def sembrar_datos_extra(gente, productos=10, mensajes=10):
+    """Agrega filas a los datos existentes para detectar consultas N+1."""
+    for i, u in enumerate(gente):
+        otro = gente[(i + 1) % len(gente)]
+        for j in range(productos):
+            p = Producto.objects.create(usuario=otro, nombre=f"Producto extra {j}", descripcion="desc")
+            Trueque.objects.create(solicitante=u, receptor=otro, producto=p)
+            t = Trueque.objects.create(solicitante=otro, receptor=u, producto=p, estado="aceptado")
+            if j % 4 == 0:
+                chat = Chat.objects.create(trueque=t)
+                chat.usuarios.set([u, otro])
+        for chat in Chat.objects.filter(usuarios=u):
+            for k in range(mensajes):
+                escribir(chat, u if k % 2 else otro, f"extra {k}")
+        Notificacion.objects.create(usuario=u, titulo="t", mensaje="m", tipo="alerta")
+
+
+class TratoMixin:
+    """Datos mínimos de las pruebas de chats: ana le pide a beto su Mesa."""
+
+    def crear_usuarios(self):
+        self.ana = User.objects.create_user("ana", password="x")
+        self.beto = User.objects.create_user("beto", password="x")
+        self.mesa = Producto.objects.create(usuario=self.beto, nombre="Mesa", descripcion="d")
+
+    def crear_trato(self, estado="aceptado", chat=True):
+        self.crear_usuarios()
+        self.trueque = Trueque.objects.create(
+            solicitante=self.ana, receptor=self.beto, producto=self.mesa, estado=estado
+        )
+        self.chat = Chat.objects.create(trueque=self.trueque) if chat else None
+
+
+# ======================================================
+# PLANES DE CONSULTA (índices compuestos)
+# ======================================================
+class PlanesDeConsultaTests(TestCase):
+    """
+    Ejecuta EXPLAIN sobre las consultas calientes de views.py y falla si
+    alguna recorre la tabla completa o necesita ordenar en memoria.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.gente = sembrar_datos(usuarios=6, productos_por_usuario=30)
+        with connection.cursor() as cursor:
+            if connection.vendor == "sqlite":
+                cursor.execute("ANALYZE")
+
+    def consultas(self):
+        user = self.gente[0]
+        chat = Chat.objects.filter(usuarios=user).first()
+        producto = Producto.objects.order_by("-fecha_agregado", "-id")[5]
+        # Motores en los que se acepta ordenar en memoria. En SQLite Django
+        # escribe `WHERE visible` sin comparar y la columna del índice no se
+        # usa; en MySQL compara `visible = true` justamente para usar el índice.
+        bool_sqlite = {"sqlite"}
+        # (nombre, queryset, motores que permiten ordenar en memoria)
+        return [
+            ("feed", Producto.objects.order_by("-fecha_agregado", "-id")[:10], set()),
+            ("feed_cursor", Producto.objects.filter(
+                Q(fecha_agregado__lt=producto.fecha_agregado) |
+                Q(fecha_agregado=producto.fecha_agregado, id__lt=producto.id)
+            ).order_by("-fecha_agregado", "-id")[:10], set()),
+            ("productos_usuario", Producto.objects.filter(usuario=user).order_by("-fecha_agregado")[:5], set()),
+            ("notificaciones", Notificacion.objects.filter(usuario=user, visible=True).order_by("-creado")[:20], bool_sqlite),
+            ("strikes", Notificacion.objects.filter(
+                usuario=user, visible=True, tipo__in=["alerta", "peligro"]
+            ).order_by("-creado"), bool_sqlite),
+            ("trueques_pendientes", Trueque.objects.filter(receptor=user, estado="pendiente").order_by("-fecha"), set()),
+            # OR entre dos índices: se acepta el ordenamiento del resultado (pocas filas)
+            ("trueques_aceptados", Trueque.objects.filter(estado="aceptado").filter(
+                Q(solicitante=user) | Q(receptor=user)
+            ).order_by("-fecha"), {"sqlite", "mysql"}),
+            ("mensajes_since_id", chat.mensajes.filter(id__gt=0).order_by("id"), set()),
+            ("mensajes_pagina", chat.mensajes.filter(id__lt=10**9).order_by("-id")[:51], set()),
+            # Agrupa por día: se acepta ordenar los (a lo más 90) grupos
+            ("stats_vendedor", ProductoStatsDiario.objects.filter(
+                producto__usuario=user, fecha__gte=date(2026, 1, 1)
+            ).values("fecha").annotate(visitas=Sum("visitas")).order_by("fecha"), {"sqlite", "mysql"}),
+        ]
+
+    def problemas_sqlite(self, plan, permite_ordenar):
+        problemas = []
+        for linea in plan.splitlines():
+            detalle = linea.strip()
+            if " SCAN " in f" {detalle} " and "USING" not in detalle:
+                problemas.append(detalle)
+            if "TEMP B-TREE" in detalle and not permite_ordenar:
+                problemas.append(detalle)
+        return problemas
+
+    def problemas_mysql(self, plan, permite_ordenar):
+        problemas = []
+
+        def recorrer(nodo):
+            if isinstance(nodo, dict):
+                if nodo.get("access_type") == "ALL":
+                    problemas.append(f"full scan en {nodo.get('table_name')}")
+                if nodo.get("using_filesort") and not permite_ordenar:
+                    problemas.append("filesort")
+                for valor in nodo.values():
+                    recorrer(valor)
+            elif isinstance(nodo, list):
+                for valor in nodo:
+                    recorrer(valor)
+
+        recorrer(json.loads(plan))
+        return problemas
+
+    def test_consultas_calientes_usan_indices(self):
+        if connection.vendor not in ("sqlite", "mysql"):
+            self.skipTest(f"EXPLAIN no soportado para {connection.vendor}")
+
+        for nombre, qs, motores_con_orden in self.consultas():
+            permite_ordenar = connection.vendor in motores_con_orden
+            with self.subTest(consulta=nombre):
+                if connection.vendor == "mysql":
+                    problemas = self.problemas_mysql(qs.explain(format="json"), permite_ordenar)
+                else:
+                    problemas = self.problemas_sqlite(qs.explain(), permite_ordenar)
+                self.assertEqual(problemas, [], f"{nombre}: {qs.query}")
+
+
+# ======================================================
+# PRESUPUESTO DE CONSULTAS POR VISTA
+# ======================================================
+class PresupuestoConsultasMixin:
+
+    @contextmanager
+    def assertMaxQueries(self, maximo, nombre=""):
+        with CaptureQueriesContext(connection) as ctx:
+            yield ctx
+        # Los SAVEPOINT salen de la transacción que envuelve cada test; en
+        # producción el atomic() más externo no los emite.
+        consultas = [
+            q["sql"] for q in ctx.captured_queries
+            if not q["sql"].startswith(("SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO SAVEPOINT"))
+        ]
+        ctx.consultas = len(consultas)
+        self.assertLessEqual(
+            len(consultas), maximo,
+            f"{nombre}: {len(consultas)} consultas (máximo {maximo})\n" + "\n".join(consultas)
+        )
+
+
+@mock.patch.object(visitas, "INTERVALO", 10 ** 6)
+class PresupuestoVistasTests(PresupuestoConsultasMixin, TestCase):
+    """
+    Cada vista con @presupuesto_consultas se ejecuta con pocos datos y con
+    muchos más, primero con la cache vacía y después con la cache poblada:
+    debe respetar su presupuesto en los dos regímenes y, en caliente, hacer
+    las mismas consultas con pocos y con muchos datos (sin N+1).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.gente = sembrar_datos(usuarios=3, productos_por_usuario=3, mensajes_por_chat=3)
+        cls.admin = User.objects.create_superuser("admin3000", password="x")
+        insights.refrescar()
+        # Lo que se arma una vez por proceso (no vive en la cache): el motor
+        # de búsqueda y el índice de autocompletar
+        busqueda.motor()
+        autocompletar.indice()
+
+    def setUp(self):
+        cache.clear()
+
+    def escenarios(self):
+        user = self.gente[0]
+        chat = Chat.objects.filter(usuarios=user).order_by("id").first()
+        json_post = {"content_type": "application/json"}
+        # nombre de url → (usuario, método, args, datos, extra)
+        return {
+            "home": (user, "get", [], {}, {}),
+            "api_feed_productos": (user, "get", [], {}, {}),
+            "api_explorar_productos": (user, "get", [], {}, {}),
+            "buscar_productos": (user, "get", [], {"q": "Producto"}, {}),
+            "api_autocompletar": (user, "get", [], {"q": "Produ"}, {}),
+            "chat_list": (user, "get", [], {}, {}),
+            "chat_detalle": (user, "get", [chat.id], {}, {}),
+            "api_send_message": (user, "post", [chat.id], json.dumps({"texto": "hola"}), json_post),
+            "api_fetch_messages": (user, "get", [chat.id], {}, {}),
+            "api_notificaciones": (user, "get", [], {}, {}),
+            "api_strikes": (user, "get", [], {}, {}),
+            "api_no_leidas": (user, "get", [], {}, {}),
+            "api_marcar_leidas": (user, "post", [], json.dumps({"hasta_id": 10 ** 9}), json_post),
+            "panel_vendedor": (user, "get", [], {}, {}),
+            "panel_insight": (self.admin, "get", [], {}, {}),
+            "moderar_usuario": (self.admin, "get", [], {}, {}),
+        }
+
+    def vistas_con_presupuesto(self):
+        vistas = {}
+        for patron in get_resolver().url_patterns:
+            for sub in getattr(patron, "url_patterns", [patron]):
+                maximo = getattr(getattr(sub, "callback", None), "presupuesto_consultas", None)
+                if maximo is not None and sub.name:
+                    vistas[sub.name] = maximo
+        return vistas
+
+    def medir(self, nombre, maximo):
+        """
+        Devuelve (consultas en frío, consultas en caliente). El presupuesto
+        vale para la primera llamada con la cache vacía y también para la
+        siguiente, ya con la cache poblada.
+        """
+        usuario, metodo, args, datos, extra = self.escenarios()[nombre]
+        self.client.force_login(usuario)
+        url = reverse(nombre, args=args)
+        consultas = []
+        cache.clear()
+        for regimen in ("frío", "caliente"):
+            with self.assertMaxQueries(maximo, f"{nombre} ({regimen})") as ctx:
+                respuesta = getattr(self.client, metodo)(url, datos, **extra)
+            self.assertLess(respuesta.status_code, 400, nombre)
+            consultas.append(ctx.consultas)
+        return tuple(consultas)
+
+    def test_todas_las_vistas_con_presupuesto_tienen_escenario(self):
+        self.assertEqual(set(self.vistas_con_presupuesto()) - set(self.escenarios()), set())
+
+    def test_presupuesto_constante_con_mas_datos(self):
+        vistas = self.vistas_con_presupuesto()
+        antes = {nombre: self.medir(nombre, maximo) for nombre, maximo in vistas.items()}
+
+        sembrar_datos_extra(self.gente, productos=12, mensajes=20)
+
+        for nombre, maximo in vistas.items():
+            with self.subTest(vista=nombre):
+                # El régimen en frío ya quedó acotado por el presupuesto; la
+                # igualdad se pide en caliente, donde no influye qué filas
+                # (p. ej. la notificación del chat) existían de antes.
+                self.assertEqual(self.medir(nombre, maximo)[1], antes[nombre][1], nombre)
+
+
+# ======================================================
+# PARTICIPANTES DE CHATS
+# ======================================================
+class ParticipantesTests(TratoMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.crear_trato("pendiente", chat=False)
+
+    def test_chat_creado_despues_de_consultarlo(self):
+        siguiente = (Chat.objects.order_by("-id").values_list("id", flat=True).first() or 0) + 1
+        self.assertEqual(participantes.participantes(siguiente), ())
+
+        chat = Chat.objects.create(id=siguiente, trueque=self.trueque)
+
+        self.assertEqual(participantes.participantes_o_404(chat.id), (self.ana.id, self.beto.id))
+        self.assertTrue(participantes.es_participante(chat.id, self.beto.id))
+
+    def test_chat_eliminado_deja_de_existir(self):
+        chat = Chat.objects.create(trueque=self.trueque)
+        self.assertEqual(participantes.participantes(chat.id), (self.ana.id, self.beto.id))
+        chat.delete()
+        with self.assertRaises(Http404):
+            participantes.participantes_o_404(chat.id)
+
+
+# ======================================================
+# MARCAR NOTIFICACIONES COMO LEÍDAS
+# ======================================================
+class MarcarLeidasTests(TratoMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.crear_trato()
+        self.notifs = [
+            Notificacion.objects.create(usuario=self.ana, titulo="t", mensaje="m", tipo="alerta" if i % 2 else "info")
+            for i in range(4)
+        ]
+        self.ajena = Notificacion.objects.create(usuario=self.beto, titulo="t", mensaje="m")
+        self.client.force_login(self.ana)
+        self.url = reverse("api_marcar_leidas")
+
+    def post(self, cuerpo):
+        return self.client.post(self.url, cuerpo, content_type="application/json")
+
+    def test_marca_por_ids_solo_las_propias(self):
+        ids = [self.notifs[0].id, self.notifs[1].id, self.ajena.id]
+        respuesta = self.post(json.dumps({"ids": ids}))
+        self.assertEqual(respuesta.json(), {"ok": True, "marcadas": 2})
+        self.assertEqual(
+            set(Notificacion.objects.filter(visible=True).values_list("id", flat=True)),
+            {self.notifs[2].id, self.notifs[3].id, self.ajena.id},
+        )
+
+    def test_marca_hasta_id_y_tipo(self):
+        respuesta = self.post(json.dumps({"hasta_id": self.notifs[2].id, "tipo": "alerta"}))
+        self.assertEqual(respuesta.json()["marcadas"], 1)
+        self.assertFalse(Notificacion.objects.get(id=self.notifs[1].id).visible)
+        self.assertEqual(contadores.no_leidas(self.ana.id)["notificaciones"], 3)
+
+    def test_marcar_todas_no_oculta_un_aviso_que_volvio_a_llegar(self):
+        views._notificar_mensaje(self.ana.id, self.chat.id, self.beto)
+
+        # El menú carga las notificaciones y después llega otro mensaje del chat
+        cargadas = self.client.get(reverse("api_notificaciones")).json()["notificaciones"]
+        ids = [n["id"] for n in cargadas]
+        hasta_fecha = max(n["creado_iso"] for n in cargadas)
+        views._notificar_mensaje(self.ana.id, self.chat.id, self.beto)
+
+        respuesta = self.post(json.dumps({"ids": ids, "hasta_fecha": hasta_fecha}))
+        self.assertEqual(respuesta.json()["marcadas"], 4)
+        aviso = Notificacion.objects.get(usuario=self.ana, chat=self.chat)
+        self.assertTrue(aviso.visible)
+        self.assertIn(aviso.id, ids)
+        self.assertEqual(self.post(json.dumps({"hasta_fecha": "ayer"})).status_code, 400)
+
+    def test_json_que_no_es_objeto(self):
+        for cuerpo in ("[]", "5", '"x"', "null"):
+            with self.subTest(cuerpo=cuerpo):
+                self.assertEqual(self.post(cuerpo).status_code, 400)
+
+    def test_ids_con_elementos_invalidos(self):
+        for ids in ([[1]], [{"a": 1}], ["x"], [None], "1,2"):
+            with self.subTest(ids=ids):
+                self.assertEqual(self.post(json.dumps({"ids": ids})).status_code, 400)
+        self.assertEqual(self.post(json.dumps({"tipo": ["alerta"]})).status_code, 400)
+        self.assertEqual(Notificacion.objects.filter(visible=False).count(), 0)
+
+
+# ======================================================
+# VISITAS CON BUFFER
+# ======================================================
+@mock.patch.object(visitas, "INTERVALO", 10 ** 6)
+class VisitasTests(TratoMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        caches["visitas"].clear()
+        visitas._pendientes.clear()
+        self.crear_usuarios()
+        self.ajeno = self.mesa
+        self.propio = Producto.objects.create(usuario=self.ana, nombre="Silla", descripcion="d")
+        self.client.force_login(self.ana)
+
+    def test_home_cuenta_una_vez_por_sesion_y_no_los_propios(self):
+        self.client.get(reverse("home"))
+        self.client.get(reverse("home"))
+        self.assertEqual(visitas.pendientes([self.propio.id, self.ajeno.id]), {self.ajeno.id: 1})
+
+    def test_marcas_en_su_propia_cache(self):
+        self.client.get(reverse("home"))
+        # Vaciar la cache general no hace contar de nuevo la visita
+        cache.clear()
+        self.client.get(reverse("home"))
+        self.assertEqual(visitas.pendientes([self.ajeno.id]), {self.ajeno.id: 1})
+
+    def test_busqueda_no_cuenta(self):
+        self.client.get(reverse("buscar_productos"), {"q": "Mesa"})
+        self.client.get(reverse("api_feed_productos"))
+        self.assertEqual(visitas.pendientes([self.ajeno.id]), {})
+
+    def test_volcar_suma_en_producto_y_estadisticas(self):
+        self.client.get(reverse("home"))
+        self.assertEqual(visitas.volcar(), 1)
+        self.ajeno.refresh_from_db()
+        self.assertEqual(self.ajeno.visitas, 1)
+        self.assertEqual(ProductoStatsDiario.objects.get(producto=self.ajeno).visitas, 1)
+        self.assertEqual(visitas.volcar(), 0)
+
+
+# ======================================================
+# BÚSQUEDA DE TEXTO COMPLETO
+# ======================================================
+class BusquedaTests(TestCase):
+
+    def setUp(self):
+        if not isinstance(busqueda.motor(), busqueda.MotorSQLite):
+            self.skipTest("SQLite sin FTS5")
+        cache.clear()
+        self.ana = User.objects.create_user("ana", password="x")
+
+    def crear(self, nombre, descripcion="d"):
+        return Producto.objects.create(usuario=self.ana, nombre=nombre, descripcion=descripcion).id
+
+    def test_nombre_pesa_mas_que_descripcion_y_busca_por_prefijo(self):
+        en_descripcion = self.crear("Mesa", "con una camisa encima")
+        en_nombre = self.crear("Camisa roja")
+        self.crear("Pantalón")
+
+        self.assertEqual(busqueda.buscar("cam")[0], [en_nombre, en_descripcion])
+        # Todos los términos deben aparecer
+        self.assertEqual(busqueda.buscar("CAMISA roj")[0], [en_nombre])
+
+    def test_paginacion_con_empates_de_puntaje(self):
+        # Mismo documento: mismo puntaje, el id desempata
+        ids = [self.crear("Lámpara") for _ in range(7)]
+        self.crear("Sillón")
+
+        vistos, cursor = [], None
+        while True:
+            pagina, cursor = busqueda.buscar("lámpara", cursor, limite=3)
+            vistos += pagina
+            if cursor is None:
+                break
+        self.assertEqual(vistos, sorted(ids, reverse=True))
+
+    @mock.patch.object(busqueda, "ESPERA_MAXIMA", 0.1)
+    def test_quien_espera_demasiado_calcula_y_no_suelta_el_candado(self):
+        clave = "busqueda:prueba"
+        candado = f"{clave}:candado"
+        cache.add(candado, "lider")
+
+        self.assertEqual(busqueda._calcular_compartido(clave, lambda: [1]), [1])
+        self.assertEqual(cache.get(clave), [1])
+        self.assertEqual(cache.get(candado), "lider")
+
+
+# ======================================================
+# PAGINACIÓN POR CURSOR
+# ======================================================
+def token(crudo):
+    return base64.urlsafe_b64encode(crudo.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+class PaginacionTests(TestCase):
+
+    CAMPOS = ("fecha_agregado", "id")
+
+    def setUp(self):
+        cache.clear()
+        self.ana = User.objects.create_user("ana", password="x")
+        self.ids = [Producto.objects.create(usuario=self.ana, nombre=f"P{i}", descripcion="d").id for i in range(7)]
+        self.client.force_login(self.ana)
+
+    def test_ida_y_vuelta(self):
+        producto = Producto.objects.get(id=self.ids[3])
+        valores = (producto.fecha_agregado, producto.id)
+        self.assertEqual(decodificar_cursor(codificar_cursor(valores), self.CAMPOS), valores)
+        self.assertIsNone(decodificar_cursor("", self.CAMPOS))
+
+    def test_tokens_alterados(self):
+        alterados = [
+            "%%%", "x", token("{}"), token('"a"'), token("[1]"), token("[1, 2, 3]"),
+            token('["2026-13-45T00:00", 1]'), token('["no es fecha", 1]'),
+            token("[[1], 1]"), token('[{"a": 1}, 1]'), token("[null, 1]"),
+            token("[true, 1]"), token("[NaN, 1]"), token("[Infinity, 1]"),
+        ]
+        for cursor in alterados:
+            with self.subTest(cursor=cursor):
+                with self.assertRaises(CursorInvalido):
+                    decodificar_cursor(cursor, self.CAMPOS)
+        # Bien formado pero con un número donde va la fecha
+        with self.assertRaises(CursorInvalido):
+            paginar_keyset(Producto.objects.all(), token("[5, 1]"), "sig", 3)
+
+    def test_avanzar_y_retroceder(self):
+        qs = Producto.objects.all()
+        paginas, cursor = [], None
+        while True:
+            pagina = paginar_keyset(qs, cursor, "sig", 3)
+            paginas.append([p.id for p in pagina])
+            if not pagina.has_next:
+                break
+            cursor = pagina.cursor_siguiente
+        self.assertEqual(paginas, [self.ids[6:3:-1], self.ids[3:0:-1], self.ids[0:1]])
+
+        # Desde la última página hacia atrás se recorren las mismas páginas
+        anterior = paginar_keyset(qs, pagina.cursor_anterior, "ant", 3)
+        self.assertEqual([p.id for p in anterior], paginas[1])
+        primera = paginar_keyset(qs, anterior.cursor_anterior, "ant", 3)
+        self.assertEqual([p.id for p in primera], paginas[0])
+        self.assertFalse(primera.has_previous)
+
+    def test_vistas_ignoran_cursor_alterado(self):
+        for cursor in (token('["2026-13-45T00:00", 1]'), token("[[1], 1]"), token("[5, 1]")):
+            for direccion in ("sig", "ant"):
+                with self.subTest(cursor=cursor, dir=direccion):
+                    datos = {"cursor": cursor, "dir": direccion}
+                    self.assertEqual(self.client.get(reverse("home"), datos).status_code, 200)
+                    respuesta = self.client.get(reverse("api_feed_productos"), datos)
+                    self.assertEqual([p["id"] for p in respuesta.json()["productos"]], self.ids[::-1])
+                    respuesta = self.client.get(reverse("buscar_productos"), {"q": "P", **datos})
+                    self.assertEqual(respuesta.status_code, 200)
+
+
+# ======================================================
+# NO LEÍDOS DE CHATS Y PUNTEROS DE LECTURA
+# ======================================================
+class ChatNoLeidosTests(TratoMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.crear_trato()
+        self.chat.usuarios.set([self.ana, self.beto])
+
+    def enviar(self, usuario, texto):
+        self.client.force_login(usuario)
+        respuesta = self.client.post(
+            reverse("api_send_message", args=[self.chat.id]), json.dumps({"texto": texto}),
+            content_type="application/json",
+        )
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.json()["mensaje"]["id"]
+
+    def test_enviar_y_leer(self):
+        self.assertEqual(contadores.no_leidas(self.beto.id)["mensajes"], 0)
+        self.enviar(self.ana, "hola")
+        ultimo = self.enviar(self.ana, "¿sigue disponible?")
+
+        self.chat.refresh_from_db()
+        self.assertEqual(self.chat.ultimo_mensaje_id, ultimo)
+        self.assertEqual(self.chat.ultimo_leido_solicitante, ultimo)
+        self.assertEqual(self.chat.ultimo_leido_receptor, 0)
+        self.assertEqual(contadores.no_leidas(self.ana.id)["mensajes"], 0)
+        self.assertEqual(contadores.no_leidas(self.beto.id)["mensajes"], 1)
+
+        self.client.force_login(self.beto)
+        self.client.get(reverse("chat_detalle", args=[self.chat.id]))
+        self.chat.refresh_from_db()
+        self.assertEqual(self.chat.ultimo_leido_receptor, ultimo)
+        self.assertEqual(contadores.no_leidas(self.beto.id)["mensajes"], 0)
+
+        self.enviar(self.beto, "sí")
+        self.assertEqual(contadores.no_leidas(self.ana.id)["mensajes"], 1)
+        self.assertEqual(contadores.no_leidas(self.beto.id)["mensajes"], 0)
+
+    def test_update_atrasado_no_retrocede_el_ultimo_mensaje(self):
+        crear = Mensaje.objects.create
+        adelantado = []
+
+        def crear_y_adelantarse(**kwargs):
+            # Otro envío crea un mensaje más nuevo y actualiza el chat antes
+            mensaje = crear(**kwargs)
+            otro = Mensaje(chat=self.chat, autor=self.beto, contenido="simultáneo")
+            otro.save()
+            Chat.objects.filter(id=self.chat.id).update(ultimo_mensaje=otro, ultima_actividad=otro.fecha)
+            adelantado.append(otro.id)
+            return mensaje
+
+        with mock.patch.object(Mensaje.objects, "create", side_effect=crear_y_adelantarse):
+            propio = self.enviar(self.ana, "hola")
+
+        self.chat.refresh_from_db()
+        self.assertEqual(self.chat.ultimo_mensaje_id, adelantado[0])
+        self.assertEqual(self.chat.ultimo_leido_solicitante, propio)
+        # El mensaje simultáneo de beto sigue sin leer para ana
+        self.assertEqual(contadores.no_leidas(self.ana.id)["mensajes"], 1)
+
+
+# ======================================================
+# CONSOLA DE MODERACIÓN
+# ======================================================
+class ModeracionTests(TratoMixin, PresupuestoConsultasMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser("admin3000", password="x")
+        self.root = User.objects.create_superuser("root", password="x")
+        self.crear_usuarios()
+        User.objects.filter(id=self.ana.id).update(email="ana@correo.cl")
+        Perfil.objects.filter(usuario=self.beto).update(advertencias=2)
+        self.client.force_login(self.admin)
+        self.url = reverse("moderar_usuario")
+
+    def avisos(self):
+        return sorted(
+            (p.titulo, p.mensaje, p.usuarios) for p in NotificacionPendiente.objects.all()
+        )
+
+    def test_bloqueo_en_lote_elimina_al_tercer_strike(self):
+        self.client.post(self.url, {"accion": "bloquear", "usuario_id": [self.ana.id, self.beto.id, self.root.id]})
+
+        self.assertEqual(Perfil.objects.get(usuario=self.ana).advertencias, 1)
+        self.assertEqual(Moderacion.objects.get(usuario=self.ana).estado, "bloqueado")
+        self.assertFalse(User.objects.filter(id=self.beto.id).exists())
+        self.assertFalse(Producto.objects.filter(nombre="Mesa").exists())
+        # Los superusuarios no se tocan
+        self.assertFalse(Moderacion.objects.filter(usuario=self.root).exists())
+        self.assertEqual(Perfil.objects.get(usuario=self.root).advertencias, 0)
+        # Solo se avisa a quien sigue teniendo cuenta, y el aviso llega
+        self.assertEqual(self.avisos(), [
+            ("Has recibido un strike", "Tu cuenta ha recibido un strike. Strike 1/3.", [self.ana.id]),
+        ])
+        notificaciones.despachar()
+        self.assertEqual(
+            list(Notificacion.objects.values_list("usuario_id", "tipo", "mensaje")),
+            [(self.ana.id, "alerta", "Tu cuenta ha recibido un strike. Strike 1/3.")],
+        )
+
+    def test_desbloqueo_en_lote(self):
+        carla = User.objects.create_user("carla", password="x")
+        moderacion.bloquear([self.ana.id, carla.id])
+        NotificacionPendiente.objects.all().delete()
+
+        self.client.post(self.url, {"accion": "desbloquear", "usuario_id": [self.ana.id, self.beto.id]})
+
+        self.assertEqual(Moderacion.objects.get(usuario=self.ana).estado, "activo")
+        self.assertEqual(Moderacion.objects.get(usuario=carla).estado, "bloqueado")
+        self.assertFalse(Moderacion.objects.filter(usuario=self.beto).exists())
+        self.assertEqual(self.avisos(), [
+            ("Tu cuenta ha sido desbloqueada", "Un administrador ha restaurado el acceso a tu cuenta.", [self.ana.id]),
+        ])
+
+    def test_reducir_strike_no_baja_de_cero(self):
+        self.assertEqual(moderacion.reducir_strike([self.ana.id, self.beto.id]), 1)
+        self.assertEqual(moderacion.reducir_strike([self.ana.id, self.beto.id]), 1)
+        self.assertEqual(moderacion.reducir_strike([self.ana.id, self.beto.id]), 0)
+        self.assertEqual(
+            dict(Perfil.objects.filter(usuario__in=[self.ana, self.beto]).values_list("usuario__username", "advertencias")),
+            {"ana": 0, "beto": 0},
+        )
+
+    @mock.patch.object(views, "USUARIOS_POR_PAGINA", 2)
+    def test_busqueda_y_paginacion_dentro_del_presupuesto(self):
+        marcas = [User.objects.create_user(f"marta{i}", password="x").id for i in range(5)]
+        User.objects.create_user("mario", email="otro@correo.cl", password="x")
+
+        def pagina(datos):
+            with self.assertMaxQueries(3, "moderar_usuario"):
+                respuesta = self.client.get(self.url, datos)
+            return respuesta.context["usuarios"]
+
+        vistas, datos = [], {"q": "mart"}
+        while True:
+            usuarios = pagina(datos)
+            vistas.append([u.id for u in usuarios])
+            if not usuarios.has_next:
+                break
+            datos = {"q": "mart", "cursor": usuarios.cursor_siguiente}
+        self.assertEqual(vistas, [marcas[4:2:-1], marcas[2:0:-1], marcas[0:1]])
+
+        anterior = pagina({"q": "mart", "cursor": usuarios.cursor_anterior, "dir": "ant"})
+        self.assertEqual([u.id for u in anterior], vistas[1])
+
+        # Con "@" solo se busca por email
+        self.assertEqual([u.username for u in pagina({"q": "ana@"})], ["ana"])
+        self.assertEqual([u.username for u in pagina({"q": "otro@correo"})], ["mario"])
+
+
+# ======================================================
+# RECOMENDACIONES POR TAGS
+# ======================================================
+class RecomendacionesTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.ana = User.objects.create_user("ana", password="x")
+        self.beto = User.objects.create_user("beto", password="x")
+        self.tags = {n: Tag.objects.create(nombre=n) for n in ("Ropa", "Deporte", "Cocina")}
+
+    def producto(self, usuario, nombre, *tags):
+        p = Producto.objects.create(usuario=usuario, nombre=nombre, descripcion="d")
+        p.tags.set([self.tags[t] for t in tags])
+        return p
+
+    def recomendar(self):
+        intereses = recomendaciones.parsear_intereses(" ropa, DEPORTE ,ropa")
+        return [p.nombre for p in recomendaciones.recomendar(self.ana, intereses)]
+
+    def test_ordena_por_tags_en_comun_y_recencia(self):
+        self.producto(self.beto, "Polera", "Ropa", "Deporte")
+        self.producto(self.beto, "Chaqueta", "Ropa")
+        self.producto(self.beto, "Olla", "Cocina")
+        self.producto(self.ana, "Propia", "Ropa", "Deporte")
+        self.producto(self.beto, "Pantalón", "Ropa")
+
+        self.assertEqual(self.recomendar(), ["Polera", "Pantalón", "Chaqueta"])
+
+    def test_indice_en_cache_sigue_los_cambios(self):
+        polera = self.producto(self.beto, "Polera", "Ropa", "Deporte")
+        chaqueta = self.producto(self.beto, "Chaqueta", "Ropa")
+        self.assertEqual(self.recomendar(), ["Polera", "Chaqueta"])
+
+        chaqueta.tags.add(self.tags["Deporte"])
+        self.assertEqual(self.recomendar(), ["Chaqueta", "Polera"])
+        polera.delete()
+        self.assertEqual(self.recomendar(), ["Chaqueta"])
+        chaqueta.tags.clear()
+        self.assertEqual(self.recomendar(), [])
+
+
+# ======================================================
+# POOL DE DESCUBRIMIENTO
+# ======================================================
+class DescubrimientoTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        random.seed(1234)
+        self.ana = User.objects.create_user("ana", password="x")
+        self.beto = User.objects.create_user("beto", password="x")
+        self.ajenos = [Producto.objects.create(usuario=self.beto, nombre=f"B{i}", descripcion="d").id for i in range(10)]
+        self.propios = [Producto.objects.create(usuario=self.ana, nombre=f"A{i}", descripcion="d").id for i in range(3)]
+
+    def test_pool_acotado_a_los_recientes(self):
+        pool = descubrimiento.construir_pool(tamano=5, ventana=8)
+        recientes = set((self.ajenos + self.propios)[-8:])
+        self.assertEqual(len(pool), 5)
+        self.assertLessEqual({producto_id for producto_id, _ in pool}, recientes)
+        self.assertEqual(cache.get(descubrimiento.CLAVE_POOL), pool)
+
+    def test_visitas_pesan_en_la_muestra(self):
+        Producto.objects.filter(id=self.ajenos[0]).update(visitas=10 ** 6)
+        elegidos = [descubrimiento.construir_pool(tamano=1)[0][0] for _ in range(20)]
+        self.assertEqual(elegidos, [self.ajenos[0]] * 20)
+
+    def test_descubrir_excluye_propios(self):
+        productos = descubrimiento.descubrir(self.ana, limite=6)
+        ids = [p.id for p in productos]
+        self.assertEqual(len(set(ids)), 6)
+        self.assertLessEqual(set(ids), set(self.ajenos))
+
+    def test_mientras_otro_arma_el_pool_se_usan_los_recientes(self):
+        cache.add(descubrimiento.CLAVE_CANDADO, 1)
+        productos = descubrimiento.descubrir(self.ana, limite=3)
+        self.assertEqual([p.id for p in productos], self.ajenos[:-4:-1])
+        self.assertIsNone(cache.get(descubrimiento.CLAVE_POOL))
+
+
+# ======================================================
+# AUTOCOMPLETAR
+# ======================================================
+class AutocompletarTests(TestCase):
+
+    def indice(self, productos):
+        indice = autocompletar.IndiceTrigramas()
+        indice.cargar("producto", enumerate(productos, start=1))
+        return indice
+
+    def textos(self, sugerencias):
+        return [s["texto"] for s in sugerencias]
+
+    def test_prefijo_primero_y_sin_tildes(self):
+        indice = self.indice(["Mesa de centro", "Lámpara de mesa", "Camiseta", "Mesón", "mesa de centro"])
+        self.assertEqual(self.textos(indice.sugerir("MESA")), ["mesa de centro", "Lámpara de mesa"])
+        self.assertEqual(self.textos(indice.sugerir("lampara")), ["Lámpara de mesa"])
+        self.assertEqual(self.textos(indice.sugerir("me")), ["mesa de centro", "Mesón", "Lámpara de mesa"])
+        self.assertEqual(indice.sugerir("xyz"), [])
+
+    def test_cantidad_de_entradas_acotada(self):
+        with mock.patch.dict(autocompletar.MAX_ENTRADAS, {"producto": 2}):
+            indice = self.indice(["Silla vieja", "Silla nueva", "Silla gamer"])
+        self.assertEqual(self.textos(indice.sugerir("silla")), ["Silla gamer", "Silla nueva"])
+
+    def test_cambios_de_productos_llegan_al_indice_cargado(self):
+        ana = User.objects.create_user("ana", password="x")
+        with mock.patch.object(autocompletar, "_indice", autocompletar.IndiceTrigramas()):
+            producto = Producto.objects.create(usuario=ana, nombre="Bicicleta", descripcion="d")
+            self.assertEqual(self.textos(autocompletar.indice_cargado().sugerir("bici")), ["Bicicleta"])
+            producto.nombre = "Triciclo"
+            producto.save()
+            self.assertEqual(autocompletar.indice_cargado().sugerir("bici"), [])
+            producto.delete()
+            self.assertEqual(autocompletar.indice_cargado().sugerir("tric"), [])
+
+
+# ======================================================
+# FACETAS DEL CATÁLOGO
+# ======================================================
+class FacetasTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.ana = User.objects.create_user("ana", password="x")
+        self.ropa = Categoria.objects.create(nombre="Ropa")
+        self.hogar = Categoria.objects.create(nombre="Hogar")
+        self.usado = Tag.objects.create(nombre="usado")
+        self.nuevo = Tag.objects.create(nombre="nuevo")
+        self.ids = {}
+        for nombre, categoria, tags in [
+            ("Polera", self.ropa, [self.usado]),
+            ("Chaqueta", self.ropa, [self.usado, self.nuevo]),
+            ("Gorro", self.ropa, [self.nuevo]),
+            ("Lámpara", self.hogar, [self.usado]),
+            ("Caja", None, []),
+        ]:
+            p = Producto.objects.create(usuario=self.ana, nombre=nombre, descripcion="d", categoria=categoria)
+            p.tags.set(tags)
+            self.ids[nombre] = p.id
+        self.client.force_login(self.ana)
+
+    def explorar(self, **filtros):
+        return self.client.get(reverse("api_explorar_productos"), filtros).json()
+
+    def test_productos_y_conteos_con_filtros(self):
+        datos = self.explorar(categoria=self.ropa.id, tag=self.usado.id)
+        self.assertEqual([p["nombre"] for p in datos["productos"]], ["Chaqueta", "Polera"])
+        # Categorías sin su propio filtro; tags con todos
+        self.assertEqual(datos["facetas"]["categorias"], [
+            {"id": self.ropa.id, "nombre": "Ropa", "total": 2},
+            {"id": self.hogar.id, "nombre": "Hogar", "total": 1},
+        ])
+        self.assertEqual(datos["facetas"]["tags"], [
+            {"id": self.usado.id, "nombre": "usado", "total": 2},
+            {"id": self.nuevo.id, "nombre": "nuevo", "total": 1},
+        ])
+
+    def test_sin_filtros_y_filtro_invalido(self):
+        datos = self.explorar()
+        self.assertEqual(len(datos["productos"]), 5)
+        self.assertIn({"id": None, "nombre": "Sin categoría", "total": 1}, datos["facetas"]["categorias"])
+        respuesta = self.client.get(reverse("api_explorar_productos"), {"categoria": "x"})
+        self.assertEqual(respuesta.status_code, 400)
+
+    def test_conteos_se_invalidan_con_el_catalogo(self):
+        self.assertEqual(self.explorar(categoria=self.hogar.id)["facetas"]["tags"], [
+            {"id": self.usado.id, "nombre": "usado", "total": 1},
+        ])
+        p = Producto.objects.create(usuario=self.ana, nombre="Silla", descripcion="d", categoria=self.hogar)
+        p.tags.set([self.nuevo])
+        self.assertEqual(self.explorar(categoria=self.hogar.id)["facetas"]["tags"], [
+            {"id": self.nuevo.id, "nombre": "nuevo", "total": 1},
+            {"id": self.usado.id, "nombre": "usado", "total": 1},
+        ])
+
+
+# ======================================================
+# MENSAJES EN TIEMPO REAL (PUB/SUB Y SSE)
+# ======================================================
+class PubSubTests(TestCase):
+
+    def test_publicar_entrega_a_los_suscritos_del_canal(self):
+        async def escenario():
+            b = BrokerMemoria()
+            with b.suscribir("chat:1") as uno, b.suscribir("chat:2") as dos:
+                # Se publica desde otro hilo, como las vistas síncronas
+                await asyncio.to_thread(b.publicar, "chat:1", {"id": 1})
+                self.assertEqual(await uno.recibir(timeout=1), {"id": 1})
+                with self.assertRaises(asyncio.TimeoutError):
+                    await dos.recibir(timeout=0.05)
+            self.assertEqual(b._suscriptores, {})
+
+        asyncio.run(escenario())
+
+    def test_cliente_lento_pierde_lo_mas_antiguo(self):
+        async def escenario():
+            b = BrokerMemoria()
+            with mock.patch.object(Suscripcion, "MAX_PENDIENTES", 3), b.suscribir("c") as s:
+                for i in range(5):
+                    b.publicar("c", i)
+                await asyncio.sleep(0)
+                return s.pendientes()
+
+        self.assertEqual(asyncio.run(escenario()), [2, 3, 4])
+
+
+class ChatEventosTests(TratoMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.crear_trato()
+        self.mensajes = [escribir(self.chat, self.ana, f"hola {i}") for i in range(3)]
+        self.url = reverse("chat_eventos", args=[self.chat.id])
+
+    def test_bajo_wsgi_responde_503(self):
+        self.client.force_login(self.beto)
+        self.assertEqual(self.client.get(self.url).status_code, 503)
+
+    async def test_envia_pendientes_y_en_vivo_y_marca_leido(self):
+        primero, segundo, tercero = self.mensajes
+        await self.async_client.aforce_login(self.beto)
+        respuesta = await self.async_client.get(self.url, {"since_id": primero.id})
+        self.assertEqual(respuesta["Content-Type"], "text/event-stream")
+        eventos = respuesta.streaming_content
+
+        self.assertEqual(await anext(eventos), (
+            f"id: {segundo.id}\nevent: mensaje\ndata: "
+            + json.dumps(views._mensaje_json(segundo)) + "\n\n"
+        ).encode())
+        # Un evento ya enviado se descarta; el nuevo llega en vivo
+        broker().publicar(canal_chat(self.chat.id), {"id": segundo.id})
+        broker().publicar(canal_chat(self.chat.id), {"id": tercero.id, "contenido": "hola 2"})
+        self.assertIn(f"id: {tercero.id}\n".encode(), await anext(eventos))
+        await eventos.aclose()
+
+        chat = await Chat.objects.aget(id=self.chat.id)
+        self.assertEqual(chat.ultimo_leido_receptor, tercero.id)
+
+    async def test_solo_participantes(self):
+        intruso = await User.objects.acreate(username="carla")
+        await self.async_client.aforce_login(intruso)
+        respuesta = await self.async_client.get(self.url)
+        self.assertEqual(respuesta.status_code, 403)
+
+
+# ======================================================
+# LONG-POLL DE MENSAJES
+# ======================================================
+class LongPollMensajesTests(TratoMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.crear_trato()
+        self.primero = escribir(self.chat, self.ana, "hola")
+        self.url = reverse("api_fetch_messages", args=[self.chat.id])
+
+    def test_since_id_devuelve_los_nuevos_y_marca_leido(self):
+        segundo = escribir(self.chat, self.ana, "¿sigue?")
+        self.client.force_login(self.beto)
+        # Bajo WSGI no se espera aunque se pida
+        datos = self.client.get(self.url, {"since_id": self.primero.id, "wait": 25}).json()
+        self.assertEqual([m["contenido"] for m in datos["mensajes"]], ["¿sigue?"])
+        self.chat.refresh_from_db()
+        self.assertEqual(self.chat.ultimo_leido_receptor, segundo.id)
+        self.assertEqual(self.client.get(self.url, {"since_id": segundo.id}).json(), {"mensajes": []})
+
+    async def test_espera_despierta_con_el_mensaje_publicado(self):
+        await self.async_client.aforce_login(self.beto)
+        evento = {"id": self.primero.id + 1, "autor": "ana", "contenido": "nuevo", "fecha": ""}
+        asyncio.get_running_loop().call_later(0.1, broker().publicar, canal_chat(self.chat.id), evento)
+        respuesta = await self.async_client.get(self.url, {"since_id": self.primero.id, "wait": 5})
+        self.assertEqual(respuesta.json(), {"mensajes": [evento]})
+
+    async def test_espera_sin_participantes_en_cache(self):
+        await self.async_client.aforce_login(self.beto)
+        evento = {"id": self.primero.id + 1, "autor": "ana", "contenido": "nuevo", "fecha": ""}
+        loop = asyncio.get_running_loop()
+        # La entrada de participantes sale de la cache durante la espera
+        loop.call_later(0.05, cache.clear)
+        loop.call_later(0.1, broker().publicar, canal_chat(self.chat.id), evento)
+        respuesta = await self.async_client.get(self.url, {"since_id": self.primero.id, "wait": 5})
+        self.assertEqual(respuesta.json(), {"mensajes": [evento]})
+        chat = await Chat.objects.aget(id=self.chat.id)
+        self.assertEqual(chat.ultimo_leido_receptor, evento["id"])
+
+    async def test_wait_no_finito_es_400(self):
+        await self.async_client.aforce_login(self.beto)
+        for wait in ("nan", "inf", "-inf", "pronto"):
+            respuesta = await self.async_client.get(self.url, {"since_id": self.primero.id, "wait": wait})
+            self.assertEqual(respuesta.status_code, 400, wait)
+
+    async def test_espera_vence_sin_mensajes(self):
+        await self.async_client.aforce_login(self.beto)
+        respuesta = await self.async_client.get(self.url, {"since_id": self.primero.id, "wait": 0.1})
+        self.assertEqual(respuesta.json(), {"mensajes": []})
+
+
+# ======================================================
+# PAGINACIÓN DE MENSAJES
+# ======================================================
+class PaginacionMensajesTests(TratoMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.crear_trato()
+        self.ids = [escribir(self.chat, self.ana, f"m{i}").id for i in range(5)]
+        self.client.force_login(self.beto)
+        self.url = reverse("api_fetch_messages", args=[self.chat.id])
+
+    def contenidos(self, datos):
+        return [m["contenido"] for m in datos["mensajes"]]
+
+    def test_ultima_pagina_y_hacia_atras(self):
+        datos = self.client.get(self.url, {"limite": 2}).json()
+        self.assertEqual((self.contenidos(datos), datos["hay_anteriores"]), (["m3", "m4"], True))
+        datos = self.client.get(self.url, {"limite": 2, "before_id": self.ids[3]}).json()
+        self.assertEqual((self.contenidos(datos), datos["hay_anteriores"]), (["m1", "m2"], True))
+        datos = self.client.get(self.url, {"limite": 2, "before_id": self.ids[1]}).json()
+        self.assertEqual((self.contenidos(datos), datos["hay_anteriores"]), (["m0"], False))
+
+    def test_limite_acotado_y_parametros_invalidos(self):
+        with mock.patch.object(views, "MAX_MENSAJES_POR_PAGINA", 3):
+            datos = self.client.get(self.url, {"limite": 1000}).json()
+        self.assertEqual(self.contenidos(datos), ["m2", "m3", "m4"])
+        self.assertEqual(self.client.get(self.url, {"before_id": "x"}).status_code, 400)
+
+    def test_chat_detalle_muestra_la_ultima_pagina(self):
+        for i in range(5, views.MENSAJES_POR_PAGINA + 2):
+            escribir(self.chat, self.ana, f"m{i}")
+        respuesta = self.client.get(reverse("chat_detalle", args=[self.chat.id]))
+        mensajes = [m.contenido for m in respuesta.context["mensajes"]]
+        self.assertEqual(mensajes, [f"m{i}" for i in range(2, views.MENSAJES_POR_PAGINA + 2)])
+        self.assertTrue(respuesta.context["hay_anteriores"])
+
+
+# ======================================================
+# ARCHIVO DE MENSAJES ANTIGUOS
+# ======================================================
+class ArchivoMensajesTests(TratoMixin, TestCase):
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        ajustes = override_settings(MEDIA_ROOT=media)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+        cache.clear()
+        self.crear_trato("finalizado")
+        self.ids = [escribir(self.chat, self.ana if i % 2 else self.beto, f"m{i}").id for i in range(7)]
+
+    def test_archivar_deja_los_mas_nuevos_en_la_tabla(self):
+        self.assertEqual(archivo.archivar(self.chat.id, mantener=2, lote=2), 5)
+
+        self.assertEqual(list(Mensaje.objects.filter(chat=self.chat).values_list("id", flat=True)), self.ids[5:])
+        self.assertEqual(
+            list(ArchivoMensajes.objects.filter(chat=self.chat).order_by("desde_id").values_list("cantidad", flat=True)),
+            [2, 2, 1],
+        )
+        self.chat.refresh_from_db()
+        self.assertEqual(self.chat.archivado_hasta, self.ids[4])
+        segmento = ArchivoMensajes.objects.get(chat=self.chat, desde_id=self.ids[0])
+        self.assertEqual([f["contenido"] for f in archivo.leer_segmento(segmento)], ["m0", "m1"])
+        # Ya no queda nada que archivar
+        self.assertEqual(archivo.archivar(self.chat.id, mantener=2, lote=2), 0)
+
+    def test_paginar_hacia_atras_sigue_en_el_archivo(self):
+        archivo.archivar(self.chat.id, mantener=2, lote=2)
+        self.client.force_login(self.ana)
+        url = reverse("api_fetch_messages", args=[self.chat.id])
+
+        datos = self.client.get(url, {"limite": 3}).json()
+        self.assertEqual([m["contenido"] for m in datos["mensajes"]], ["m4", "m5", "m6"])
+        self.assertTrue(datos["hay_anteriores"])
+        datos = self.client.get(url, {"limite": 3, "before_id": self.ids[4]}).json()
+        self.assertEqual([m["contenido"] for m in datos["mensajes"]], ["m1", "m2", "m3"])
+        self.assertEqual(datos["mensajes"][0]["autor"], "ana")
+        datos = self.client.get(url, {"limite": 3, "before_id": self.ids[1]}).json()
+        self.assertEqual(([m["contenido"] for m in datos["mensajes"]], datos["hay_anteriores"]), (["m0"], False))
+
+    def test_comando_solo_chats_inactivos_o_cerrados(self):
+        salida = StringIO()
+        call_command("compactar_mensajes", "--mantener", "3", stdout=salida)
+        self.assertIn("0 mensajes archivados de 0 chats.", salida.getvalue())
+
+        call_command("compactar_mensajes", "--cerrados", "--mantener", "3", stdout=salida)
+        self.assertIn("4 mensajes archivados de 1 chats.", salida.getvalue())
+        self.assertEqual(Mensaje.objects.filter(chat=self.chat).count(), 3)
+
+
+# ======================================================
+# AVISOS DE MENSAJES AGRUPADOS POR CHAT
+# ======================================================
+class AvisosMensajeTests(TratoMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.crear_trato()
+        self.url = reverse("api_send_message", args=[self.chat.id])
+
+    def enviar(self, usuario, veces=1):
+        self.client.force_login(usuario)
+        for i in range(veces):
+            self.client.post(self.url, json.dumps({"texto": f"hola {i}"}), content_type="application/json")
+
+    def avisos(self, usuario):
+        return list(Notificacion.objects.filter(usuario=usuario).values_list("mensaje", "cantidad", "visible"))
+
+    def test_un_aviso_por_chat_que_acumula(self):
+        self.enviar(self.ana, veces=3)
+        self.assertEqual(self.avisos(self.beto), [("ana te envió un mensaje.", 3, True)])
+        self.assertEqual(contadores.no_leidas(self.beto.id)["notificaciones"], 1)
+        self.assertEqual(self.avisos(self.ana), [])
+
+    def test_despues_de_leerlo_vuelve_a_contar_desde_uno(self):
+        self.enviar(self.ana, veces=2)
+        aviso = Notificacion.objects.get(usuario=self.beto)
+        self.client.force_login(self.beto)
+        self.client.post(reverse("api_marcar_leida"), {"id": aviso.id})
+        self.assertEqual(contadores.no_leidas(self.beto.id)["notificaciones"], 0)
+
+        self.enviar(self.ana)
+        self.assertEqual(self.avisos(self.beto), [("ana te envió un mensaje.", 1, True)])
+        self.assertEqual(contadores.no_leidas(self.beto.id)["notificaciones"], 1)
+
+
+# ======================================================
+# CONTADORES DE NO LEÍDOS
+# ======================================================
+@override_settings(NOTIFICACIONES_EN_COLA=False)
+class ContadoresTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.ana = User.objects.create_user("ana", password="x")
+        Notificacion.objects.create(usuario=self.ana, titulo="t", mensaje="m", tipo="info")
+        Notificacion.objects.create(usuario=self.ana, titulo="t", mensaje="m", tipo="alerta")
+        Notificacion.objects.create(usuario=self.ana, titulo="t", mensaje="m", tipo="info", visible=False)
+
+    def test_se_calculan_una_vez_y_despues_salen_de_la_cache(self):
+        esperado = {"notificaciones": 2, "strikes": 1, "mensajes": 0}
+        self.assertEqual(contadores.no_leidas(self.ana.id), esperado)
+        with self.assertNumQueries(0):
+            self.assertEqual(contadores.no_leidas(self.ana.id), esperado)
+
+    def test_crear_y_leer_ajustan_la_cache(self):
+        contadores.no_leidas(self.ana.id)
+        # bulk_create no emite post_save: el ajuste corre al confirmar
+        with self.captureOnCommitCallbacks(execute=True):
+            notificar([self.ana.id], "peligro", titulo="t", mensaje="m")
+        nueva = Notificacion.objects.get(tipo="peligro")
+        with self.assertNumQueries(0):
+            self.assertEqual(contadores.no_leidas(self.ana.id), {"notificaciones": 3, "strikes": 2, "mensajes": 0})
+
+        nueva.delete()
+        self.assertEqual(contadores.no_leidas(self.ana.id), {"notificaciones": 2, "strikes": 1, "mensajes": 0})
+
+    def test_endpoint(self):
+        self.client.force_login(self.ana)
+        self.client.post(reverse("api_marcar_leidas"), json.dumps({"tipo": "alerta"}), content_type="application/json")
+        respuesta = self.client.get(reverse("api_no_leidas"))
+        self.assertEqual(respuesta.json(), {"notificaciones": 1, "strikes": 0, "mensajes": 0})
+
+
+# ======================================================
+# COLA DE NOTIFICACIONES
+# ======================================================
+class ColaNotificacionesTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.gente = [User.objects.create_user(f"user{i}", password="x") for i in range(3)]
+        self.ids = [u.id for u in self.gente]
+
+    def test_una_fila_por_llamada_y_entrega_en_lote(self):
+        notificar(self.ids + self.ids[:1], "info", titulo="Hola", mensaje="Bienvenidos")
+        notificar(self.ids[:1], "alerta", titulo="Strike", mensaje="1/3")
+        self.assertEqual(NotificacionPendiente.objects.count(), 2)
+        self.assertFalse(Notificacion.objects.exists())
+
+        self.gente[2].delete()
+        self.assertEqual(notificaciones.despachar(lote=1), 1)
+        salida = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("despachar_notificaciones", "--una-vez", stdout=salida)
+        self.assertIn("1 pendientes despachados.", salida.getvalue())
+
+        self.assertFalse(NotificacionPendiente.objects.exists())
+        self.assertEqual(
+            sorted(Notificacion.objects.values_list("usuario_id", "titulo")),
+            [(self.ids[0], "Hola"), (self.ids[0], "Strike"), (self.ids[1], "Hola")],
+        )
+        self.assertEqual(contadores.no_leidas(self.ids[0])["strikes"], 1)
+
+    @override_settings(NOTIFICACIONES_EN_COLA=False)
+    def test_sin_cola_se_crean_en_el_momento(self):
+        notificar(self.ids[:2], "info", titulo="Hola", mensaje="m", link="/x/")
+        self.assertFalse(NotificacionPendiente.objects.exists())
+        self.assertEqual(sorted(Notificacion.objects.values_list("usuario_id", "link")), [(i, "/x/") for i in self.ids[:2]])
+
+
+# ======================================================
+# RETENCIÓN DE NOTIFICACIONES
+# ======================================================
+class RetencionNotificacionesTests(TestCase):
+
+    def setUp(self):
+        self.ana = User.objects.create_user("ana", password="x")
+        self.beto = User.objects.create_user("beto", password="x")
+
+    def crear(self, usuario, dias, visible=False):
+        n = Notificacion.objects.create(usuario=usuario, titulo=f"{dias}", mensaje="m", visible=visible)
+        Notificacion.objects.filter(id=n.id).update(creado=timezone.now() - timedelta(days=dias))
+        return n.id
+
+    def quedan(self):
+        return sorted(Notificacion.objects.values_list("usuario__username", "titulo"))
+
+    def test_purgar_antiguas_por_lotes_sin_tocar_las_no_leidas(self):
+        for dias in (90, 60, 45):
+            self.crear(self.ana, dias)
+        self.crear(self.ana, 90, visible=True)
+        self.crear(self.beto, 40)
+        self.crear(self.ana, 5)
+
+        self.assertEqual(notificaciones.purgar_antiguas(30, lote=2), 4)
+        self.assertEqual(self.quedan(), [("ana", "5"), ("ana", "90")])
+
+    def test_purgar_excedentes_deja_las_mas_recientes(self):
+        for dias in (1, 2, 3, 4):
+            self.crear(self.ana, dias)
+        self.crear(self.ana, 10, visible=True)
+        for dias in (1, 2):
+            self.crear(self.beto, dias)
+
+        self.assertEqual(notificaciones.purgar_excedentes(2, lote=1), 2)
+        self.assertEqual(self.quedan(), [("ana", "1"), ("ana", "10"), ("ana", "2"), ("beto", "1"), ("beto", "2")])
+
+    def test_comando(self):
+        self.crear(self.ana, 60)
+        for dias in (1, 2, 3):
+            self.crear(self.beto, dias)
+        salida = StringIO()
+        call_command("purgar_notificaciones", "--max-por-usuario", "1", "--pausa", "0", stdout=salida)
+        self.assertIn("antiguas: 1 notificaciones borradas", salida.getvalue())
+        self.assertIn("excedentes: 2 notificaciones borradas", salida.getvalue())
+        self.assertEqual(self.quedan(), [("beto", "1")])
+
+
+# ======================================================
+# ESTADÍSTICAS DIARIAS DEL VENDEDOR
+# ======================================================
+class EstadisticasDiariasTests(TratoMixin, TestCase):
+
+    def setUp(self):
+        self.crear_usuarios()
+        self.silla = Producto.objects.create(usuario=self.beto, nombre="Silla", descripcion="d")
+        self.hoy = timezone.localdate()
+        hace_5 = timezone.now() - timedelta(days=5)
+        self.dia_5 = timezone.localdate(hace_5)
+
+        for estado in ("pendiente", "aceptado", "rechazado"):
+            Trueque.objects.create(solicitante=self.ana, receptor=self.beto, producto=self.mesa, estado=estado)
+        viejo = Trueque.objects.create(solicitante=self.ana, receptor=self.beto, producto=self.silla, estado="aceptado")
+        Trueque.objects.filter(id=viejo.id).update(fecha=hace_5, actualizado=hace_5, resuelto=hace_5)
+        self.viejo = Trueque.objects.get(id=viejo.id)
+
+    def filas(self):
+        return {
+            (f.producto_id, f.fecha): (f.visitas, f.solicitudes, f.aceptados, f.rechazados)
+            for f in ProductoStatsDiario.objects.all()
+        }
+
+    def test_consolidar_por_producto_y_dia(self):
+        self.assertEqual(estadisticas.consolidar(dias=7), 2)
+        self.assertEqual(self.filas(), {
+            (self.mesa.id, self.hoy): (0, 3, 1, 1),
+            (self.silla.id, self.dia_5): (0, 1, 1, 0),
+        })
+
+        # Lo que deja de existir vuelve a 0; las visitas no se tocan
+        estadisticas.sumar_visitas({self.mesa.id: 4})
+        Trueque.objects.filter(producto=self.mesa, estado="rechazado").delete()
+        estadisticas.consolidar(dias=7)
+        self.assertEqual(self.filas()[self.mesa.id, self.hoy], (4, 2, 1, 0))
+
+    def test_guardar_de_nuevo_no_mueve_el_dia_de_respuesta(self):
+        estadisticas.consolidar(dias=7)
+        # Se vuelve a guardar días después de aceptarlo (api_cerrar_trato)
+        self.viejo.save()
+        estadisticas.consolidar()
+        self.assertEqual(self.filas()[self.silla.id, self.dia_5], (0, 1, 1, 0))
+        self.assertNotIn((self.silla.id, self.hoy), self.filas())
+        _, totales = estadisticas.serie_vendedor(self.beto.id, 30)
+        self.assertEqual((totales["solicitudes"], totales["aceptados"]), (4, 2))
+
+        # Si cambia de resultado, se recalcula el día en que se respondió
+        self.viejo.estado = "rechazado"
+        self.viejo.save()
+        estadisticas.consolidar()
+        self.assertEqual(self.filas()[self.silla.id, self.dia_5], (0, 1, 0, 1))
+
+    def test_serie_del_vendedor_y_panel(self):
+        call_command("consolidar_estadisticas", "--dias", "7", stdout=StringIO())
+        serie, totales = estadisticas.serie_vendedor(self.beto.id, 30)
+        self.assertEqual(len(serie), 30)
+        self.assertEqual((serie[0]["fecha"], serie[-1]["fecha"]), (self.hoy - timedelta(days=29), self.hoy))
+        self.assertEqual(serie[-6]["solicitudes"], 1)
+        self.assertEqual(totales, {"visitas": 0, "solicitudes": 4, "aceptados": 2, "rechazados": 1})
+
+        self.client.force_login(self.beto)
+        respuesta = self.client.get(reverse("panel_vendedor"), {"dias": 90})
+        self.assertEqual((respuesta.context["dias"], len(respuesta.context["serie"])), (90, 90))
+        self.assertEqual(respuesta.context["totales_periodo"]["aceptados"], 2)
+
+
+# ======================================================
+# SNAPSHOT DE INSIGHTS
+# ======================================================
+class InsightsTests(TratoMixin, TestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser("admin3000", password="x")
+        self.crear_usuarios()
+        Perfil.objects.filter(usuario=self.beto).update(estrellas_totales=9, cantidad_calificaciones=2)
+        Producto.objects.create(usuario=self.beto, nombre="Silla", descripcion="d")
+        lampara = Producto.objects.create(usuario=self.ana, nombre="Lámpara", descripcion="d")
+        for estado in ("aceptado", "rechazado", "pendiente"):
+            Trueque.objects.create(solicitante=self.ana, receptor=self.beto, producto=self.mesa, estado=estado)
+        Trueque.objects.create(solicitante=self.beto, receptor=self.ana, producto=lampara, estado="finalizado")
+
+    def test_snapshot_con_totales_rankings_y_crecimiento(self):
+        datos = insights.refrescar(top=1).datos
+        self.assertEqual(datos["totales"], {
+            "usuarios": 3, "productos": 3, "trueques": 4, "aceptados": 2, "rechazados": 1, "pendientes": 1,
+        })
+        self.assertEqual(datos["tasa_aceptacion"], 66.7)
+        self.assertEqual(datos["usuarios_activos"], 2)
+        self.assertEqual(datos["top_productos"], [{
+            "id": self.mesa.id, "nombre": "Mesa", "vendedor": "beto",
+            "solicitudes": 3, "aceptados": 1, "tasa_aceptacion": 50.0,
+        }])
+        self.assertEqual(datos["top_vendedores"], [{"usuario": "beto", "total_productos": 2, "promedio": 4.5}])
+        self.assertEqual(len(datos["crecimiento"]), insights.SEMANAS)
+        self.assertEqual(
+            {k: datos["crecimiento"][-1][k] for k in ("usuarios", "productos", "trueques")},
+            {"usuarios": 3, "productos": 3, "trueques": 4},
+        )
+
+    def test_conserva_los_mas_nuevos(self):
+        salida = StringIO()
+        for _ in range(3):
+            call_command("refrescar_insights", "--conservar", "2", stdout=salida)
+        self.assertIn("Snapshot de insights guardado", salida.getvalue())
+        ids = list(SnapshotInsights.objects.order_by("id").values_list("id", flat=True))
+        self.assertEqual(len(ids), 2)
+        self.assertEqual(insights.ultimo().id, ids[-1])
+
+    def test_panel_lee_el_ultimo_y_avisa_si_esta_viejo(self):
+        self.client.force_login(self.admin)
+        url = reverse("panel_insight")
+        self.assertIsNone(self.client.get(url).context["snapshot"])
+
+        snapshot = insights.refrescar()
+        respuesta = self.client.get(url)
+        self.assertEqual(respuesta.context["snapshot"], snapshot)
+        self.assertFalse(respuesta.context["desactualizado"])
+
+        SnapshotInsights.objects.filter(id=snapshot.id).update(creado=timezone.now() - timedelta(hours=2))
+        self.assertTrue(self.client.get(url).context["desactualizado"])
+
+        self.client.force_login(self.ana)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+
+# ======================================================
+# EXPORTACIÓN DE DATOS
+# ======================================================
+class ExportacionTests(TratoMixin, TestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser("admin3000", password="x")
+        self.crear_usuarios()
+        self.trueques = [
+            Trueque.objects.create(solicitante=self.ana, receptor=self.beto, producto=self.mesa, estado=estado)
+            for estado in ("pendiente", "aceptado", "rechazado")
+        ]
+        # Uno por día: 10, 11 y 12 de marzo
+        for dia, t in enumerate(self.trueques, start=10):
+            Trueque.objects.filter(id=t.id).update(
+                fecha=timezone.make_aware(datetime(2026, 3, dia, 12))
+            )
+
+    def leer(self, trozos):
+        return b"".join(trozos).decode("utf-8")
+
+    def test_csv_recorre_todos_los_lotes(self):
+        filas = list(csv.reader(self.leer(exportacion.exportar("trueques", lote=2)).splitlines()))
+        self.assertEqual(tuple(filas[0]), exportacion.TABLAS["trueques"][2])
+        self.assertEqual([int(f[0]) for f in filas[1:]], [t.id for t in self.trueques])
+        self.assertEqual([f[4] for f in filas[1:]], ["pendiente", "aceptado", "rechazado"])
+
+    def test_jsonl_filtra_por_fechas_incluidas(self):
+        texto = self.leer(exportacion.exportar(
+            "trueques", "jsonl", desde=date(2026, 3, 11), hasta=date(2026, 3, 12),
+        ))
+        filas = [json.loads(linea) for linea in texto.splitlines()]
+        self.assertEqual([f["id"] for f in filas], [t.id for t in self.trueques[1:]])
+        self.assertEqual(filas[0]["estado"], "aceptado")
+
+    def test_gzip_descomprime_igual(self):
+        plano = self.leer(exportacion.exportar("trueques", lote=1))
+        comprimido = b"".join(exportacion.exportar("trueques", gzip=True, lote=1))
+        self.assertEqual(gzip.decompress(comprimido).decode("utf-8"), plano)
+        self.assertEqual(
+            exportacion.nombre_archivo("trueques", "csv", date(2026, 3, 10), None, True),
+            "trueques_2026-03-10.csv.gz",
+        )
+
+    def test_vista_solo_admin_y_valida_parametros(self):
+        url = reverse("exportar_datos", args=["trueques"])
+        self.client.force_login(self.ana)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.client.force_login(self.admin)
+        self.assertEqual(self.client.get(reverse("exportar_datos", args=["usuarios"])).status_code, 404)
+        self.assertEqual(self.client.get(url, {"formato": "xml"}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"desde": "10/03/2026"}).status_code, 400)
+
+        respuesta = self.client.get(url, {"formato": "jsonl", "desde": "2026-03-12"})
+        self.assertEqual(respuesta["Content-Type"], "application/x-ndjson")
+        self.assertEqual(
+            respuesta["Content-Disposition"], 'attachment; filename="trueques_2026-03-12.jsonl"'
+        )
+        filas = [json.loads(linea) for linea in self.leer(respuesta.streaming_content).splitlines()]
+        self.assertEqual([f["id"] for f in filas], [self.trueques[2].id])
+
+    def test_comando_escribe_el_archivo(self):
+        carpeta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, carpeta)
+        destino = f"{carpeta}/trueques.csv.gz"
+        salida = StringIO()
+        call_command("exportar_datos", "trueques", "--gzip", "--lote", "2",
+                     "--hasta", "2026-03-10", "--salida", destino, stdout=salida)
+        self.assertIn("bytes escritos", salida.getvalue())
+        with gzip.open(destino, "rt", encoding="utf-8") as f:
+            filas = list(csv.reader(f))
+        self.assertEqual([int(fila[0]) for fila in filas[1:]], [self.trueques[0].id])
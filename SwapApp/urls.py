@@ -16,6 +16,9 @@ urlpatterns = [
     path('editar-producto/<int:producto_id>/', views.editar_producto, name='editar_producto'),
     path('eliminar-producto/<int:producto_id>/', views.eliminar_producto, name='eliminar_producto'),
     path("buscar-productos/", views.buscar_productos, name="buscar_productos"),
+    path("api/productos/feed/", views.api_feed_productos, name="api_feed_productos"),
+    path("api/productos/explorar/", views.api_explorar_productos, name="api_explorar_productos"),
+    path("api/autocompletar/", views.api_autocompletar, name="api_autocompletar"),
 
     # TRUEQUES
     path('ofrecer-trueque/<int:producto_id>/', views.ofrecer_trueque, name='ofrecer_trueque'),
@@ -27,6 +30,7 @@ urlpatterns = [
     path('chat/<int:chat_id>/', views.chat_detalle, name='chat_detalle'),
     path('api/chat/<int:chat_id>/send/', views.api_send_message, name='api_send_message'),
     path('api/chat/<int:chat_id>/messages/', views.api_fetch_messages, name='api_fetch_messages'),
+    path('api/chat/<int:chat_id>/eventos/', views.chat_eventos, name='chat_eventos'),
     path("api/chat/<int:chat_id>/productos/", views.api_productos_usuario_chat, name="api_productos_usuario_chat"),
     path("chat/crear-trueque/", views.crear_trueque_desde_chat, name="crear_trueque_desde_chat"),
     
@@ -36,12 +40,17 @@ urlpatterns = [
     # NOTIFICACIONES API
     path('api/notificaciones/', views.api_notificaciones, name='api_notificaciones'),
     path('api/notificaciones/marcar/', views.api_marcar_leida, name='api_marcar_leida'),
+    path('api/notificaciones/marcar-varias/', views.api_marcar_leidas, name='api_marcar_leidas'),
+    path('api/no-leidas/', views.api_no_leidas, name='api_no_leidas'),
     path("api/strikes/", views.api_strikes, name="api_strikes"),
 
     # PANELES
     path('panel/vendedor/', views.panel_vendedor, name='panel_vendedor'),
     path('panel/insight/', views.panel_insight, name='panel_insight'),
 
+    # EXPORTAR DATOS (ADMIN)
+    path('panel/exportar/<str:tabla>/', views.exportar_datos, name='exportar_datos'),
+
     # MODERAR USUARIOS
     path('moderar-usuarios/', views.moderar_usuario, name='moderar_usuario'),
 
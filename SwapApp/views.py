@@ -1,20 +1,35 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
+from django.contrib.auth.views import redirect_to_login
 from django.contrib.auth.models import User
 from django.utils import timezone
-from django.http import JsonResponse, HttpResponseForbidden
+from django.http import JsonResponse, HttpResponseForbidden, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connection, transaction, IntegrityError
+from asgiref.sync import sync_to_async
 from django.views.decorators.http import require_POST
 from django.urls import reverse
-from django.db.models import Q, Avg, Count
+from django.db.models import Q, Avg, Count, F, Case, When, Value, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.contrib import messages
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.timezone import localtime
-from .models import Producto, Trueque, Chat, Mensaje, Notificacion, Perfil, Moderacion, Calificacion
+from django.utils.dateparse import parse_date, parse_datetime
+from .models import Producto, Trueque, Chat, Mensaje, Notificacion, Perfil, Calificacion
 from .forms import MensajeForm
-from datetime import timedelta
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from datetime import date, timedelta
+from .paginacion import paginar_keyset, CursorInvalido
+from .presupuesto import presupuesto_consultas
+from .recomendaciones import parsear_intereses, recomendar
+from .descubrimiento import descubrir
+from . import busqueda, autocompletar, facetas, archivo, contadores, visitas, estadisticas, insights, exportacion, moderacion
+from .notificaciones import notificar
+from .pubsub import broker, canal_chat
+from .participantes import participantes_o_404, es_participante, otro_participante
+import asyncio
 import json
+import math
 
 
 # ---------------------- AUTH ----------------------
@@ -59,45 +74,38 @@ def logout_view(request):
     return redirect('login')
 
 # ---------------------- HOME ----------------------
+@presupuesto_consultas(8)
 @login_required
 def home_view(request):
     user = request.user
 
     # ---------------------------------------
-    # PAGINADOR (9 productos por página)
+    # PAGINADOR POR CURSOR (9 productos por página)
     # ---------------------------------------
-    productos_qs = Producto.objects.all().order_by('-fecha_agregado')
-
-    paginator = Paginator(productos_qs, 9)
-    page = request.GET.get('page', 1)
-
-    try:
-        productos = paginator.page(page)
-    except PageNotAnInteger:
-        productos = paginator.page(1)
-    except EmptyPage:
-        productos = paginator.page(paginator.num_pages)
+    productos = _pagina_feed(request)
+    if request.method == 'GET':
+        _registrar_visitas(request, productos)
 
     # ---------------------------------------
     # NOTIFICACIONES Y TRUEQUES
     # ---------------------------------------
     notifs = Notificacion.objects.filter(usuario=user, visible=True).order_by('-creado')[:20]
-    trueques_pendientes = Trueque.objects.filter(receptor=user, estado='pendiente').order_by('-fecha')
+    trueques_pendientes = Trueque.objects.filter(
+        receptor=user, estado='pendiente'
+    ).select_related('solicitante', 'producto').order_by('-fecha')
     trueques_aceptados = Trueque.objects.filter(estado='aceptado').filter(
         Q(solicitante=user) | Q(receptor=user)
-    ).order_by('-fecha')
+    ).select_related('solicitante', 'receptor', 'producto').order_by('-fecha')
 
     # ---------------------------------------
     # RECOMENDACIONES
     # ---------------------------------------
-    if hasattr(user, "perfil") and user.perfil.intereses:
-        intereses = [i.strip() for i in user.perfil.intereses.split(",") if i.strip()]
-        recomendaciones = Producto.objects.filter(
-            tags__nombre__in=intereses
-        ).exclude(usuario=user).distinct()[:8]
+    intereses = parsear_intereses(user.perfil.intereses) if hasattr(user, "perfil") else []
+    if intereses:
+        recomendaciones = recomendar(user, intereses)
         titulo_reco = "Recomendado según tus intereses"
     else:
-        recomendaciones = Producto.objects.exclude(usuario=user).order_by('?')[:8]
+        recomendaciones = descubrir(user)
         titulo_reco = "Quizás te interese"
 
     # ---------------------------------------
@@ -160,11 +168,10 @@ def home_view(request):
 
         t = Trueque.objects.create(solicitante=user, receptor=producto.usuario, producto=producto)
 
-        Notificacion.objects.create(
-            usuario=producto.usuario,
+        notificar(
+            [producto.usuario_id], 'nuevo_trueque',
             titulo='Nueva solicitud de trueque',
             mensaje=f'{user.username} ofreció un trueque por "{producto.nombre}".',
-            tipo='nuevo_trueque',
             link=reverse('home')
         )
 
@@ -190,19 +197,17 @@ def home_view(request):
             chat.usuarios.set([trueque.solicitante, trueque.receptor])
             chat_url = reverse('chat_detalle', args=[chat.id])
 
-            Notificacion.objects.create(
-                usuario=trueque.solicitante,
+            notificar(
+                [trueque.solicitante_id], 'trueque_aceptado',
                 titulo='Trueque aceptado',
                 mensaje=f'{trueque.receptor.username} aceptó tu solicitud.',
-                tipo='trueque_aceptado',
                 link=chat_url
             )
 
-            Notificacion.objects.create(
-                usuario=trueque.receptor,
+            notificar(
+                [trueque.receptor_id], 'trueque_aceptado',
                 titulo='Trueque aceptado',
                 mensaje=f'Aceptaste la solicitud de {trueque.solicitante.username}.',
-                tipo='trueque_aceptado',
                 link=chat_url
             )
 
@@ -212,11 +217,10 @@ def home_view(request):
             trueque.estado = 'rechazado'
             trueque.save()
 
-            Notificacion.objects.create(
-                usuario=trueque.solicitante,
+            notificar(
+                [trueque.solicitante_id], 'trueque_rechazado',
                 titulo='Trueque rechazado',
                 mensaje=f'{trueque.receptor.username} rechazó tu solicitud por "{trueque.producto.nombre}".',
-                tipo='trueque_rechazado',
                 link=reverse('home')
             )
 
@@ -232,34 +236,98 @@ def home_view(request):
         'notificaciones': notifs,
         'trueques_pendientes': trueques_pendientes,
         'trueques_aceptados': trueques_aceptados,
-        'chats': Chat.objects.filter(usuarios=user).order_by('-creado'),
+        'chats': _chats_de(user),
         'recomendaciones': recomendaciones,
         'titulo_reco': titulo_reco,
     }
 
     return render(request, 'home.html', context)
 
+# ---------------------- FEED DE PRODUCTOS ----------------------
+PRODUCTOS_POR_PAGINA = 9
+
+
+def _pagina_feed(request):
+    cursor = request.GET.get('cursor')
+    direccion = request.GET.get('dir', 'sig')
+    productos = Producto.objects.select_related('usuario')
+    try:
+        return paginar_keyset(productos, cursor, direccion, PRODUCTOS_POR_PAGINA)
+    except CursorInvalido:
+        return paginar_keyset(productos, por_pagina=PRODUCTOS_POR_PAGINA)
+
+
+def _producto_json(p, user):
+    return {
+        "id": p.id,
+        "nombre": p.nombre,
+        "descripcion": p.descripcion[:120] + ("..." if len(p.descripcion) > 120 else ""),
+        "usuario": p.usuario.username,
+        "imagen": p.imagen.url if p.imagen else "/static/img/Nofoto.png",
+        "es_dueno": (user == p.usuario) or (user.username == "admin3000"),
+    }
+
+
+def _registrar_visitas(request, productos):
+    # Los productos propios no suman visitas
+    visitas.registrar(request, [p.id for p in productos if p.usuario_id != request.user.id])
+
+
+@presupuesto_consultas(3)
+@login_required
+def api_feed_productos(request):
+    pagina = _pagina_feed(request)
+    return JsonResponse({
+        "productos": [_producto_json(p, request.user) for p in pagina],
+        "siguiente": pagina.cursor_siguiente,
+        "anterior": pagina.cursor_anterior,
+    })
+
+
+@presupuesto_consultas(5)
+@login_required
+def api_explorar_productos(request):
+    try:
+        categoria = int(request.GET['categoria']) if request.GET.get('categoria') else None
+        tags = [int(t) for t in request.GET.getlist('tag')]
+    except ValueError:
+        return JsonResponse({"error": "Filtro inválido"}, status=400)
+
+    productos = facetas.filtrar(Producto.objects.select_related('usuario'), categoria, tags)
+    try:
+        pagina = paginar_keyset(productos, request.GET.get('cursor'), request.GET.get('dir', 'sig'), PRODUCTOS_POR_PAGINA)
+    except CursorInvalido:
+        pagina = paginar_keyset(productos, por_pagina=PRODUCTOS_POR_PAGINA)
+
+    return JsonResponse({
+        "productos": [_producto_json(p, request.user) for p in pagina],
+        "siguiente": pagina.cursor_siguiente,
+        "anterior": pagina.cursor_anterior,
+        "facetas": facetas.facetas(categoria, tags),
+    })
+
+
 # ---------------------- BUSQUEDA ----------------------
+@presupuesto_consultas(4)
 @login_required
 def buscar_productos(request):
     texto = request.GET.get("q", "")
-    productos = Producto.objects.filter(
-        Q(nombre__icontains=texto) |
-        Q(usuario__username__icontains=texto)
-    ).order_by("-id")[:100]
+    try:
+        ids, siguiente = busqueda.buscar(texto, request.GET.get("cursor"))
+    except CursorInvalido:
+        ids, siguiente = busqueda.buscar(texto)
 
-    lista = []
-    for p in productos:
-        lista.append({
-            "id": p.id,
-            "nombre": p.nombre,
-            "descripcion": p.descripcion[:120] + ("..." if len(p.descripcion) > 120 else ""),
-            "usuario": p.usuario.username,
-            "imagen": p.imagen.url if p.imagen else "/static/img/Nofoto.png",
-            "es_dueno": (request.user == p.usuario) or (request.user.username == "admin3000"),
-        })
+    productos = Producto.objects.select_related("usuario").in_bulk(ids)
+    lista = [_producto_json(productos[i], request.user) for i in ids if i in productos]
+
+    return JsonResponse({"productos": lista, "siguiente": siguiente})
 
-    return JsonResponse({"productos": lista})
+
+@presupuesto_consultas(2)
+@login_required
+def api_autocompletar(request):
+    sugerencias = autocompletar.indice().sugerir(request.GET.get("q", ""))
+    return JsonResponse({"sugerencias": sugerencias})
 
 
 # ---------------------- CRUD PRODUCTOS ----------------------
@@ -309,11 +377,10 @@ def ofrecer_trueque(request, producto_id):
         messages.error(request, 'No puedes ofrecer por tu propio producto.')
         return redirect('home')
     t = Trueque.objects.create(solicitante=request.user, receptor=producto.usuario, producto=producto)
-    Notificacion.objects.create(
-        usuario=producto.usuario,
+    notificar(
+        [producto.usuario_id], 'nuevo_trueque',
         titulo='Nueva solicitud de trueque',
         mensaje=f'{request.user.username} ofreció un trueque por "{producto.nombre}".',
-        tipo='nuevo_trueque',
         link=reverse('home')
     )
     messages.success(request, 'Solicitud de trueque enviada.')
@@ -330,18 +397,16 @@ def aceptar_trueque(request, trueque_id):
     chat, created = Chat.objects.get_or_create(trueque=trueque)
     chat.usuarios.set([trueque.solicitante, trueque.receptor])
     chat_url = reverse('chat_detalle', args=[chat.id])
-    Notificacion.objects.create(
-        usuario=trueque.solicitante,
+    notificar(
+        [trueque.solicitante_id], 'trueque_aceptado',
         titulo='Trueque aceptado',
         mensaje=f'{trueque.receptor.username} aceptó tu solicitud. Pulsa Ver chat.',
-        tipo='trueque_aceptado',
         link=chat_url
     )
-    Notificacion.objects.create(
-        usuario=trueque.receptor,
+    notificar(
+        [trueque.receptor_id], 'trueque_aceptado',
         titulo='Trueque aceptado',
         mensaje=f'Aceptaste la solicitud de {trueque.solicitante.username}. Pulsa Ver chat.',
-        tipo='trueque_aceptado',
         link=chat_url
     )
     messages.success(request, 'Trueque aceptado.')
@@ -355,11 +420,10 @@ def rechazar_trueque(request, trueque_id):
         return HttpResponseForbidden("No tienes permiso")
     trueque.estado = 'rechazado'
     trueque.save()
-    Notificacion.objects.create(
-        usuario=trueque.solicitante,
+    notificar(
+        [trueque.solicitante_id], 'trueque_rechazado',
         titulo='Trueque rechazado',
         mensaje=f'{trueque.receptor.username} rechazó tu solicitud por "{trueque.producto.nombre}".',
-        tipo='trueque_rechazado',
         link=reverse('home')
     )
     messages.info(request, 'Trueque rechazado.')
@@ -367,9 +431,44 @@ def rechazar_trueque(request, trueque_id):
 
 
 # ---------------------- CHAT ----------------------
+def _chats_de(user):
+    """
+    Bandeja del usuario: chats por última actividad, con el último mensaje
+    y la cantidad de no leídos. Los no leídos se cuentan con una subconsulta
+    sobre el índice (chat_id, id) a partir del último leído, así que el
+    costo depende de lo no leído y no del historial.
+    """
+    no_leidos = (
+        Mensaje.objects.filter(chat=OuterRef('pk'), id__gt=OuterRef('mi_ultimo_leido'))
+        .order_by().values('chat').annotate(total=Count('id')).values('total')
+    )
+    return (
+        Chat.objects.filter(usuarios=user)
+        .select_related('trueque__producto', 'ultimo_mensaje__autor')
+        .annotate(mi_ultimo_leido=Case(
+            When(trueque__solicitante_id=user.id, then=F('ultimo_leido_solicitante')),
+            default=F('ultimo_leido_receptor'),
+        ))
+        .annotate(no_leidos=Coalesce(Subquery(no_leidos), 0))
+        .order_by('-ultima_actividad', '-id')
+    )
+
+
+def _campo_leido(ids, user_id):
+    return 'ultimo_leido_solicitante' if user_id == ids[0] else 'ultimo_leido_receptor'
+
+
+def _marcar_leido(chat_id, ids, user_id, mensaje_id):
+    """Avanza el último leído del usuario (nunca hacia atrás)."""
+    campo = _campo_leido(ids, user_id)
+    if Chat.objects.filter(id=chat_id, **{f'{campo}__lt': mensaje_id}).update(**{campo: mensaje_id}):
+        contadores.invalidar(user_id, 'mensajes')
+
+
+@presupuesto_consultas(3)
 @login_required
 def chat_list_view(request):
-    chats = Chat.objects.filter(usuarios=request.user).order_by('-creado')
+    chats = _chats_de(request.user)
     return render(request, 'chat.html', {'chats': chats, 'user': request.user})
 
 
@@ -437,22 +536,108 @@ def crear_trueque_desde_chat(request):
     )
 
     return JsonResponse({"success": True})
+@presupuesto_consultas(6)
 @login_required
 def chat_detalle(request, chat_id):
-    chat = get_object_or_404(Chat, id=chat_id)
-    if request.user not in chat.usuarios.all():
+    # El chat se carga igual con su trueque: los participantes salen de ahí
+    # y no de la cache, así una cache fría no suma consultas.
+    chat = get_object_or_404(
+        Chat.objects.select_related('trueque__producto', 'trueque__solicitante', 'trueque__receptor'), id=chat_id
+    )
+    trueque = chat.trueque
+    ids = (trueque.solicitante_id, trueque.receptor_id)
+    if request.user.id not in ids:
         return HttpResponseForbidden("No tienes acceso a este chat.")
-    mensajes = chat.mensajes.all().order_by('fecha')
+    otro_usuario = trueque.receptor if request.user.id == trueque.solicitante_id else trueque.solicitante
+    mensajes, hay_anteriores = _pagina_mensajes(chat.id, archivado_hasta=chat.archivado_hasta)
+    if chat.ultimo_mensaje_id:
+        _marcar_leido(chat.id, ids, request.user.id, chat.ultimo_mensaje_id)
     form = MensajeForm()
     return render(request, 'chat.html', {
         'chat': chat,
+        'otro_usuario': otro_usuario,
         'mensajes': mensajes,
+        'hay_anteriores': hay_anteriores,
         'form': form,
-        'chats': Chat.objects.filter(usuarios=request.user).order_by('-creado'),
+        'chats': _chats_de(request.user),
         'chat_seleccionado': chat
     })
 
 
+MENSAJES_POR_PAGINA = 50
+MAX_MENSAJES_POR_PAGINA = 100
+
+
+def _pagina_mensajes(chat_id, before_id=None, limite=MENSAJES_POR_PAGINA, archivado_hasta=None):
+    """
+    Los ``limite`` mensajes más recientes (anteriores a before_id si se da),
+    en orden cronológico, y si quedan más antiguos. Se ordena por id para
+    usar el índice (chat_id, id). Si en la tabla no alcanzan, se completa
+    con el archivo del chat; archivado_hasta (Chat.archivado_hasta) evita
+    consultarlo cuando ya se conoce.
+    """
+    msgs = Mensaje.objects.filter(chat_id=chat_id).select_related('autor').order_by('-id')
+    if before_id:
+        msgs = msgs.filter(id__lt=before_id)
+    pagina = list(msgs[:limite + 1])
+    if len(pagina) > limite:
+        return pagina[:limite][::-1], True
+    pagina.reverse()
+
+    if archivado_hasta is None:
+        archivado_hasta = Chat.objects.filter(id=chat_id).values_list('archivado_hasta', flat=True).first()
+    if not archivado_hasta:
+        return pagina, False
+    faltan = limite - len(pagina)
+    if not faltan:
+        return pagina, True
+    antes_de = pagina[0].id if pagina else before_id
+    anteriores, hay_anteriores = archivo.mensajes_archivados(chat_id, antes_de, faltan)
+    return anteriores + pagina, hay_anteriores
+
+
+def _mensaje_json(m):
+    return {
+        'id': m.id,
+        'autor': m.autor.username,
+        'contenido': m.contenido,
+        'fecha': localtime(m.fecha).strftime('%d/%m/%Y %H:%M')
+    }
+
+
+def _notificar_mensaje(usuario_id, chat_id, autor):
+    """
+    Aviso de mensaje nuevo agrupado por chat: si el destinatario ya tiene
+    uno se actualiza en el mismo UPDATE (cantidad, último remitente y
+    fecha); si no, se crea. Si otro request lo crea entre medio, la
+    restricción única lo detecta y se vuelve a actualizar.
+    """
+    campos = {
+        'titulo': 'Nuevo mensaje',
+        'mensaje': f'{autor.username} te envió un mensaje.',
+        'creado': timezone.now(),
+        'visible': True,
+    }
+    # cantidad va primero: MySQL evalúa las asignaciones en orden y el CASE
+    # debe ver el valor de visible anterior al UPDATE
+    cantidad = Case(When(visible=True, then=F('cantidad') + 1), default=Value(1))
+    for _ in range(2):
+        if Notificacion.objects.filter(usuario_id=usuario_id, chat_id=chat_id).update(cantidad=cantidad, **campos):
+            # Pudo volver a quedar visible: no se sabe si sumar
+            contadores.invalidar(usuario_id, 'notificaciones')
+            return
+        try:
+            with transaction.atomic():
+                Notificacion.objects.create(
+                    usuario_id=usuario_id, chat_id=chat_id, tipo='mensaje',
+                    link=reverse('chat_detalle', args=[chat_id]), **campos
+                )
+            return
+        except IntegrityError:
+            continue
+
+
+@presupuesto_consultas(7)
 @login_required
 @csrf_exempt
 def api_send_message(request, chat_id):
@@ -464,65 +649,188 @@ def api_send_message(request, chat_id):
         texto = data.get('texto', '').strip()
         if not texto:
             return JsonResponse({'ok': False, 'error': 'Mensaje vacío'}, status=400)
-        chat = get_object_or_404(Chat, id=chat_id)
-        if request.user not in chat.usuarios.all():
+        ids = participantes_o_404(chat_id)
+        if request.user.id not in ids:
             return JsonResponse({'ok': False, 'error': 'No autorizado'}, status=403)
-        mensaje = Mensaje.objects.create(chat=chat, autor=request.user, contenido=texto)
-        
-        otros = [u for u in chat.usuarios.all() if u != request.user]
-        if otros:
-            Notificacion.objects.create(
-                usuario=otros[0],
-                titulo='Nuevo mensaje',
-                mensaje=f'{request.user.username} te envió un mensaje.',
-                tipo='mensaje',
-                link=reverse('chat_detalle', args=[chat.id])
-            )
-        return JsonResponse({
-            'ok': True,
-            'mensaje': {
-                'id': mensaje.id,
-                'autor': mensaje.autor.username,
-                'contenido': mensaje.contenido,
-                'fecha': localtime(mensaje.fecha).strftime('%d/%m/%Y %H:%M')
-            }
-        })
+        mensaje = Mensaje.objects.create(chat_id=chat_id, autor=request.user, contenido=texto)
+        # Dos envíos simultáneos pueden llegar al UPDATE en cualquier orden:
+        # solo avanza si este mensaje es más nuevo que el guardado.
+        actualizado = Chat.objects.filter(
+            Q(ultimo_mensaje_id__lt=mensaje.id) | Q(ultimo_mensaje__isnull=True), id=chat_id
+        ).update(
+            ultimo_mensaje=mensaje,
+            ultima_actividad=mensaje.fecha,
+            **{_campo_leido(ids, request.user.id): mensaje.id}
+        )
+        if not actualizado:
+            _marcar_leido(chat_id, ids, request.user.id, mensaje.id)
+        datos = _mensaje_json(mensaje)
+        transaction.on_commit(lambda: broker().publicar(canal_chat(chat_id), datos))
+
+        otro_id = otro_participante(ids, request.user.id)
+        _notificar_mensaje(otro_id, chat_id, request.user)
+        contadores.invalidar(otro_id, 'mensajes')
+        contadores.invalidar(request.user.id, 'mensajes')
+        return JsonResponse({'ok': True, 'mensaje': datos})
     return JsonResponse({'ok': False, 'error': 'Método no permitido'}, status=405)
 
 
-@login_required
-def api_fetch_messages(request, chat_id):
-    chat = get_object_or_404(Chat, id=chat_id)
-    if request.user not in chat.usuarios.all():
+def _mensajes_desde(chat_id, since_id):
+    # Acotado: si hay más, el cliente los pide en la siguiente consulta
+    msgs = Mensaje.objects.filter(chat_id=chat_id, id__gt=since_id).select_related('autor').order_by('id')
+    return [_mensaje_json(m) for m in msgs[:MAX_MENSAJES_POR_PAGINA]]
+
+
+def _leer_desde(chat_id, user_id, since_id):
+    """Como _mensajes_desde, marcando lo devuelto como leído por user_id."""
+    datos = _mensajes_desde(chat_id, since_id)
+    if datos:
+        _marcar_leido(chat_id, participantes_o_404(chat_id), user_id, datos[-1]['id'])
+    return datos
+
+
+def _mensajes_anteriores(chat_id, before_id, limite):
+    mensajes, hay_anteriores = _pagina_mensajes(chat_id, before_id, limite)
+    return {'mensajes': [_mensaje_json(m) for m in mensajes], 'hay_anteriores': hay_anteriores}
+
+
+# Máximo de segundos que api_fetch_messages puede esperar (long-poll)
+ESPERA_MAXIMA_MENSAJES = 25
+
+
+def _cerrar_conexion():
+    # Durante la espera no se retiene una conexión a la base
+    if not connection.in_atomic_block:
+        connection.close()
+
+
+def _marcar_y_cerrar(chat_id, user_id, mensaje_id):
+    _marcar_leido(chat_id, participantes_o_404(chat_id), user_id, mensaje_id)
+    _cerrar_conexion()
+
+
+@presupuesto_consultas(5)
+async def api_fetch_messages(request, chat_id):
+    """
+    Sin since_id devuelve la última página del chat (?limite=, hasta
+    MAX_MENSAJES_POR_PAGINA) o la anterior a ?before_id= para ir hacia
+    atrás. Con since_id, los mensajes con id mayor; con ?wait=N (bajo ASGI)
+    y nada nuevo, espera hasta N segundos a que api_send_message publique
+    uno, sin ocupar un hilo ni una conexión a la base mientras tanto.
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return redirect_to_login(request.get_full_path())
+    if not await sync_to_async(es_participante)(chat_id, user.id):
         return JsonResponse({'error': 'No autorizado'}, status=403)
 
-    since_id = request.GET.get('since_id')
-    if since_id:
+    try:
+        since_id = int(request.GET.get('since_id') or 0)
+        before_id = int(request.GET.get('before_id') or 0)
+        limite = int(request.GET.get('limite') or MENSAJES_POR_PAGINA)
+    except ValueError:
+        return JsonResponse({'error': 'Parámetros inválidos'}, status=400)
+    if 'since_id' not in request.GET:
+        limite = min(max(limite, 1), MAX_MENSAJES_POR_PAGINA)
+        return JsonResponse(await sync_to_async(_mensajes_anteriores)(chat_id, before_id, limite))
+
+    try:
+        espera = float(request.GET.get('wait') or 0)
+        if not math.isfinite(espera):
+            raise ValueError(espera)
+    except ValueError:
+        return JsonResponse({'error': 'wait inválido'}, status=400)
+    espera = min(max(espera, 0), ESPERA_MAXIMA_MENSAJES)
+    if not isinstance(request, ASGIRequest):
+        espera = 0
+
+    if not espera:
+        return JsonResponse({'mensajes': await sync_to_async(_leer_desde)(chat_id, user.id, since_id)})
+
+    # Suscrito antes de consultar: un mensaje que llegue entre la consulta
+    # y la espera queda en la cola y despierta la respuesta igual.
+    with broker().suscribir(canal_chat(chat_id)) as suscripcion:
+        datos = await sync_to_async(_leer_desde)(chat_id, user.id, since_id)
+        if datos:
+            return JsonResponse({'mensajes': datos})
+        await sync_to_async(_cerrar_conexion)()
         try:
-            since_id = int(since_id)
-        except (ValueError, TypeError):
-            since_id = None
+            m = await suscripcion.recibir(timeout=espera)
+        except asyncio.TimeoutError:
+            return JsonResponse({'mensajes': []})
+        nuevos = [m for m in [m] + suscripcion.pendientes() if m['id'] > since_id]
+    if nuevos:
+        # Los participantes pueden haber salido de la cache durante la espera:
+        # se leen dentro de sync_to_async, nunca en el event loop
+        await sync_to_async(_marcar_y_cerrar)(chat_id, user.id, nuevos[-1]['id'])
+    return JsonResponse({'mensajes': nuevos})
 
-    if since_id:
-        msgs = chat.mensajes.filter(id__gt=since_id).order_by('fecha')
-    else:
-        msgs = chat.mensajes.all().order_by('fecha')
 
-    datos = [{
-        'id': m.id,
-        'autor': m.autor.username,
-        'contenido': m.contenido,
-        'fecha': m.fecha.strftime("%d/%m/%Y %H:%M")
-    } for m in msgs]
-    return JsonResponse({'mensajes': datos})
+# Cada cuánto se manda un comentario para mantener viva la conexión SSE
+SSE_PING_SEGUNDOS = 15
 
-def api_productos_usuario_chat(request, chat_id):
-    chat = get_object_or_404(Chat, id=chat_id)
 
-    # Obtener otro usuario correctamente desde ManyToMany
-    otro_usuario = chat.usuarios.exclude(id=request.user.id).first()
+def _evento_sse(m):
+    return f"id: {m['id']}\nevent: mensaje\ndata: {json.dumps(m)}\n\n"
+
+
+async def chat_eventos(request, chat_id):
+    """
+    Server-Sent Events con los mensajes nuevos del chat. Tras validar al
+    usuario no vuelve a consultar la base: espera los eventos que publica
+    api_send_message. Requiere ASGI (SwapPlace/asgi.py); bajo WSGI responde
+    503 y el cliente vuelve al polling.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'error': 'Requiere servidor ASGI'}, status=503)
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({'error': 'No autenticado'}, status=401)
+    if not await sync_to_async(es_participante)(chat_id, user.id):
+        return JsonResponse({'error': 'No autorizado'}, status=403)
 
-    productos = Producto.objects.filter(usuario=otro_usuario)
+    try:
+        ultimo_id = int(request.headers.get('Last-Event-ID') or request.GET.get('since_id') or 0)
+    except ValueError:
+        ultimo_id = 0
+
+    async def eventos():
+        with broker().suscribir(canal_chat(chat_id)) as suscripcion:
+            # Suscrito primero y después se leen los pendientes: no se pierde nada entre medio
+            pendientes = await sync_to_async(_mensajes_desde)(chat_id, ultimo_id) if ultimo_id else []
+            # Se marca como leído antes de enviar: cuando el cliente reacciona
+            # al evento pidiendo sus contadores, ya salen al día
+            if pendientes:
+                await sync_to_async(_marcar_y_cerrar)(chat_id, user.id, pendientes[-1]['id'])
+            else:
+                await sync_to_async(_cerrar_conexion)()
+            enviado = ultimo_id
+            for m in pendientes:
+                enviado = m['id']
+                yield _evento_sse(m)
+            while True:
+                try:
+                    m = await suscripcion.recibir(timeout=SSE_PING_SEGUNDOS)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                if m['id'] > enviado:
+                    enviado = m['id']
+                    # Entregado en vivo: cuenta como leído en la bandeja
+                    await sync_to_async(_marcar_y_cerrar)(chat_id, user.id, m['id'])
+                    yield _evento_sse(m)
+
+    respuesta = StreamingHttpResponse(eventos(), content_type='text/event-stream')
+    respuesta['Cache-Control'] = 'no-cache'
+    respuesta['X-Accel-Buffering'] = 'no'
+    return respuesta
+
+def api_productos_usuario_chat(request, chat_id):
+    ids = participantes_o_404(chat_id)
+    if request.user.id not in ids:
+        return JsonResponse({'error': 'No autorizado'}, status=403)
+
+    productos = Producto.objects.filter(usuario_id=otro_participante(ids, request.user.id))
 
     data = []
     for p in productos:
@@ -536,6 +844,7 @@ def api_productos_usuario_chat(request, chat_id):
     return JsonResponse({"productos": data})
 
 # ---------------------- NOTIFICACIONES ----------------------
+@presupuesto_consultas(3)
 @login_required
 def api_notificaciones(request):
     user = request.user
@@ -550,23 +859,114 @@ def api_notificaciones(request):
             'mensaje': n.mensaje,
             'tipo': n.tipo,
             'link': n.link,
+            'cantidad': n.cantidad,
             'creado_iso': n.creado.isoformat(),
             'edad_segundos': int(edad),
         })
     return JsonResponse({'notificaciones': datos})
 
 
+@presupuesto_consultas(5)
+@login_required
+def api_no_leidas(request):
+    """
+    Contadores para los globos del menú. Normalmente se responden desde la
+    cache, sin leer la tabla de notificaciones.
+    """
+    return JsonResponse(contadores.no_leidas(request.user.id))
+
+
+MAX_IDS_MARCAR = 500
+
+
+def _marcar_leidas(usuario_id, ids=None, hasta_id=None, hasta_fecha=None, tipo=None):
+    """
+    Oculta en un solo UPDATE las notificaciones visibles del usuario que
+    cumplan los filtros dados (se combinan). Devuelve cuántas cambió.
+    """
+    notifs = Notificacion.objects.filter(usuario_id=usuario_id, visible=True)
+    if ids is not None:
+        notifs = notifs.filter(id__in=ids)
+    if hasta_id is not None:
+        notifs = notifs.filter(id__lte=hasta_id)
+    if hasta_fecha is not None:
+        notifs = notifs.filter(creado__lte=hasta_fecha)
+    if tipo:
+        notifs = notifs.filter(tipo=tipo)
+    marcadas = notifs.update(visible=False)
+    if marcadas:
+        contadores.invalidar(usuario_id, 'notificaciones', 'strikes')
+    return marcadas
+
+
 @login_required
 @require_POST
 def api_marcar_leida(request):
-    nid = request.POST.get('id')
     try:
-        n = Notificacion.objects.get(id=nid, usuario=request.user)
-        n.visible = False
-        n.save()
-        return JsonResponse({'ok': True})
-    except Notificacion.DoesNotExist:
+        nid = int(request.POST.get('id'))
+    except (TypeError, ValueError):
         return JsonResponse({'ok': False, 'error': 'No encontrada'}, status=404)
+    if _marcar_leidas(request.user.id, ids=[nid]):
+        return JsonResponse({'ok': True})
+    # Ya leída: igual es un éxito; si no es del usuario, no existe para él
+    if Notificacion.objects.filter(id=nid, usuario=request.user).exists():
+        return JsonResponse({'ok': True})
+    return JsonResponse({'ok': False, 'error': 'No encontrada'}, status=404)
+
+
+@presupuesto_consultas(3)
+@login_required
+@require_POST
+def api_marcar_leidas(request):
+    """
+    Marca varias notificaciones como leídas. Acepta JSON o formulario con
+    ``ids`` (lista), ``hasta_id`` (todas hasta ese id), ``hasta_fecha``
+    (creadas o reavisadas hasta ese instante, ISO 8601) y/o ``tipo``; al
+    menos uno es obligatorio. Responde cuántas se marcaron.
+
+    Los avisos de mensajes se reutilizan (mismo id, ``creado`` nuevo), así
+    que para "marcar todas" el menú manda los ids que mostró junto con
+    ``hasta_fecha``: un aviso que volvió a llegar después no se marca.
+    """
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body.decode('utf-8') or '{}')
+        except json.JSONDecodeError:
+            return JsonResponse({'ok': False, 'error': 'Formato JSON inválido'}, status=400)
+        if not isinstance(data, dict):
+            return JsonResponse({'ok': False, 'error': 'Se esperaba un objeto JSON'}, status=400)
+    else:
+        data = {
+            'ids': request.POST.getlist('ids') or None,
+            'hasta_id': request.POST.get('hasta_id'),
+            'hasta_fecha': request.POST.get('hasta_fecha'),
+            'tipo': request.POST.get('tipo'),
+        }
+
+    if data.get('ids') is not None and not isinstance(data['ids'], list):
+        return JsonResponse({'ok': False, 'error': 'ids debe ser una lista'}, status=400)
+    try:
+        ids = [int(i) for i in data['ids']] if data.get('ids') is not None else None
+        hasta_id = int(data['hasta_id']) if data.get('hasta_id') not in (None, '') else None
+        hasta_fecha = None
+        if data.get('hasta_fecha') not in (None, ''):
+            hasta_fecha = parse_datetime(data['hasta_fecha'])
+            if hasta_fecha is None:
+                raise ValueError(data['hasta_fecha'])
+            if timezone.is_naive(hasta_fecha):
+                hasta_fecha = timezone.make_aware(hasta_fecha)
+    except (TypeError, ValueError):
+        return JsonResponse({'ok': False, 'error': 'Parámetros inválidos'}, status=400)
+    tipo = data.get('tipo') or None
+    if tipo is not None and not isinstance(tipo, str):
+        return JsonResponse({'ok': False, 'error': 'tipo debe ser texto'}, status=400)
+    if ids is None and hasta_id is None and hasta_fecha is None and tipo is None:
+        return JsonResponse({'ok': False, 'error': 'Indica ids, hasta_id, hasta_fecha o tipo'}, status=400)
+    if ids is not None and len(ids) > MAX_IDS_MARCAR:
+        return JsonResponse({'ok': False, 'error': f'Máximo {MAX_IDS_MARCAR} ids'}, status=400)
+
+    marcadas = _marcar_leidas(request.user.id, ids=ids, hasta_id=hasta_id, hasta_fecha=hasta_fecha, tipo=tipo)
+    return JsonResponse({'ok': True, 'marcadas': marcadas})
 
 #Cerrar trato:
 @require_POST
@@ -613,8 +1013,7 @@ def api_cerrar_trato(request, chat_id):
 @login_required
 @require_POST
 def reportar_chat(request, chat_id):
-    chat = get_object_or_404(Chat, id=chat_id)
-    if request.user not in chat.usuarios.all():
+    if request.user.id not in participantes_o_404(chat_id):
         return JsonResponse({'ok': False, 'error': 'No autorizado'}, status=403)
 
     mensaje_texto = (
@@ -641,12 +1040,13 @@ def calificar_chat(request, chat_id):
         if estrellas < 1 or estrellas > 5:
             return JsonResponse({"ok": False, "error": "Valor de estrellas inválido"}, status=400)
         
-        chat = Chat.objects.get(id=chat_id)
-        if request.user not in chat.usuarios.all():
+        chat = Chat.objects.select_related("trueque").get(id=chat_id)
+        ids = (chat.trueque.solicitante_id, chat.trueque.receptor_id)
+        if request.user.id not in ids:
             return JsonResponse({"ok": False, "error": "No autorizado"}, status=403)
 
         # El vendedor es quien no es el usuario que califica
-        vendedor = next(u for u in chat.usuarios.all() if u != request.user)
+        vendedor = User.objects.get(id=otro_participante(ids, request.user.id))
 
         # Crear o actualizar calificación
         calificacion, created = Calificacion.objects.update_or_create(
@@ -668,19 +1068,28 @@ def calificar_chat(request, chat_id):
         return JsonResponse({"ok": False, "error": str(e)}, status=500)
 
 # ---------------------- PANEL DEL VENDEDOR ----------------------
+@presupuesto_consultas(6)
 @login_required
 def panel_vendedor(request):
     perfil, _ = Perfil.objects.get_or_create(usuario=request.user)
 
-    productos = Producto.objects.filter(usuario=request.user)
-    total_productos = productos.count()
+    productos = list(Producto.objects.filter(usuario=request.user))
+    # Suma las visitas que este worker todavía no volcó a la base
+    sin_volcar = visitas.pendientes([p.id for p in productos])
+    for p in productos:
+        p.visitas += sin_volcar.get(p.id, 0)
+    total_productos = len(productos)
     total_visitas = sum(p.visitas for p in productos)
     promedio_estrellas = perfil.promedio_estrellas()
 
-    # NUEVO: Contar trueques recibidos
-    total_trueques_recibidos = Trueque.objects.filter(
-        receptor=request.user
-    ).count()
+    # Gráficos del periodo desde las estadísticas diarias consolidadas
+    try:
+        dias = int(request.GET.get('dias', estadisticas.PERIODOS[0]))
+    except ValueError:
+        dias = estadisticas.PERIODOS[0]
+    if dias not in estadisticas.PERIODOS:
+        dias = estadisticas.PERIODOS[0]
+    serie, totales_periodo = estadisticas.serie_vendedor(request.user.id, dias)
 
     return render(request, 'panel_vendedor.html', {
         'perfil': perfil,
@@ -688,103 +1097,140 @@ def panel_vendedor(request):
         'total_productos_vendedor': total_productos,
         'total_visitas': total_visitas,
         'promedio_estrellas': promedio_estrellas,
-        'total_trueques_recibidos': total_trueques_recibidos,
+        'dias': dias,
+        'periodos': estadisticas.PERIODOS,
+        'serie': serie,
+        'totales_periodo': totales_periodo,
+        'max_visitas': max(d['visitas'] for d in serie) or 1,
+        'max_solicitudes': max(d['solicitudes'] for d in serie) or 1,
     })
 
 # ---------------------- INSIGHTS ADMIN ----------------------
+@presupuesto_consultas(3)
 @login_required
 def panel_insight(request):
     if not request.user.is_superuser:
         return HttpResponseForbidden("Acceso denegado.")
 
-    producto_mas_solicitado = (
-        Trueque.objects.values("producto__nombre")
-        .annotate(total=Count("id"))
-        .order_by("-total")
-        .first()
-    )
-
-    total_trueques = Trueque.objects.count()
-    total_usuarios = User.objects.count()
-    total_productos = Producto.objects.count()
+    # Se calcula fuera del request (manage.py refrescar_insights)
+    snapshot = insights.ultimo()
+    if snapshot is None:
+        return render(request, "panel_insights.html", {
+            "snapshot": None,
+            "tablas_exportables": exportacion.TABLAS,
+        })
 
+    datos = snapshot.datos
+    crecimiento = [
+        {**semana, "semana": date.fromisoformat(semana["semana"])}
+        for semana in datos["crecimiento"]
+    ]
     return render(request, "panel_insights.html", {
-        "producto_mas_solicitado": producto_mas_solicitado,
-        "total_trueques": total_trueques,
-        "total_usuarios": total_usuarios,
-        "total_productos": total_productos,
+        "snapshot": snapshot,
+        "tablas_exportables": exportacion.TABLAS,
+        "desactualizado": timezone.now() - snapshot.creado > insights.ANTIGUEDAD_MAXIMA,
+        "datos": datos,
+        "crecimiento": crecimiento,
+        "max_crecimiento": max(
+            [max(s["usuarios"], s["productos"], s["trueques"]) for s in crecimiento] or [0]
+        ) or 1,
     })
 
-# ---------------------- MODERAR USUARIOS ----------------------
-@login_required
-def moderar_usuario(request):
-    if not request.user.is_superuser or request.user.username != "admin3000":
-        return HttpResponseForbidden("Acceso denegado.")
+# ---------------------- EXPORTAR DATOS (ADMIN) ----------------------
+def _fecha_param(request, nombre):
+    valor = request.GET.get(nombre)
+    if not valor:
+        return None
+    fecha = parse_date(valor)
+    if fecha is None:
+        raise ValueError(valor)
+    return fecha
 
-    if request.method == "POST":
-        usuario_id = request.POST.get("usuario_id")
-        accion = request.POST.get("accion")
-
-        usuario = get_object_or_404(User, id=usuario_id)
-
-        # Asegurar que el usuario tenga Perfil
-        perfil, creado = Perfil.objects.get_or_create(usuario=usuario)
-
-        if accion == "bloquear":
-            # 1. Bloquear usuario
-            moderacion, created = Moderacion.objects.get_or_create(usuario=usuario)
-            moderacion.estado = "bloqueado"
-            moderacion.save()
-
-            # 2. Registrar strike
-            perfil.advertencias += 1
-            perfil.save()
-
-            # 3. Notificación al usuario
-            Notificacion.objects.create(
-                usuario=usuario,
-                titulo="Has recibido un strike",
-                mensaje=f"Tu cuenta ha recibido un strike. Strike {perfil.advertencias}/3.",
-                tipo="alerta"
-            )
 
-            # 4. Si llega a 3 strikes → eliminar usuario
-            if perfil.advertencias >= 3:
-                Notificacion.objects.create(
-                    usuario=usuario,
-                    titulo="Cuenta eliminada",
-                    mensaje="Tu cuenta ha sido eliminada por acumular 3 strikes.",
-                    tipo="peligro"
-                )
+@login_required
+def exportar_datos(request, tabla):
+    if not request.user.is_superuser:
+        return HttpResponseForbidden("Acceso denegado.")
+    if tabla not in exportacion.TABLAS:
+        return JsonResponse({"error": "Tabla desconocida"}, status=404)
 
-                # Eliminar contenido asociado
-                Producto.objects.filter(usuario=usuario).delete()
-                Trueque.objects.filter(solicitante=usuario).delete()
-                Trueque.objects.filter(receptor=usuario).delete()
-                Chat.objects.filter(usuarios=usuario).delete()
+    formato = request.GET.get("formato", "csv")
+    if formato not in exportacion.FORMATOS:
+        return JsonResponse({"error": "Formato inválido"}, status=400)
+    try:
+        desde = _fecha_param(request, "desde")
+        hasta = _fecha_param(request, "hasta")
+    except ValueError:
+        return JsonResponse({"error": "Fecha inválida (AAAA-MM-DD)"}, status=400)
+    comprimir = request.GET.get("gzip") == "1"
+
+    # Las filas se leen y se envían por lotes mientras se descarga
+    respuesta = StreamingHttpResponse(
+        exportacion.exportar(tabla, formato, desde, hasta, comprimir),
+        content_type="application/gzip" if comprimir else (
+            "text/csv; charset=utf-8" if formato == "csv" else "application/x-ndjson"
+        ),
+    )
+    nombre = exportacion.nombre_archivo(tabla, formato, desde, hasta, comprimir)
+    respuesta["Content-Disposition"] = f'attachment; filename="{nombre}"'
+    respuesta["X-Accel-Buffering"] = "no"
+    return respuesta
 
-                usuario.delete()
+# ---------------------- MODERAR USUARIOS ----------------------
+USUARIOS_POR_PAGINA = 25
+ACCIONES_MODERACION = {
+    "bloquear": moderacion.bloquear,
+    "desbloquear": moderacion.desbloquear,
+    "reducir_strike": moderacion.reducir_strike,
+}
 
-                return redirect('moderar_usuario')
 
-        elif accion == "desbloquear":
-            Moderacion.objects.filter(usuario=usuario).update(estado="activo")
+@presupuesto_consultas(3)
+@login_required
+def moderar_usuario(request):
+    if not request.user.is_superuser or request.user.username != "admin3000":
+        return HttpResponseForbidden("Acceso denegado.")
 
-            Notificacion.objects.create(
-                usuario=usuario,
-                titulo="Tu cuenta ha sido desbloqueada",
-                mensaje="Un administrador ha restaurado el acceso a tu cuenta.",
-                tipo="info"
-            )
+    q = request.GET.get("q", "").strip()
 
-    usuarios = User.objects.all()
-    moderados = Moderacion.objects.all()
+    if request.method == "POST":
+        accion = ACCIONES_MODERACION.get(request.POST.get("accion"))
+        try:
+            usuario_ids = [int(i) for i in request.POST.getlist("usuario_id")]
+        except ValueError:
+            usuario_ids = []
+        if accion is None or not usuario_ids:
+            messages.error(request, "Selecciona usuarios y una acción.")
+        elif accion is moderacion.bloquear:
+            bloqueados, eliminados = accion(usuario_ids)
+            messages.success(request, f"{bloqueados} usuarios bloqueados, {eliminados} eliminados por strikes.")
+        else:
+            messages.success(request, f"{accion(usuario_ids)} usuarios actualizados.")
+        # Vuelve a la misma página y búsqueda
+        return redirect(request.get_full_path())
+
+    # Perfil y moderación en la misma consulta; búsqueda por prefijo (índices
+    # de username y auth_user_email_idx) y paginación por cursor
+    usuarios = User.objects.select_related("perfil", "moderacion")
+    if q:
+        filtro = Q(email__istartswith=q)
+        if "@" not in q:
+            filtro |= Q(username__istartswith=q)
+        usuarios = usuarios.filter(filtro)
+    campos = ("date_joined", "id")
+    try:
+        pagina = paginar_keyset(usuarios, request.GET.get("cursor"), request.GET.get("dir", "sig"),
+                                USUARIOS_POR_PAGINA, campos)
+    except CursorInvalido:
+        pagina = paginar_keyset(usuarios, por_pagina=USUARIOS_POR_PAGINA, campos=campos)
 
     return render(request, "moderar_usuarios.html", {
-        "usuarios": usuarios,
-        "moderados": moderados,
+        "usuarios": pagina,
+        "q": q,
+        "max_strikes": moderacion.MAX_STRIKES,
     })
 
+@presupuesto_consultas(3)
 @login_required
 def api_strikes(request):
     """
@@ -0,0 +1,115 @@
+import atexit
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.db.models import Case, F, PositiveIntegerField, Value, When
+
+from . import estadisticas
+from .models import Producto
+
+
+# ======================================================
+# CONTADOR DE VISITAS CON BUFFER
+# ======================================================
+# Cada vez que un producto aparece en la página del home a alguien que no es
+# su dueño se suma una visita en memoria (por worker); la búsqueda y los
+# listados por API no cuentan. Un hilo vuelca lo acumulado cada INTERVALO
+# segundos con un solo UPDATE (visitas = visitas + CASE id WHEN ... END), así
+# un producto popular no genera un UPDATE por vista ni bloqueos sobre su
+# fila. En el mismo volcado se suman a las estadísticas del día
+# (estadisticas.sumar_visitas).
+#
+# Con settings.VISITAS_DEDUP_SEGUNDOS > 0, la misma sesión cuenta una sola
+# visita por producto en ese plazo (marcas en la cache 'visitas', leídas y
+# escritas en lote con get_many/set_many).
+
+INTERVALO = 30
+LOTE = 500
+
+_lock = threading.Lock()
+_pendientes = Counter()
+_ultimo_volcado = time.monotonic()
+_volcando = threading.Event()
+
+
+def _dedup_segundos():
+    return getattr(settings, "VISITAS_DEDUP_SEGUNDOS", 30 * 60)
+
+
+def registrar(request, producto_ids):
+    """Suma una visita a cada producto (salvo repetidos de la misma sesión)."""
+    segundos = _dedup_segundos()
+    sesion = request.session.session_key if hasattr(request, "session") else None
+    if segundos and sesion:
+        # Una lectura y una escritura a la cache por request, no una por producto
+        marcas = caches["visitas"]
+        claves = {f"visita:{sesion}:{pid}": pid for pid in producto_ids}
+        vistas = marcas.get_many(claves)
+        nuevas = {clave: 1 for clave in claves if clave not in vistas}
+        marcas.set_many(nuevas, segundos)
+        producto_ids = [claves[clave] for clave in nuevas]
+    if not producto_ids:
+        return
+    with _lock:
+        _pendientes.update(producto_ids)
+    _volcar_si_corresponde()
+
+
+def pendientes(producto_ids):
+    """Visitas aún no volcadas de este worker, por producto."""
+    with _lock:
+        return {pid: _pendientes[pid] for pid in producto_ids if pid in _pendientes}
+
+
+def volcar():
+    """Escribe lo acumulado en la base. Devuelve cuántas visitas escribió."""
+    global _pendientes, _ultimo_volcado
+    with _lock:
+        deltas, _pendientes = _pendientes, Counter()
+        _ultimo_volcado = time.monotonic()
+    if not deltas:
+        return 0
+
+    items = list(deltas.items())
+    for i in range(0, len(items), LOTE):
+        lote = dict(items[i:i + LOTE])
+        try:
+            with transaction.atomic():
+                Producto.objects.filter(id__in=lote).update(visitas=F("visitas") + Case(
+                    *[When(id=pid, then=Value(n)) for pid, n in lote.items()],
+                    default=Value(0), output_field=PositiveIntegerField(),
+                ))
+                estadisticas.sumar_visitas(lote)
+        except Exception:
+            # Lo que no se alcanzó a escribir vuelve al acumulador
+            with _lock:
+                _pendientes.update(dict(items[i:]))
+            raise
+    return sum(deltas.values())
+
+
+def _volcar_en_segundo_plano():
+    try:
+        volcar()
+    finally:
+        connection.close()
+        _volcando.clear()
+
+
+def _volcar_si_corresponde():
+    if time.monotonic() - _ultimo_volcado < INTERVALO or _volcando.is_set():
+        return
+    _volcando.set()
+    threading.Thread(target=_volcar_en_segundo_plano, daemon=True).start()
+
+
+@atexit.register
+def _volcar_al_salir():
+    try:
+        volcar()
+    except Exception:
+        pass
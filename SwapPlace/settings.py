@@ -86,6 +86,52 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# Con varios workers en producción conviene un backend compartido
+# (Redis o Memcached) para que todos vean el mismo índice de recomendaciones.
+#
+# 'default' guarda participantes de chats, contadores de no leídas,
+# resultados de búsqueda y el índice de recomendaciones; con el límite por
+# defecto de LocMemCache (300) se desalojarían a cada rato. Las marcas de
+# visitas (una por sesión y producto visto) van aparte en 'visitas', así su
+# volumen no desplaza a lo demás.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'swapplace',
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+    'visitas': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'swapplace-visitas',
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+}
+
+
+# Pub/Sub para los eventos de chat en tiempo real (SwapApp/pubsub.py).
+# BrokerMemoria funciona con un solo proceso ASGI; con varios se necesita
+# un backend compartido.
+
+PUBSUB_BROKER = 'SwapApp.pubsub.BrokerMemoria'
+
+
+# Notificaciones (SwapApp/notificaciones.py): se encolan y las crea el worker
+# `python manage.py despachar_notificaciones`. Con False se crean dentro
+# del request (útil en desarrollo sin worker).
+
+NOTIFICACIONES_EN_COLA = True
+
+
+# Visitas de productos (SwapApp/visitas.py): se acumulan en memoria y se
+# vuelcan a la base cada 30 s. Una sesión cuenta una sola visita por
+# producto dentro de este plazo; 0 lo desactiva.
+
+VISITAS_DEDUP_SEGUNDOS = 30 * 60
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 